@@ -0,0 +1,353 @@
+from contextlib import contextmanager
+from datetime import date
+from typing import Dict, Iterator, List, Optional, Tuple
+import logging
+import os
+import threading
+import time
+import numpy as np
+from app.valuation import SWAP, LOAN, Book, load_book
+
+logging.basicConfig(level=logging.WARNING)
+
+# Intervalle entre deux recalculs complets des agrégats, en secondes
+KPI_RECONCILE_INTERVAL = float(os.getenv("KPI_RECONCILE_INTERVAL", "300"))
+# Dérive relative au-delà de laquelle un recalcul complet est signalé : les sommes
+# (nominal × jours, jusqu'à 1e12) accumulent sinon du bruit d'arrondi
+KPI_DRIFT_TOLERANCE = float(os.getenv("KPI_DRIFT_TOLERANCE", "1e-9"))
+
+# Colonnes des sommes maintenues par devise
+SWAP_COUNT, SWAP_NOMINAL, SWAP_FORWARD_NOMINAL, SWAP_MATURITY_NOMINAL = range(4)
+LOAN_COUNT, LOAN_NOMINAL, LOAN_CONVERTED, LOAN_MATURITY_CONVERTED = range(4, 8)
+N_FIELDS = 8
+
+# Indicateurs calculés par devise à partir des sommes et du taux spot
+VALUE_FIELDS = ("mtm", "exposure", "stress_up", "stress_down", "weighted_days", "sensitivity")
+
+
+def deal_contributions(book: Book) -> np.ndarray:
+    """
+    Contribution de chaque deal aux sommes par devise.
+
+    Toutes les métriques du dashboard sont linéaires en ces sommes pour un
+    taux spot donné : les agrégats peuvent donc être mis à jour deal par deal.
+
+    Args:
+        book: Portefeuille en colonnes
+
+    Returns:
+        np.ndarray: Matrice deals × N_FIELDS
+    """
+    is_swap = (book.kinds == SWAP).astype(np.float64)
+    is_loan = (book.kinds == LOAN).astype(np.float64)
+    maturity = book.maturity_date.astype(np.int64).astype(np.float64)
+    converted = book.nominal * book.conversion_rate
+    return np.column_stack([
+        is_swap,
+        is_swap * book.nominal,
+        is_swap * book.forward_rate * book.nominal,
+        is_swap * maturity * book.nominal,
+        is_loan,
+        is_loan * book.nominal,
+        is_loan * converted,
+        is_loan * maturity * converted,
+    ]).reshape(len(book), N_FIELDS)
+
+
+def value_sums(sums: np.ndarray, spot: np.ndarray, today: date, variation: float = 0.05) -> np.ndarray:
+    """
+    Valorise des sommes par devise.
+
+    Args:
+        sums: Matrice devises × N_FIELDS
+        spot: Taux spot EUR/devise, un par ligne
+        today: Date de valorisation
+        variation: Choc appliqué au taux forward pour le stress test
+
+    Returns:
+        np.ndarray: Matrice devises × VALUE_FIELDS
+    """
+    s = sums.T
+    day = float(np.datetime64(today, "D").astype(np.int64))
+    swap_spot_value = spot * s[SWAP_NOMINAL]
+    return np.column_stack([
+        s[SWAP_FORWARD_NOMINAL] - swap_spot_value + spot * s[LOAN_NOMINAL] - s[LOAN_CONVERTED],
+        swap_spot_value + s[LOAN_CONVERTED],
+        (1 + variation) * s[SWAP_FORWARD_NOMINAL] - swap_spot_value,
+        (1 - variation) * s[SWAP_FORWARD_NOMINAL] - swap_spot_value,
+        spot * (s[SWAP_MATURITY_NOMINAL] - day * s[SWAP_NOMINAL]) + s[LOAN_MATURITY_CONVERTED] - day * s[LOAN_CONVERTED],
+        spot * (s[LOAN_NOMINAL] - s[SWAP_NOMINAL]),
+    ]).reshape(len(sums), len(VALUE_FIELDS))
+
+
+def bucket_sums(book: Book, contributions: np.ndarray) -> np.ndarray:
+    """Somme des contributions par devise du Book (matrice devises × N_FIELDS)."""
+    n = len(book.currencies)
+    return np.column_stack([
+        np.bincount(book.currency_idx, weights=contributions[:, k], minlength=n) for k in range(N_FIELDS)
+    ]).reshape(n, N_FIELDS)
+
+
+class CurrencyBuckets:
+    """Sommes par devise d'un portefeuille et leur valorisation."""
+
+    def __init__(self, currencies: List[str], sums: np.ndarray):
+        active = (sums[:, SWAP_COUNT] + sums[:, LOAN_COUNT]) > 0.5
+        self.currencies = [c for c, keep in zip(currencies, active.tolist()) if keep]
+        self.sums = sums[active]
+        self.values: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_book(cls, book: Book) -> "CurrencyBuckets":
+        return cls(book.currencies, bucket_sums(book, deal_contributions(book)))
+
+    def value(self, spots: Dict[str, float], today: date, variation: float = 0.05) -> np.ndarray:
+        spot = np.array([spots[c] for c in self.currencies], dtype=np.float64)
+        self.values = value_sums(self.sums, spot, today, variation)
+        return self.values
+
+    def column(self, field: str) -> np.ndarray:
+        return self.values[:, VALUE_FIELDS.index(field)]
+
+    def summary(self) -> Dict:
+        """
+        Blocs agrégés du dashboard à partir des valeurs par devise.
+
+        Returns:
+            Dict: Blocs mtm_summary, stress_test, var, weighted_maturity et exposure_by_currency
+        """
+        mtm = self.column("mtm")
+        exposure = self.column("exposure")
+        total_nominal_eur = float(exposure.sum())
+        weighted_days = float(self.column("weighted_days").sum())
+        return {
+            "mtm_summary": {
+                "total_mtm_eur": float(mtm.sum()),
+                "by_currency": dict(zip(self.currencies, mtm.tolist())),
+            },
+            "stress_test": {
+                "up_5_percent": float(self.column("stress_up").sum()),
+                "down_5_percent": float(self.column("stress_down").sum()),
+            },
+            "var": {"var_5_percent": 0.0},
+            "weighted_maturity": {
+                "days": weighted_days / total_nominal_eur if total_nominal_eur > 0 else 0.0,
+                "total_nominal_eur": total_nominal_eur,
+            },
+            "exposure_by_currency": dict(zip(self.currencies, exposure.tolist())),
+        }
+
+    def timeseries(self, days: List[date], closes: np.ndarray) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Séries temporelles de MTM et de stress des swaps.
+
+        Un jour sans cours pour une devise exclut les swaps de cette devise
+        pour ce jour ; les stress tests restent ceux du spot courant.
+
+        Args:
+            days: Jours de la série
+            closes: Cours de clôture EUR/devise, matrice jours × devises (NaN si absent)
+
+        Returns:
+            Tuple: (mtm_timeseries, stress_test_timeseries)
+        """
+        s = self.sums.T
+        available = ~np.isnan(closes) & (s[SWAP_COUNT] > 0.5)
+        mtm_days = np.where(available, s[SWAP_FORWARD_NOMINAL] - np.nan_to_num(closes) * s[SWAP_NOMINAL], 0.0).sum(axis=1)
+        up_days = np.where(available, self.column("stress_up"), 0.0).sum(axis=1)
+        down_days = np.where(available, self.column("stress_down"), 0.0).sum(axis=1)
+
+        mtm_timeseries = [{"date": day.isoformat(), "mtm": float(m)} for day, m in zip(days, mtm_days)]
+        stress_timeseries = [
+            {"date": day.isoformat(), "up_5_percent": float(u), "down_5_percent": float(d)}
+            for day, u, d in zip(days, up_days, down_days)
+        ]
+        return mtm_timeseries, stress_timeseries
+
+
+class KpiAggregates:
+    """
+    Sommes par devise de tout le portefeuille, maintenues de façon incrémentale.
+
+    Les routes d'écriture des swaps et des prêts appliquent leurs deltas ;
+    un dashboard sans filtre coûte alors O(nombre de devises). La
+    valorisation par devise est conservée et seule une devise dont le taux
+    ou les sommes ont changé est revalorisée. Un recalcul complet périodique
+    (reconcile) corrige la dérive, y compris les écritures faites par un
+    autre processus ; les écritures du processus survenues pendant la
+    lecture des tables (voir tracking) sont rejouées après le recalcul.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._currency_index: Dict[str, int] = {}
+        self._sums = np.zeros((0, N_FIELDS))
+        self._versions = np.zeros(0, dtype=np.int64)
+        self._deals: Dict[Tuple[int, int], Tuple[int, np.ndarray]] = {}
+        self._valued_key = np.zeros((0, 3))
+        self._values = np.zeros((0, len(VALUE_FIELDS)))
+        self.loaded = False
+        self.last_reconcile: Optional[float] = None
+        # Écritures appliquées pendant une lecture des tables en cours :
+        # (type, id) -> (devise, contribution), ou None pour une suppression
+        self._tracking = 0
+        self._journal: Dict[Tuple[int, int], Optional[Tuple[str, np.ndarray]]] = {}
+
+    def _currency(self, currency: str) -> int:
+        if currency not in self._currency_index:
+            self._currency_index[currency] = len(self._currency_index)
+            self._sums = np.vstack([self._sums, np.zeros((1, N_FIELDS))])
+            self._versions = np.append(self._versions, 0)
+            self._valued_key = np.vstack([self._valued_key, np.full((1, 3), np.nan)])
+            self._values = np.vstack([self._values, np.zeros((1, len(VALUE_FIELDS)))])
+        return self._currency_index[currency]
+
+    def _apply(self, key: Tuple[int, int], entry: Optional[Tuple[int, np.ndarray]]) -> None:
+        previous = self._deals.pop(key, None)
+        if previous is not None:
+            self._sums[previous[0]] -= previous[1]
+            self._versions[previous[0]] += 1
+        if entry is not None:
+            self._deals[key] = entry
+            self._sums[entry[0]] += entry[1]
+            self._versions[entry[0]] += 1
+
+    def _record(self, key: Tuple[int, int], currency: Optional[str], contribution: Optional[np.ndarray]) -> None:
+        if self._tracking:
+            self._journal[key] = None if currency is None else (currency, contribution)
+
+    @contextmanager
+    def tracking(self) -> Iterator[None]:
+        """
+        Journalise les écritures pendant la lecture des tables d'un reconcile.
+
+        Les tables lues peuvent précéder une écriture faite pendant la
+        lecture : reconcile() rejoue alors le journal sur les sommes
+        recalculées.
+        """
+        with self._lock:
+            self._tracking += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._tracking -= 1
+                if not self._tracking:
+                    self._journal = {}
+
+    def reconcile(self, swaps: List[Dict], loans: List[Dict]) -> float:
+        """
+        Recalcule tous les agrégats depuis les tables et mesure la dérive.
+
+        Les écritures journalisées depuis le début de la lecture des tables
+        (voir tracking) sont rejouées après le recalcul.
+
+        Args:
+            swaps: Lignes de la table swaps
+            loans: Lignes de la table loans
+
+        Returns:
+            float: Écart relatif maximal entre les sommes maintenues et recalculées
+        """
+        book = load_book(swaps, loans)
+        contributions = deal_contributions(book)
+        with self._lock:
+            previous = {c: self._sums[i].copy() for c, i in self._currency_index.items()} if self.loaded else {}
+            self._currency_index = {}
+            self._sums = np.zeros((0, N_FIELDS))
+            self._versions = np.zeros(0, dtype=np.int64)
+            self._valued_key = np.zeros((0, 3))
+            self._values = np.zeros((0, len(VALUE_FIELDS)))
+            self._deals = {}
+            for currency in book.currencies:
+                self._currency(currency)
+            for kind, deal_id, currency_idx, contribution in zip(book.kinds.tolist(), book.ids.tolist(), book.currency_idx.tolist(), contributions):
+                self._deals[(kind, deal_id)] = (currency_idx, contribution)
+            self._sums = bucket_sums(book, contributions)
+            for key, written in self._journal.items():
+                self._apply(key, None if written is None else (self._currency(written[0]), written[1]))
+            drift = 0.0
+            for currency, sums in previous.items():
+                fresh = self._sums[self._currency_index[currency]] if currency in self._currency_index else np.zeros(N_FIELDS)
+                scale = np.maximum(np.maximum(np.abs(fresh), np.abs(sums)), 1.0)
+                drift = max(drift, float((np.abs(fresh - sums) / scale).max()))
+            self.loaded = True
+            self.last_reconcile = time.monotonic()
+        if drift > KPI_DRIFT_TOLERANCE:
+            logging.warning(f"Dérive des agrégats KPI corrigée (écart relatif max {drift:.3g})")
+        return drift
+
+    def needs_reconcile(self) -> bool:
+        return not self.loaded or time.monotonic() - self.last_reconcile > KPI_RECONCILE_INTERVAL
+
+    def upsert_deal(self, kind: int, row: Dict) -> None:
+        """
+        Applique la création ou la mise à jour d'un deal.
+
+        Args:
+            kind: SWAP ou LOAN
+            row: Ligne écrite en base
+        """
+        if not self.loaded and not self._tracking:
+            return
+        book = load_book([row], []) if kind == SWAP else load_book([], [row])
+        with self._lock:
+            currency, contribution = (book.currencies[0], deal_contributions(book)[0]) if len(book) else (None, None)
+            self._record((kind, row["id"]), currency, contribution)
+            if not self.loaded:
+                return
+            self._apply((kind, row["id"]), None if currency is None else (self._currency(currency), contribution))
+
+    def remove_deal(self, kind: int, deal_id: int) -> None:
+        """Retire un deal supprimé des agrégats."""
+        with self._lock:
+            self._record((kind, deal_id), None, None)
+            if not self.loaded:
+                return
+            self._apply((kind, deal_id), None)
+
+    def buckets(self, spots: Dict[str, float], today: date) -> CurrencyBuckets:
+        """
+        Sommes par devise valorisées aux taux donnés.
+
+        Seules les devises dont le taux, la date ou les sommes ont changé
+        depuis le dernier appel sont revalorisées.
+
+        Args:
+            spots: Taux spot EUR/devise par devise active
+            today: Date de valorisation
+
+        Returns:
+            CurrencyBuckets: Sommes et valeurs des devises actives
+        """
+        with self._lock:
+            currencies = list(self._currency_index)
+            active = (self._sums[:, SWAP_COUNT] + self._sums[:, LOAN_COUNT]) > 0.5
+            spot = np.array([spots.get(c, np.nan) for c in currencies], dtype=np.float64)
+            day = np.full(len(currencies), np.datetime64(today, "D").astype(np.int64))
+            key = np.column_stack([spot, day, self._versions]).reshape(len(currencies), 3)
+            stale = active & ~(key == self._valued_key).all(axis=1)
+            if stale.any():
+                self._values[stale] = value_sums(self._sums[stale], spot[stale], today)
+                self._valued_key[stale] = key[stale]
+            buckets = CurrencyBuckets(currencies, self._sums.copy())
+            buckets.values = self._values[active].copy()
+        return buckets
+
+    def sums(self) -> CurrencyBuckets:
+        """Sommes par devise des devises actives, sans valorisation."""
+        with self._lock:
+            return CurrencyBuckets(list(self._currency_index), self._sums.copy())
+
+    def deal_count(self) -> int:
+        with self._lock:
+            return len(self._deals)
+
+    def currencies(self) -> List[str]:
+        """Devises ayant au moins un deal."""
+        with self._lock:
+            active = (self._sums[:, SWAP_COUNT] + self._sums[:, LOAN_COUNT]) > 0.5
+            return [c for c, keep in zip(self._currency_index, active.tolist()) if keep]
+
+
+kpi_aggregates = KpiAggregates()
@@ -0,0 +1,74 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+import asyncio
+import contextvars
+import logging
+import os
+import weakref
+
+logging.basicConfig(level=logging.WARNING)
+
+# Nombre maximal d'appels bloquants (base de données, Yahoo Finance) en parallèle
+IO_CONCURRENCY = int(os.getenv("IO_CONCURRENCY", "8"))
+# Délai maximal d'un appel avant abandon, en secondes
+IO_TIMEOUT = float(os.getenv("IO_TIMEOUT", "15"))
+# Délai des écritures non idempotentes (insert, update, delete), en secondes (0 : sans limite).
+# Une écriture abandonnée peut encore aboutir : ce délai doit rester plus long que
+# celui du backend, pour que le client ne reçoive pas un 504 sur une écriture faite.
+IO_WRITE_TIMEOUT = float(os.getenv("IO_WRITE_TIMEOUT", "120")) or None
+
+# Threads dédiés : un appel abandonné garde son thread, et sa place, jusqu'à sa fin
+_executor = ThreadPoolExecutor(max_workers=IO_CONCURRENCY, thread_name_prefix="io")
+# Un sémaphore par boucle d'événements : un asyncio.Semaphore est lié à la boucle
+# qui l'utilise en premier (asyncio.run répétés, CLI du snapshot)
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def _loop_semaphore(loop: asyncio.AbstractEventLoop) -> asyncio.Semaphore:
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(IO_CONCURRENCY)
+    return semaphore
+
+
+def _release(loop: asyncio.AbstractEventLoop, semaphore: asyncio.Semaphore) -> None:
+    """Libère la place depuis le thread de l'appel ; inutile si la boucle est déjà fermée."""
+    if loop.is_closed():
+        return
+    try:
+        loop.call_soon_threadsafe(semaphore.release)
+    except RuntimeError:
+        # Boucle fermée entre-temps : le sémaphore disparaît avec elle
+        pass
+
+
+async def run_io(func: Callable, *args, timeout: Optional[float] = IO_TIMEOUT, **kwargs) -> Any:
+    """
+    Exécute un appel bloquant dans un thread, sous limite de concurrence et de délai.
+
+    Un appel qui dépasse le délai n'est pas interrompu : sa place n'est
+    libérée qu'à la fin du thread, IO_CONCURRENCY borne donc réellement
+    les appels en cours.
+
+    Args:
+        func: Fonction bloquante à exécuter
+        *args: Arguments positionnels
+        timeout: Délai maximal en secondes (None : sans limite)
+        **kwargs: Arguments nommés
+
+    Returns:
+        Any: Résultat de la fonction
+
+    Raises:
+        asyncio.TimeoutError: Si l'appel dépasse le délai
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = _loop_semaphore(loop)
+    await semaphore.acquire()
+    try:
+        future = _executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
+    except BaseException:
+        semaphore.release()
+        raise
+    future.add_done_callback(lambda _: _release(loop, semaphore))
+    return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
@@ -0,0 +1,85 @@
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import numpy as np
+from app.aio import run_io
+from app.repository import Filter, fetch_rows
+from app.pagination import fetch_table
+from app.utils import get_spot_rates
+from app.rate_store import rate_store
+from app.replica import book_replica
+from app.valuation import Book, load_book
+
+# Colonnes nécessaires à la valorisation
+SWAP_COLUMNS = "id,currency,nominal,start_date,maturity_date,spot_rate,forward_rate,bank_id"
+LOAN_COLUMNS = "id,currency,nominal,start_date,maturity_date,conversion_rate"
+
+
+def book_filters(deal_ids: Optional[List[int]], start_date: Optional[date], end_date: Optional[date]) -> List[Filter]:
+    """
+    Filtres des deals à valoriser, appliqués côté serveur.
+
+    Args:
+        deal_ids: Identifiants des deals à retenir
+        start_date: Date de début minimale
+        end_date: Date d'échéance maximale
+
+    Returns:
+        List[Filter]: Filtres (colonne, opérateur, valeur)
+    """
+    filters: List[Filter] = []
+    if deal_ids:
+        filters.append(("id", "in", deal_ids))
+    if start_date:
+        filters.append(("start_date", "gte", start_date.isoformat()))
+    if end_date:
+        filters.append(("maturity_date", "lte", end_date.isoformat()))
+    return filters
+
+
+async def fetch_book(deal_ids: Optional[List[int]], start_date: Optional[date], end_date: Optional[date]) -> Tuple[List[Dict], List[Dict]]:
+    """Charge en parallèle les swaps et les prêts à valoriser."""
+    if not (deal_ids or start_date or end_date):
+        if book_replica.loaded:
+            return book_replica.deals(SWAP_COLUMNS, LOAN_COLUMNS)
+        return await asyncio.gather(fetch_table("swaps", SWAP_COLUMNS), fetch_table("loans", LOAN_COLUMNS))
+    filters = book_filters(deal_ids, start_date, end_date)
+    return await asyncio.gather(
+        fetch_rows("swaps", SWAP_COLUMNS, filters),
+        fetch_rows("loans", LOAN_COLUMNS, filters)
+    )
+
+
+async def load_deals(deal_ids: Optional[List[int]], start_date: Optional[date], end_date: Optional[date]) -> Book:
+    """
+    Book des deals à valoriser : filtré en mémoire sur la réplique si elle est
+    chargée, sinon lu dans Supabase avec les filtres côté serveur.
+    """
+    if book_replica.loaded:
+        book = book_replica.book()
+        # Bornes de dates : recherches dichotomiques dans l'index du Book
+        selected = book.index.select(start_from=start_date, maturity_to=end_date)
+        if deal_ids:
+            selected = selected[np.isin(book.ids[selected], deal_ids)]
+        return book if len(selected) == len(book) else book.take(selected).compact()
+    swaps, loans = await fetch_book(deal_ids, start_date, end_date)
+    return load_book(swaps, loans)
+
+
+async def load_market(currencies: List[str], history_start: date, history_end: date) -> Tuple[Dict[str, float], np.ndarray]:
+    """
+    Récupère en parallèle les taux spot et l'historique des cours EUR/devise.
+
+    Args:
+        currencies: Devises du portefeuille
+        history_start: Premier jour d'historique
+        history_end: Dernier jour d'historique
+
+    Returns:
+        Tuple: (taux spot par devise, matrice jours × devises des clôtures)
+    """
+    spots, (_, closes) = await asyncio.gather(
+        run_io(get_spot_rates, "EUR", currencies),
+        run_io(rate_store.history, "EUR", currencies, history_start, history_end)
+    )
+    return spots, closes
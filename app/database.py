@@ -1,28 +1,34 @@
-# app/database.py (optionnel, uniquement pour documentation ou validation)
+# app/database.py : base déclarative et moteur du backend SQL (STORAGE_BACKEND=sql)
 
-from pydantic import BaseModel
-from datetime import date
+import os
+from sqlalchemy import create_engine
+from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import StaticPool
 
-class BankModel(BaseModel):
-    id: int
-    name: str
+# Ex. sqlite:///./treasury.db en local, postgresql+psycopg2://... pour la base Supabase
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./treasury.db")
+# Connexions conservées par le pool (hors SQLite)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
 
-class LoanModel(BaseModel):
-    id: int
-    currency: str
-    amount: float
-    interest_rate: float
-    start_date: date
-    maturity_date: date
-    conversion_rate: float
-    payment_frequency: str
 
-class SwapModel(BaseModel):
-    id: int
-    start_date: date
-    maturity_date: date
-    currency: str
-    spot_rate: float
-    forward_rate: float
-    nominal: float
-    bank_id: int
+class Base(DeclarativeBase):
+    pass
+
+
+def create_db_engine(url: str = DATABASE_URL):
+    """
+    Crée le moteur SQLAlchemy et son pool de connexions.
+
+    Les connexions SQLite sont partagées entre les threads de run_io ; une
+    base SQLite en mémoire garde une connexion unique pour ne pas être
+    recréée vide à chaque connexion.
+    """
+    if url.startswith("sqlite"):
+        in_memory = url in ("sqlite://", "sqlite:///:memory:")
+        return create_engine(
+            url,
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool if in_memory else None,
+        )
+    return create_engine(url, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_pre_ping=True)
@@ -0,0 +1,139 @@
+from datetime import date
+from importlib.util import find_spec
+from typing import Dict, Iterator
+import csv
+import io
+import os
+import numpy as np
+from fastapi.responses import StreamingResponse
+from app.responses import CORS_HEADERS
+from app.valuation import DEAL_TYPES, Book, Valuation
+
+# Lignes par bloc CSV, par record batch Arrow et par row group Parquet
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "10000"))
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+EXPORT_EXTENSIONS = {"csv": "csv", "arrow": "arrows", "parquet": "parquet"}
+
+
+def pyarrow_available() -> bool:
+    """Les formats arrow et parquet nécessitent le paquet optionnel pyarrow."""
+    return find_spec("pyarrow") is not None
+
+
+def export_columns(book: Book, valuation: Valuation) -> Dict[str, np.ndarray]:
+    """Colonnes de l'export, une valeur par deal, dans l'ordre des colonnes du fichier."""
+    return {
+        "deal_id": book.ids,
+        "deal_type": book.kinds,
+        "currency": book.currency_idx,
+        "bank_id": book.bank_id,
+        "nominal": book.nominal,
+        "exposure_eur": valuation.nominal_eur,
+        "mtm_eur": valuation.mtm,
+        "stressed_mtm_up_eur": valuation.stress_up,
+        "stressed_mtm_down_eur": valuation.stress_down,
+        "remaining_days": valuation.remaining_days,
+    }
+
+
+def csv_chunks(book: Book, columns: Dict[str, np.ndarray]) -> Iterator[bytes]:
+    """Fichier CSV par blocs de EXPORT_CHUNK_ROWS lignes."""
+    deal_types = np.array([DEAL_TYPES[kind] for kind in sorted(DEAL_TYPES)], dtype=object)
+    currencies = np.array(book.currencies, dtype=object)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for start in range(0, len(book), EXPORT_CHUNK_ROWS):
+        chunk = slice(start, start + EXPORT_CHUNK_ROWS)
+        values = {name: column[chunk] for name, column in columns.items()}
+        values["deal_type"] = deal_types[values["deal_type"]]
+        values["currency"] = currencies[values["currency"]]
+        bank_id = values["bank_id"]
+        values["bank_id"] = np.where(bank_id >= 0, bank_id.astype(object), None)
+        writer.writerows(zip(*[column.tolist() for column in values.values()]))
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def arrow_table(book: Book, columns: Dict[str, np.ndarray]):
+    """
+    Table Arrow construite directement depuis les colonnes NumPy.
+
+    Les colonnes numériques sont reprises sans copie ; le type de deal et la
+    devise sont encodés en dictionnaire à partir des indices du Book.
+    """
+    import pyarrow as pa
+
+    arrays = {name: pa.array(column) for name, column in columns.items()}
+    arrays["deal_type"] = pa.DictionaryArray.from_arrays(
+        pa.array(columns["deal_type"]), pa.array([DEAL_TYPES[kind] for kind in sorted(DEAL_TYPES)])
+    )
+    arrays["currency"] = pa.DictionaryArray.from_arrays(
+        pa.array(columns["currency"].astype(np.int32)), pa.array(book.currencies, type=pa.string())
+    )
+    arrays["bank_id"] = pa.array(columns["bank_id"], mask=columns["bank_id"] < 0)
+    return pa.table(arrays)
+
+
+def arrow_chunks(table) -> Iterator[bytes]:
+    """Flux Arrow IPC, un record batch par bloc."""
+    import pyarrow as pa
+
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=EXPORT_CHUNK_ROWS):
+            writer.write_batch(batch)
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()
+
+
+def parquet_chunks(table) -> Iterator[bytes]:
+    """Fichier Parquet émis row group par row group (le pied de fichier en dernier)."""
+    import pyarrow.parquet as pq
+
+    sink = io.BytesIO()
+    with pq.ParquetWriter(sink, table.schema) as writer:
+        for start in range(0, max(table.num_rows, 1), EXPORT_CHUNK_ROWS):
+            writer.write_table(table.slice(start, EXPORT_CHUNK_ROWS))
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()
+
+
+def export_response(book: Book, valuation: Valuation, format: str, today: date) -> StreamingResponse:
+    """
+    Réponse en flux de l'export des valorisations par deal.
+
+    Args:
+        book: Deals valorisés
+        valuation: Valorisation des deals
+        format: csv, arrow (IPC stream) ou parquet ; les deux derniers nécessitent pyarrow
+        today: Date de valorisation, reprise dans le nom du fichier
+
+    Returns:
+        StreamingResponse: Fichier en pièce jointe
+    """
+    columns = export_columns(book, valuation)
+    if format == "csv":
+        chunks = csv_chunks(book, columns)
+    elif format == "arrow":
+        chunks = arrow_chunks(arrow_table(book, columns))
+    else:
+        chunks = parquet_chunks(arrow_table(book, columns))
+    filename = f"valuations-{today.isoformat()}.{EXPORT_EXTENSIONS[format]}"
+    return StreamingResponse(
+        chunks,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={**CORS_HEADERS, "Content-Disposition": f'attachment; filename="{filename}"'},
+    )
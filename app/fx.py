@@ -0,0 +1,192 @@
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional
+import logging
+import os
+import threading
+import time
+import numpy as np
+from app.metrics import spot_cache_requests
+from app.rate_cache import fetch_spot_rates
+
+logging.basicConfig(level=logging.WARNING)
+
+# Devise pivot : un seul taux pivot/devise est téléchargé par devise
+FX_PIVOT = os.getenv("FX_PIVOT", "EUR")
+SPOT_RATE_TTL = float(os.getenv("SPOT_RATE_TTL", "300"))
+# Nombre maximal de devises re-téléchargées à chaque rafraîchissement de l'instantané
+SPOT_RATE_CACHE_SIZE = int(os.getenv("SPOT_RATE_CACHE_SIZE", "100"))
+# Durée pendant laquelle une devise non cotée par Yahoo Finance n'est plus redemandée
+SPOT_RATE_FAILURE_TTL = float(os.getenv("SPOT_RATE_FAILURE_TTL", "300"))
+
+
+def pivot_pair(pivot: str, currency: str) -> str:
+    """Ticker Yahoo Finance du taux pivot/devise (ex. EURUSD=X)."""
+    return f"{pivot}{currency}=X"
+
+
+class RateSnapshot:
+    """
+    Jeu de taux cohérent, issu d'un seul téléchargement.
+
+    legs[c] est le nombre d'unités de c pour une unité de la devise pivot ;
+    tout taux croisé base/devise s'en déduit par triangulation,
+    legs[devise] / legs[base], si bien que les croisements d'un même
+    instantané sont toujours cohérents entre eux.
+    """
+
+    def __init__(self, pivot: str, legs: Dict[str, float], as_of: float):
+        self.pivot = pivot
+        self.legs = {**legs, pivot: 1.0}
+        self.as_of = as_of
+
+    def covers(self, currencies: Iterable[str]) -> bool:
+        return all(c in self.legs for c in currencies)
+
+    def rate(self, base_currency: str, quote_currency: str) -> float:
+        """Unités de quote_currency pour une unité de base_currency."""
+        try:
+            return self.legs[quote_currency] / self.legs[base_currency]
+        except KeyError as e:
+            raise ValueError(f"Taux absent de l'instantané pour {e.args[0]}")
+
+    def rates(self, base_currency: str, quote_currencies: Iterable[str]) -> Dict[str, float]:
+        return {quote: self.rate(base_currency, quote) for quote in quote_currencies}
+
+    def matrix(self, currencies: List[str]) -> np.ndarray:
+        """Matrice des taux croisés : élément [i, j] = taux currencies[i]/currencies[j]."""
+        legs = np.array([self.legs[c] for c in currencies], dtype=np.float64)
+        return legs[None, :] / legs[:, None]
+
+
+class RateMatrix:
+    """
+    Service de taux spot par triangulation autour d'une devise pivot.
+
+    Le nombre de téléchargements croît avec le nombre de devises et non de
+    paires. L'instantané courant est servi tant qu'il a moins de ttl
+    secondes et couvre les devises demandées ; sinon les devises demandées
+    et les plus récemment utilisées, dans la limite de maxsize, sont
+    re-téléchargées en un seul appel, pour que tous les taux d'un instantané
+    datent du même instant. Les requêtes concurrentes attendent le
+    téléchargement en cours plutôt que d'en lancer un autre. Une devise que
+    Yahoo Finance ne cote pas est refusée sans téléchargement pendant
+    failure_ttl secondes.
+    """
+
+    def __init__(
+        self,
+        fetch_many: Callable[[List[str]], Dict[str, float]] = fetch_spot_rates,
+        pivot: str = FX_PIVOT,
+        ttl: float = SPOT_RATE_TTL,
+        maxsize: int = SPOT_RATE_CACHE_SIZE,
+        failure_ttl: float = SPOT_RATE_FAILURE_TTL,
+    ):
+        self.fetch_many = fetch_many
+        self.pivot = pivot
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.failure_ttl = failure_ttl
+        self._snapshot: Optional[RateSnapshot] = None
+        # Devises par utilisation la plus récente, et devises en échec -> fin de l'exclusion
+        self._recent: "OrderedDict[str, None]" = OrderedDict()
+        self._failed: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+
+    def _touch(self, currencies: List[str]) -> None:
+        with self._lock:
+            for c in currencies:
+                if c != self.pivot:
+                    self._recent[c] = None
+                    self._recent.move_to_end(c)
+            while len(self._recent) > self.maxsize:
+                self._recent.popitem(last=False)
+
+    def _check_failed(self, currencies: List[str]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            failed = [c for c in currencies if self._failed.get(c, 0.0) > now]
+        if failed:
+            raise ValueError(f"Impossible de récupérer le taux spot pour {', '.join(pivot_pair(self.pivot, c) for c in failed)}")
+
+    def _current(self, currencies: List[str]) -> Optional[RateSnapshot]:
+        with self._lock:
+            snapshot = self._snapshot
+        if snapshot is not None and time.time() - snapshot.as_of < self.ttl and snapshot.covers(currencies):
+            return snapshot
+        return None
+
+    def snapshot(self, currencies: Iterable[str]) -> RateSnapshot:
+        """
+        Instantané de taux couvrant les devises demandées.
+
+        Args:
+            currencies: Devises nécessaires (base et devises de cotation)
+
+        Returns:
+            RateSnapshot: Taux cohérents, à utiliser pour toute la requête
+
+        Raises:
+            ValueError: Si le taux d'une devise ne peut pas être récupéré
+        """
+        currencies = list(dict.fromkeys(currencies))
+        snapshot = self._current(currencies)
+        if snapshot is not None:
+            spot_cache_requests.inc("hit")
+            self._touch(currencies)
+            return snapshot
+        self._check_failed(currencies)
+
+        with self._fetch_lock:
+            # Un téléchargement concurrent a pu couvrir la demande entre-temps
+            snapshot = self._current(currencies)
+            if snapshot is not None:
+                spot_cache_requests.inc("coalesced")
+                self._touch(currencies)
+                return snapshot
+            self._check_failed(currencies)
+            spot_cache_requests.inc("miss")
+
+            self._touch(currencies)
+            with self._lock:
+                now = time.monotonic()
+                recent = [c for c in reversed(self._recent) if self._failed.get(c, 0.0) <= now]
+            requested = [c for c in currencies if c != self.pivot]
+            needed = list(dict.fromkeys(requested + recent))[:max(self.maxsize, len(requested))]
+            pairs = {c: pivot_pair(self.pivot, c) for c in needed}
+            fetched: Dict[str, float] = {}
+            if pairs:
+                try:
+                    fetched = self.fetch_many(list(pairs.values()))
+                except Exception as e:
+                    logging.error(f"Erreur lors de la récupération des taux spot : {e}")
+                else:
+                    # Réponse obtenue sans la paire : devise non cotée, exclue pendant failure_ttl
+                    with self._lock:
+                        until = time.monotonic() + self.failure_ttl
+                        for c, pair in pairs.items():
+                            if pair not in fetched:
+                                self._failed[c] = until
+                                self._recent.pop(c, None)
+                            else:
+                                self._failed.pop(c, None)
+
+            legs = {c: fetched[pair] for c, pair in pairs.items() if pair in fetched}
+            snapshot = RateSnapshot(self.pivot, legs, time.time())
+            if legs:
+                # Conservé même si une devise demandée manque : les autres restent servies
+                with self._lock:
+                    self._snapshot = snapshot
+            missing = [pairs[c] for c in currencies if c in pairs and pairs[c] not in fetched]
+            if missing:
+                raise ValueError(f"Impossible de récupérer le taux spot pour {', '.join(missing)}")
+            return snapshot
+
+    def clear(self) -> None:
+        with self._lock:
+            self._snapshot = None
+            self._recent.clear()
+            self._failed.clear()
+
+
+rate_matrix = RateMatrix()
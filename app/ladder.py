@@ -0,0 +1,70 @@
+from datetime import date
+from typing import Dict, List, Sequence
+import numpy as np
+from app.valuation import Book, Valuation, day_number
+
+# Bornes des tranches de maturité résiduelle, en jours : 0–1m, 1–3m, 3–12m, 1y+
+LADDER_EDGES = (0, 30, 91, 365)
+EDGE_LABELS = {0: "0", 30: "1m", 91: "3m", 182: "6m", 365: "1y", 730: "2y", 1825: "5y"}
+
+
+def bucket_labels(edges: Sequence[int]) -> List[str]:
+    """Libellés des tranches ("1m-3m", ..., "1y+") ; les bornes sans libellé sont en jours."""
+    names = [EDGE_LABELS.get(edge, f"{edge}d") for edge in edges]
+    return [f"{low}-{high}" for low, high in zip(names, names[1:])] + [f"{names[-1]}+"]
+
+
+def maturity_ladder(book: Book, valuation: Valuation, today: date, edges: Sequence[int] = LADDER_EDGES) -> Dict:
+    """
+    Échéancier de l'exposition et du MTM par tranche de maturité résiduelle.
+
+    Les deals sont parcourus dans l'ordre de l'index des échéances : les bornes
+    de tranches sont des recherches dichotomiques et les sommes des
+    différences de sommes cumulées. Les deals déjà échus sont comptés à part.
+
+    Args:
+        book: Deals valorisés
+        valuation: Valorisation du Book
+        today: Date de valorisation
+        edges: Bornes croissantes des tranches, en jours à partir de today
+
+    Returns:
+        Dict: Tranches (exposition, MTM, stress, nombre de deals, exposition cumulée)
+    """
+    index = book.index
+    order = index.by_maturity
+    values = np.column_stack([
+        valuation.nominal_eur[order],
+        valuation.mtm[order],
+        valuation.stress_up[order],
+        np.ones(len(book)),
+    ])
+    cumulative = np.vstack([np.zeros((1, values.shape[1])), np.cumsum(values, axis=0)])
+
+    bounds = index.maturity_positions(day_number(today) + np.asarray(edges, dtype=np.int64))
+    bounds = np.append(bounds, len(book))
+    sums = cumulative[bounds[1:]] - cumulative[bounds[:-1]]
+    running_exposure = cumulative[bounds[1:], 0] - cumulative[bounds[0], 0]
+
+    buckets = [
+        {
+            "bucket": label,
+            "min_days": low,
+            "max_days": high,
+            "exposure_eur": exposure,
+            "mtm_eur": mtm,
+            "stress_mtm_eur": stress,
+            "deal_count": int(count),
+            "cumulative_exposure_eur": running,
+        }
+        for label, low, high, (exposure, mtm, stress, count), running in zip(
+            bucket_labels(edges), list(edges), list(edges[1:]) + [None], sums.tolist(), running_exposure.tolist()
+        )
+    ]
+    return {
+        "as_of": today.isoformat(),
+        "buckets": buckets,
+        "matured_deal_count": int(bounds[0]),
+        "total_exposure_eur": float(cumulative[-1, 0] - cumulative[bounds[0], 0]),
+        "total_mtm_eur": float(cumulative[-1, 1] - cumulative[bounds[0], 1]),
+    }
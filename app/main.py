@@ -1,12 +1,44 @@
+from contextlib import asynccontextmanager
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.metrics import PROMETHEUS_CONTENT_TYPE, MetricsMiddleware, registry
+from app.repository import close_repository, init_repository
+from app.aio import run_io
+from app.writeback import writer
+from app.warmup import warm_up
+from app.snapshot import KPI_SNAPSHOT_INTERVAL, KPI_SNAPSHOT_SCHEDULER, snapshot_scheduler
+from app.replica import BOOK_REPLICA, ReplicaHeadersMiddleware, book_replica, replica_poller
 from app.routes import loans_router, swaps_router, banks_router, kpi_router
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Backend de stockage (client Supabase ou pool SQL) partagé, créé une fois par processus
+    init_repository()
+    warmup = asyncio.create_task(warm_up())
+    # Réplique en mémoire du portefeuille : chargée avant de servir, puis synchronisée
+    poller = None
+    if BOOK_REPLICA:
+        await book_replica.load()
+        poller = asyncio.create_task(replica_poller())
+    # Snapshot des KPI par deal, hors des requêtes du dashboard : une seule instance
+    # le planifie (processus dédié par défaut, voir app.snapshot)
+    scheduler = asyncio.create_task(snapshot_scheduler()) if KPI_SNAPSHOT_SCHEDULER and KPI_SNAPSHOT_INTERVAL > 0 else None
+    yield
+    warmup.cancel()
+    for task in (scheduler, poller):
+        if task is not None:
+            task.cancel()
+    # Écritures différées encore en attente, attendues jusqu'au bout
+    await run_io(writer.flush, timeout=None)
+    close_repository()
+
 app = FastAPI(
     title="API Supabase Trésorerie",
     description="API de gestion des prêts, swaps, banques et KPI via Supabase",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Middleware CORS global
@@ -16,13 +48,25 @@ app.add_middleware(
     allow_credentials=True, #fonctionne
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Last-Modified", "X-Next-Cursor", "X-Replica-Staleness"],
 )
 
+# Durée des requêtes par route, exportée par /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Fraîcheur de la réplique sur les réponses qu'elle sert
+app.add_middleware(ReplicaHeadersMiddleware)
+
 # Route de test CORS
 @app.get("/test-cors")
 def test_cors():
     return JSONResponse(content={"message": "CORS headers are working!"})
 
+# Métriques au format texte Prometheus
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return PlainTextResponse(registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 # Inclusion des routers
 app.include_router(loans_router)
 app.include_router(swaps_router)
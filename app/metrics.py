@@ -0,0 +1,253 @@
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import threading
+import time
+
+# Bornes par défaut des histogrammes de latence, en secondes (celles de prometheus_client)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Compteur cumulatif, une série par combinaison de labels."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        with self._lock:
+            return self._values.get(labels, 0.0)
+
+    def total(self) -> float:
+        with self._lock:
+            return sum(self._values.values())
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    Histogramme à bornes fixes, une série par combinaison de labels.
+
+    observe() se limite à une recherche dichotomique et deux additions sous
+    verrou ; les cumuls par borne ne sont calculés qu'à l'export.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        # labels -> [compte par borne (non cumulé), somme, nombre]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, *labels: str) -> "_Timer":
+        """Chronomètre un bloc : with histogram.time("label"): ..."""
+        return _Timer(self, labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, [list(s[0]), s[1], s[2]]) for labels, s in self._series.items())
+        for labels, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Gauge:
+    """Jauge calculée à l'export par une fonction."""
+
+    def __init__(self, name: str, documentation: str, compute: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.compute = compute
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge", f"{self.name} {_number(self.compute())}"]
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Tuple[str, ...]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+
+class Registry:
+    """Ensemble des métriques exportées par /metrics."""
+
+    def __init__(self):
+        self._metrics: List = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Durée de traitement des requêtes HTTP par route", ("method", "route", "status")
+))
+supabase_request_duration = registry.register(Histogram(
+    "supabase_request_duration_seconds", "Durée des requêtes Supabase par table et opération", ("table", "operation")
+))
+supabase_errors = registry.register(Counter(
+    "supabase_request_errors_total", "Requêtes Supabase en erreur par table et opération", ("table", "operation")
+))
+yfinance_fetch_duration = registry.register(Histogram(
+    "yfinance_fetch_duration_seconds", "Durée des téléchargements Yahoo Finance, une observation par appel, par nombre de paires", ("batch_size",)
+))
+yfinance_pairs_downloaded = registry.register(Counter(
+    "yfinance_pairs_downloaded_total", "Paires demandées à Yahoo Finance", ("pair",)
+))
+spot_cache_requests = registry.register(Counter(
+    "spot_rate_cache_requests_total", "Consultations du cache des taux spot", ("result",)
+))
+
+
+def _hit_ratio() -> float:
+    hits = spot_cache_requests.value("hit")
+    total = spot_cache_requests.total()
+    return hits / total if total else 0.0
+
+
+registry.register(Gauge("spot_rate_cache_hit_ratio", "Part des taux spot servis par le cache", _hit_ratio))
+dashboard_deals_valued = registry.register(Histogram(
+    "dashboard_deals_valued", "Nombre de deals valorisés par appel du dashboard", ("mode",),
+    buckets=(10, 100, 1_000, 10_000, 100_000, 1_000_000)
+))
+
+
+class MetricsMiddleware:
+    """Middleware ASGI mesurant la durée des requêtes par route (gabarit de chemin)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            http_request_duration.observe(time.perf_counter() - start, scope["method"], route, str(status))
+
+
+class InstrumentedQuery:
+    """Requête PostgREST dont l'exécution est chronométrée."""
+
+    OPERATIONS = {"select", "insert", "upsert", "update", "delete"}
+
+    def __init__(self, query, table: str, operation: Optional[str] = None):
+        self._query = query
+        self._table = table
+        self._operation = operation
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._query, name)
+        if not callable(attr):
+            return attr
+        operation = name if name in self.OPERATIONS else self._operation
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if hasattr(result, "execute"):
+                return InstrumentedQuery(result, self._table, operation)
+            return result
+        return call
+
+    def execute(self, *args, **kwargs):
+        labels = (self._table, self._operation or "unknown")
+        start = time.perf_counter()
+        try:
+            return self._query.execute(*args, **kwargs)
+        except Exception:
+            supabase_errors.inc(*labels)
+            raise
+        finally:
+            supabase_request_duration.observe(time.perf_counter() - start, *labels)
+
+
+class InstrumentedClient:
+    """Client Supabase dont les requêtes sur les tables sont mesurées."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def table(self, name: str) -> InstrumentedQuery:
+        return InstrumentedQuery(self._client.table(name), name)
+
+    def __getattr__(self, name: str):
+        return getattr(self._client, name)
@@ -1,15 +1,15 @@
-from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey
+from sqlalchemy import JSON, Column, Integer, String, Float, Date, ForeignKey, UniqueConstraint
 from sqlalchemy.orm import relationship
 from .database import Base
 
 class Swap(Base):
     __tablename__ = "swaps"
     id = Column(Integer, primary_key=True, index=True)
-    deal_id = Column(String, nullable=False)  # Ajout du champ deal_id
+    deal_id = Column(String)  # Ajout du champ deal_id
     currency = Column(String)
     nominal = Column(Float)
     start_date = Column(Date)
-    maturity_date = Column(Date)
+    maturity_date = Column(Date, index=True)
     spot_rate = Column(Float)
     forward_rate = Column(Float)
     bank_id = Column(Integer, ForeignKey("banks.id"))
@@ -22,19 +22,55 @@ class Swap(Base):
     total_days = Column(Integer)
     remaining_days = Column(Integer)
 
-class Loan(Base):  # Supposé pour correspondre à LoanForm
+class Loan(Base):  # Correspond à LoanCreate et aux champs calculés de app.schemes.Loan
     __tablename__ = "loans"
     id = Column(Integer, primary_key=True, index=True)
-    deal_id = Column(String, nullable=False)  # Ajout du champ deal_id
+    deal_id = Column(String)  # Ajout du champ deal_id
     currency = Column(String)
     nominal = Column(Float)
+    rate = Column(Float)
     start_date = Column(Date)
-    maturity_date = Column(Date)
-    interest_rate = Column(Float)
+    maturity_date = Column(Date, index=True)
+    payment_frequency = Column(String)
+    conversion_rate = Column(Float)
     bank_id = Column(Integer, ForeignKey("banks.id"))
     bank = relationship("Bank")
+    # Champs calculés
+    number_of_days = Column(Integer)
+    total_interest = Column(Float)
+    nominal_in_eur = Column(Float)
+    repayment_schedule = Column(JSON)
 
 class Bank(Base):
     __tablename__ = "banks"
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String)
+
+class DealKpiHistory(Base):
+    __tablename__ = "deal_kpi_history"
+    __table_args__ = (UniqueConstraint("deal_id", "deal_type", "date"),)
+    id = Column(Integer, primary_key=True, index=True)
+    deal_id = Column(Integer, nullable=False)
+    deal_type = Column(String, nullable=False)
+    date = Column(Date, nullable=False, index=True)
+    mtm_eur = Column(Float)
+    var_5 = Column(Float)
+    stress_mtm = Column(Float)
+    exposure = Column(Float)
+    maturity_weighted = Column(Float)
+
+class KpiRollup(Base):
+    __tablename__ = "kpi_rollups"
+    __table_args__ = (UniqueConstraint("period", "bucket", "portfolio", "currency"),)
+    id = Column(Integer, primary_key=True, index=True)
+    period = Column(String, nullable=False)
+    bucket = Column(Date, nullable=False)
+    as_of = Column(Date, nullable=False)
+    portfolio = Column(String, nullable=False)
+    currency = Column(String, nullable=False)
+    mtm_eur = Column(Float)
+    var_5 = Column(Float)
+    stress_mtm = Column(Float)
+    exposure = Column(Float)
+    exposure_days = Column(Float)
+    deal_count = Column(Integer)
@@ -0,0 +1,118 @@
+from typing import AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+import logging
+import os
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from app.repository import Filter, fetch_rows, repository
+
+logging.basicConfig(level=logging.WARNING)
+
+# Taille de page par défaut ; 1000 correspond au max-rows par défaut de PostgREST
+LIST_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", "1000"))
+LIST_MAX_PAGE_SIZE = int(os.getenv("LIST_MAX_PAGE_SIZE", "10000"))
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def wants_ndjson(request: Request, format: Optional[str]) -> bool:
+    """Le client demande un flux NDJSON (paramètre format ou en-tête Accept)."""
+    if format:
+        return format == "ndjson"
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+async def fetch_page(table: str, after: Optional[int], limit: int, columns: str = "*", filters: Sequence[Filter] = ()) -> List[Dict]:
+    """
+    Lit une page de lignes triées par id, après le curseur donné (pagination keyset).
+
+    Args:
+        table: Table Supabase
+        after: Dernier id de la page précédente (None pour la première page)
+        limit: Nombre maximal de lignes
+        columns: Colonnes à sélectionner
+        filters: Filtres supplémentaires (colonne, opérateur, valeur)
+
+    Returns:
+        List[Dict]: Lignes de la page, par id croissant
+    """
+    if after is not None:
+        filters = [*filters, ("id", "gt", after)]
+    return await fetch_rows(table, columns, filters, order_by="id", limit=limit)
+
+
+def next_cursor(rows: List[Dict], limit: int) -> Optional[int]:
+    """Curseur de la page suivante, None si la page est la dernière."""
+    return rows[-1]["id"] if len(rows) == limit else None
+
+
+async def list_rows(table: str, limit: Optional[int], after: Optional[int], columns: str = "*") -> Tuple[List[Dict], Dict[str, str]]:
+    """
+    Lignes d'une route de liste : table complète sans pagination, sinon une page.
+
+    Args:
+        table: Table Supabase
+        limit: Taille de page demandée (LIST_PAGE_SIZE si seul after est fourni)
+        after: Curseur de la page précédente
+        columns: Colonnes à sélectionner
+
+    Returns:
+        Tuple: (lignes, en-têtes avec X-Next-Cursor s'il reste des lignes)
+    """
+    if limit is None and after is None:
+        return await fetch_rows(table, columns), {}
+    page_size = limit or LIST_PAGE_SIZE
+    rows = await fetch_page(table, after, page_size, columns)
+    cursor = next_cursor(rows, page_size)
+    return rows, ({"X-Next-Cursor": str(cursor)} if cursor is not None else {})
+
+
+async def iter_pages(table: str, page_size: int = LIST_PAGE_SIZE, after: Optional[int] = None, columns: str = "*", filters: Sequence[Filter] = ()) -> AsyncIterator[List[Dict]]:
+    """Parcourt une table page par page, sans jamais conserver plus d'une page."""
+    while True:
+        rows = await fetch_page(table, after, page_size, columns, filters)
+        if rows:
+            yield rows
+        after = next_cursor(rows, page_size)
+        if after is None:
+            return
+
+
+async def fetch_table(table: str, columns: str = "*", filters: Sequence[Filter] = ()) -> List[Dict]:
+    """
+    Lit toutes les lignes d'une table : en une requête, ou page par page si le
+    backend limite le nombre de lignes par requête (max-rows de PostgREST).
+    """
+    if not repository.paged_reads:
+        return await fetch_rows(table, columns, filters)
+    rows: List[Dict] = []
+    async for page in iter_pages(table, columns=columns, filters=filters):
+        rows.extend(page)
+    return rows
+
+
+def ndjson_response(table: str, encode_row: Callable[[Dict], bytes], page_size: int = LIST_PAGE_SIZE, after: Optional[int] = None, headers: Optional[Dict[str, str]] = None, columns: str = "*", pages: Optional[AsyncIterator[List[Dict]]] = None) -> StreamingResponse:
+    """
+    Diffuse une table en NDJSON, une ligne JSON par deal, au fil des pages lues.
+
+    Args:
+        table: Table Supabase
+        encode_row: Encodage JSON d'une ligne (sans saut de ligne)
+        page_size: Nombre de lignes lues par requête Supabase
+        after: Curseur de départ
+        headers: En-têtes supplémentaires (CORS)
+        columns: Colonnes à sélectionner
+        pages: Source des pages à la place de Supabase (réplique en mémoire)
+
+    Returns:
+        StreamingResponse: Flux application/x-ndjson
+    """
+    async def stream():
+        try:
+            async for rows in pages or iter_pages(table, page_size, after, columns):
+                yield b"".join(encode_row(row) + b"\n" for row in rows)
+        except Exception as e:
+            # Le statut 200 est déjà envoyé : le flux est interrompu
+            logging.error(f"Erreur lors de la diffusion de {table}: {e}")
+            raise
+
+    return StreamingResponse(stream(), media_type=NDJSON_MEDIA_TYPE, headers=headers)
@@ -0,0 +1,41 @@
+from typing import Dict, List
+import logging
+import time
+from app.metrics import yfinance_fetch_duration, yfinance_pairs_downloaded
+
+logging.basicConfig(level=logging.WARNING)
+
+
+def download_closes(tickers: List[str], **kwargs) -> Dict:
+    """
+    Télécharge les cours de clôture de plusieurs tickers en un seul appel Yahoo Finance.
+
+    Args:
+        tickers: Tickers Yahoo Finance (ex. EURUSD=X)
+        **kwargs: Paramètres de yf.download (period, start, end...)
+
+    Returns:
+        Dict: Série pandas des clôtures (sans valeurs manquantes) par ticker
+    """
+    # Import différé : yfinance charge pandas, inutile au démarrage de l'API
+    import yfinance as yf
+
+    start = time.perf_counter()
+    try:
+        data = yf.download(tickers, interval="1d", progress=False, **kwargs)
+    finally:
+        # Un appel groupé : une seule durée, les paires sont comptées à part
+        yfinance_fetch_duration.observe(time.perf_counter() - start, str(len(tickers)))
+        for ticker in tickers:
+            yfinance_pairs_downloaded.inc(ticker)
+    closes = data["Close"]
+    if getattr(closes, "ndim", 1) == 1:
+        return {tickers[0]: closes.dropna()}
+    return {ticker: closes[ticker].dropna() for ticker in tickers if ticker in closes}
+
+
+def fetch_spot_rates(pairs: List[str]) -> Dict[str, float]:
+    """Dernier cours de clôture de chaque paire, en un seul appel."""
+    logging.info(f"Récupération des taux pour {pairs}")
+    closes = download_closes(pairs, period="5d")
+    return {pair: float(series.iloc[-1]) for pair, series in closes.items() if len(series)}
@@ -0,0 +1,164 @@
+from datetime import date, timedelta
+from typing import List, Tuple
+import logging
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from app.rate_cache import download_closes
+from app.fx import FX_PIVOT, pivot_pair
+
+logging.basicConfig(level=logging.WARNING)
+
+RATE_STORE_PATH = os.getenv("RATE_STORE_PATH", "fx_rates.sqlite")
+# Le cours du jour évolue en séance : il est re-téléchargé après ce délai
+RATE_STORE_TODAY_TTL = float(os.getenv("RATE_STORE_TODAY_TTL", "300"))
+
+
+def day_end(day: str) -> float:
+    """Timestamp de la fin (minuit local) d'un jour ISO."""
+    return time.mktime((date.fromisoformat(day) + timedelta(days=1)).timetuple())
+
+
+class RateStore:
+    """
+    Stockage local des cours de clôture historiques, indexé par (paire, jour).
+
+    Chaque jour téléchargé est enregistré, y compris les jours sans cotation
+    (close NULL). Un jour n'est définitif que s'il a été téléchargé après
+    sa fin : il n'est alors plus jamais re-téléchargé. Un jour téléchargé
+    avant sa fin (cours en séance, clôture pas encore publiée) l'est de
+    nouveau après RATE_STORE_TODAY_TTL. Les lectures renvoient une matrice
+    dense jours × devises.
+    """
+
+    def __init__(self, path: str = RATE_STORE_PATH):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS fx_rates ("
+                "pair TEXT NOT NULL, date TEXT NOT NULL, close REAL, fetched_at REAL NOT NULL, "
+                "PRIMARY KEY (pair, date)) WITHOUT ROWID"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _missing_days(self, pair: str, start: date, end: date) -> List[date]:
+        fresh_after = time.time() - RATE_STORE_TODAY_TTL
+        rows = self._connection().execute(
+            "SELECT date, fetched_at FROM fx_rates WHERE pair = ? AND date BETWEEN ? AND ?",
+            (pair, start.isoformat(), end.isoformat()),
+        ).fetchall()
+        known = {d for d, fetched_at in rows if fetched_at >= fresh_after or fetched_at >= day_end(d)}
+        days = (start + timedelta(days=i) for i in range((end - start).days + 1))
+        return [day for day in days if day.isoformat() not in known]
+
+    def ensure(self, pairs: List[str], start: date, end: date) -> None:
+        """
+        Complète le stockage pour les paires et la période demandées.
+
+        Un seul téléchargement couvre toutes les paires incomplètes, sur
+        l'intervalle de leurs jours manquants.
+
+        Args:
+            pairs: Tickers Yahoo Finance (ex. EURUSD=X)
+            start: Premier jour de la période
+            end: Dernier jour de la période
+        """
+        with self._lock:
+            missing = {pair: self._missing_days(pair, start, end) for pair in pairs}
+            missing = {pair: days for pair, days in missing.items() if days}
+            if not missing:
+                return
+            fetch_start = min(days[0] for days in missing.values())
+            fetch_end = max(days[-1] for days in missing.values())
+            tickers = sorted(missing)
+            logging.info(f"Téléchargement de l'historique {tickers} du {fetch_start} au {fetch_end}")
+            try:
+                closes = download_closes(tickers, start=fetch_start.isoformat(), end=(fetch_end + timedelta(days=1)).isoformat())
+            except Exception as e:
+                logging.error(f"Erreur lors du téléchargement de l'historique {tickers} : {e}")
+                return
+
+            fetched_at = time.time()
+            rows = []
+            for pair in tickers:
+                series = closes.get(pair)
+                if series is None or (not len(series) and any(day.weekday() < 5 for day in missing[pair])):
+                    # Échec partiel du téléchargement (colonne absente ou vide un jour
+                    # ouvré) : rien n'est stocké, la paire sera redemandée
+                    logging.warning(f"Historique de {pair} absent du téléchargement")
+                    continue
+                by_day = {ts.date().isoformat(): float(close) for ts, close in series.items()}
+                for day in missing[pair]:
+                    rows.append((pair, day.isoformat(), by_day.get(day.isoformat()), fetched_at))
+            conn = self._connection()
+            conn.executemany("INSERT OR REPLACE INTO fx_rates (pair, date, close, fetched_at) VALUES (?, ?, ?, ?)", rows)
+            conn.commit()
+
+    def matrix(self, pairs: List[str], start: date, end: date) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Lit les cours stockés sous forme de matrice dense.
+
+        Args:
+            pairs: Tickers Yahoo Finance, dans l'ordre des colonnes
+            start: Premier jour
+            end: Dernier jour
+
+        Returns:
+            Tuple: (jours en datetime64[D], matrice jours × paires avec NaN si absent)
+        """
+        first = np.datetime64(start, "D")
+        days = np.arange(first, np.datetime64(end, "D") + 1)
+        closes = np.full((len(days), len(pairs)), np.nan)
+        if not pairs or not len(days):
+            return days, closes
+        column = {pair: i for i, pair in enumerate(pairs)}
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT pair, date, close FROM fx_rates WHERE close IS NOT NULL AND date BETWEEN ? AND ? "
+                f"AND pair IN ({','.join('?' * len(pairs))})",
+                (start.isoformat(), end.isoformat(), *pairs),
+            ).fetchall()
+        if rows:
+            pair_col, day_col, close_col = zip(*rows)
+            row_idx = (np.array(day_col, dtype="datetime64[D]") - first).astype(np.intp)
+            col_idx = np.array([column[p] for p in pair_col], dtype=np.intp)
+            closes[row_idx, col_idx] = close_col
+        return days, closes
+
+    def history(self, base_currency: str, currencies: List[str], start: date, end: date) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Historique base/devise pour plusieurs devises, téléchargé si besoin.
+
+        Seul l'historique pivot/devise de chaque devise est stocké ; les
+        cours base/devise en sont déduits par triangulation.
+
+        Args:
+            base_currency: Devise de base (ex. EUR)
+            currencies: Devises de cotation, dans l'ordre des colonnes
+            start: Premier jour
+            end: Dernier jour
+
+        Returns:
+            Tuple: (jours en datetime64[D], matrice jours × devises)
+        """
+        legs = [c for c in dict.fromkeys([base_currency, *currencies]) if c != FX_PIVOT]
+        pairs = [pivot_pair(FX_PIVOT, c) for c in legs]
+        self.ensure(pairs, start, end)
+        days, closes = self.matrix(pairs, start, end)
+        column = {c: i for i, c in enumerate(legs)}
+        # Devise pivot : 1 pour une unité d'elle-même, à toutes les dates
+        closes = np.hstack([closes, np.ones((len(closes), 1))])
+        column[FX_PIVOT] = len(legs)
+        quotes = closes[:, [column[c] for c in currencies]]
+        return days, quotes / closes[:, [column[base_currency]]]
+
+
+rate_store = RateStore()
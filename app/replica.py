@@ -0,0 +1,340 @@
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+import asyncio
+import logging
+import os
+import time
+import numpy as np
+from app.pagination import LIST_PAGE_SIZE, fetch_table
+from app.response_cache import response_cache
+from app.aggregates import kpi_aggregates
+from app.valuation import LOAN, SWAP, Book, load_book
+
+logging.basicConfig(level=logging.WARNING)
+
+# Réplique en mémoire des swaps et des prêts (désactivée par défaut)
+BOOK_REPLICA = os.getenv("BOOK_REPLICA", "false").lower() in ("1", "true", "yes")
+# Intervalle du poll incrémental et du rechargement complet, en secondes
+REPLICA_POLL_INTERVAL = float(os.getenv("REPLICA_POLL_INTERVAL", "5"))
+REPLICA_RESYNC_INTERVAL = float(os.getenv("REPLICA_RESYNC_INTERVAL", "600"))
+# Colonne de watermark du poll : "id" ne voit que les insertions, une colonne
+# updated_at maintenue par la base voit aussi les mises à jour
+REPLICA_WATERMARK_COLUMN = os.getenv("REPLICA_WATERMARK_COLUMN", "id")
+REPLICA_KINDS = {"swaps": SWAP, "loans": LOAN}
+# Lectures de la réplique pendant la requête en cours, posé par ReplicaHeadersMiddleware
+_replica_reads: ContextVar[Optional[List[bool]]] = ContextVar("replica_reads", default=None)
+
+
+def _record_read() -> None:
+    reads = _replica_reads.get()
+    if reads is not None and not reads:
+        reads.append(True)
+
+
+class TableReplica:
+    """
+    Table en colonnes : une liste de valeurs par colonne et un index id -> position.
+
+    Une ligne ne coûte qu'une référence par colonne, au lieu d'un dict par
+    ligne. Une suppression déplace la dernière ligne à la place libérée.
+    """
+
+    def __init__(self, table: str):
+        self.table = table
+        self.columns: Dict[str, list] = {"id": []}
+        self.positions: Dict[int, int] = {}
+        self.version = 0
+        self.watermark = None
+        self._order: Optional[Tuple[int, np.ndarray, np.ndarray]] = None
+
+    def __len__(self) -> int:
+        return len(self.columns["id"])
+
+    def clear(self) -> None:
+        self.columns = {"id": []}
+        self.positions = {}
+        self.watermark = None
+        self.version += 1
+
+    def upsert(self, rows: Iterable[Dict], watermark_column: Optional[str] = None) -> None:
+        """Insère ou remplace des lignes ; seules les lignes lues en base font avancer le watermark."""
+        for row in rows:
+            position = self.positions.get(row["id"])
+            if position is None:
+                position = self.positions[row["id"]] = len(self)
+                for column in self.columns.values():
+                    column.append(None)
+            for name, value in row.items():
+                column = self.columns.get(name)
+                if column is None:
+                    column = self.columns[name] = [None] * len(self)
+                column[position] = value
+            if watermark_column:
+                self.advance(row.get(watermark_column))
+        self.version += 1
+
+    def advance(self, mark) -> None:
+        """Fait avancer le watermark jusqu'à mark."""
+        if mark is not None and (self.watermark is None or mark > self.watermark):
+            self.watermark = mark
+
+    def changed(self, rows: List[Dict]) -> List[Dict]:
+        """Lignes absentes de la réplique ou dont une colonne diffère de la ligne stockée."""
+        result = []
+        for row in rows:
+            position = self.positions.get(row["id"])
+            if position is None or any(
+                name not in self.columns or self.columns[name][position] != value for name, value in row.items()
+            ):
+                result.append(row)
+        return result
+
+    def update(self, rows: Iterable[Dict]) -> None:
+        """Met à jour les colonnes données des lignes présentes ; les ids absents sont ignorés."""
+        self.upsert(row for row in rows if row["id"] in self.positions)
+
+    def remove(self, ids: Iterable[int]) -> None:
+        for deal_id in ids:
+            position = self.positions.pop(deal_id, None)
+            if position is None:
+                continue
+            last = len(self) - 1
+            for column in self.columns.values():
+                column[position] = column[last]
+                column.pop()
+            if position != last:
+                self.positions[self.columns["id"][position]] = position
+        self.version += 1
+
+    def _sorted(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(ids triés, positions correspondantes), recalculés à chaque version."""
+        if self._order is None or self._order[0] != self.version:
+            ids = np.array(self.columns["id"], dtype=np.int64)
+            order = np.argsort(ids, kind="stable")
+            self._order = (self.version, ids[order], order)
+        return self._order[1], self._order[2]
+
+    def rows(self, columns: str = "*", after: Optional[int] = None, limit: Optional[int] = None) -> List[Dict]:
+        """Lignes par id croissant, après le curseur donné, colonnes sélectionnées."""
+        names = list(self.columns) if columns == "*" else [c.strip() for c in columns.split(",")]
+        ids, order = self._sorted()
+        start = int(np.searchsorted(ids, after, side="right")) if after is not None else 0
+        positions = order[start:start + limit if limit is not None else None].tolist()
+        values = [self.columns.get(name) or [None] * len(self) for name in names]
+        return [dict(zip(names, [column[p] for column in values])) for p in positions]
+
+
+class BookReplica:
+    """
+    Réplique en mémoire des tables swaps et loans.
+
+    Chargée une fois au démarrage, elle est tenue à jour par les routes
+    d'écriture du processus, par un poll incrémental sur un watermark
+    (id ou colonne de mise à jour) et par un rechargement complet périodique,
+    qui seul voit les suppressions faites par un autre processus.
+    """
+
+    def __init__(self, tables: Iterable[str] = REPLICA_KINDS, watermark_column: str = REPLICA_WATERMARK_COLUMN):
+        self.tables = {table: TableReplica(table) for table in tables}
+        self.watermark_column = watermark_column
+        self.loaded = False
+        self.synced_at = 0.0
+        self.resynced_at = 0.0
+        self._book: Optional[Tuple[tuple, Book]] = None
+        # Écritures locales survenues pendant une synchronisation en cours
+        self._syncing = 0
+        self._dirty: Dict[str, Set[int]] = {table: set() for table in self.tables}
+
+    def serves(self, table: str) -> bool:
+        return self.loaded and table in self.tables
+
+    async def _fetch(self, table: str, incremental: bool) -> List[Dict]:
+        replica = self.tables[table]
+        filters = []
+        if incremental and replica.watermark is not None:
+            operator = "gt" if self.watermark_column == "id" else "gte"
+            filters.append((self.watermark_column, operator, replica.watermark))
+        return await fetch_table(table, filters=filters)
+
+    async def _sync(self, incremental: bool) -> Dict[str, Tuple[List[Dict], Set[int]]]:
+        """Lit les tables ; renvoie par table les lignes lues et les ids écrits localement entre-temps."""
+        self._syncing += 1
+        try:
+            fetched = await asyncio.gather(*[self._fetch(table, incremental) for table in self.tables])
+        finally:
+            self._syncing -= 1
+        # Une écriture locale pendant la lecture est plus récente que la ligne lue
+        result = {}
+        for table, rows in zip(self.tables, fetched):
+            dirty = set(self._dirty[table])
+            result[table] = ([row for row in rows if row["id"] not in dirty] if dirty else rows, dirty)
+            if not self._syncing:
+                self._dirty[table].clear()
+        return result
+
+    async def load(self) -> None:
+        """Chargement complet des tables ; réconcilie aussi les agrégats KPI."""
+        fetched = await self._sync(incremental=False)
+        for table, (rows, dirty) in fetched.items():
+            replica = self.tables[table]
+            local = [row for row in replica.rows() if row["id"] in dirty] if dirty else []
+            replica.clear()
+            replica.upsert(rows, self.watermark_column)
+            replica.upsert(local)
+            response_cache.invalidate(table)
+        self.loaded = True
+        self.synced_at = self.resynced_at = time.time()
+        kpi_aggregates.reconcile(*self.deals())
+
+    async def poll(self) -> int:
+        """
+        Applique les lignes apparues depuis le watermark (rechargement complet
+        si l'intervalle de resynchronisation est écoulé).
+
+        Returns:
+            int: Nombre de lignes appliquées
+        """
+        if time.time() - self.resynced_at >= REPLICA_RESYNC_INTERVAL:
+            await self.load()
+            return sum(len(replica) for replica in self.tables.values())
+        fetched = await self._sync(incremental=True)
+        applied = 0
+        for table, (rows, _) in fetched.items():
+            replica = self.tables[table]
+            # Le filtre gte relit la ligne du watermark : seules les lignes modifiées invalident les caches
+            changed = replica.changed(rows)
+            for row in rows:
+                replica.advance(row.get(self.watermark_column))
+            if not changed:
+                continue
+            replica.upsert(changed)
+            response_cache.invalidate(table)
+            for row in changed:
+                kpi_aggregates.upsert_deal(REPLICA_KINDS[table], row)
+            applied += len(changed)
+        self.synced_at = time.time()
+        return applied
+
+    def upsert(self, table: str, rows: List[Dict]) -> None:
+        """Applique les lignes écrites par une route du processus."""
+        if not self.serves(table):
+            return
+        if self._syncing:
+            self._dirty[table].update(row["id"] for row in rows)
+        self.tables[table].upsert(rows)
+
+    def update(self, table: str, rows: List[Dict]) -> None:
+        """Applique des mises à jour partielles (colonnes données) écrites par le processus."""
+        if not self.serves(table):
+            return
+        self.tables[table].update(rows)
+
+    def remove(self, table: str, ids: List[int]) -> None:
+        if not self.serves(table):
+            return
+        if self._syncing:
+            self._dirty[table].update(ids)
+        self.tables[table].remove(ids)
+
+    def rows(self, table: str, columns: str = "*", after: Optional[int] = None, limit: Optional[int] = None) -> List[Dict]:
+        _record_read()
+        return self.tables[table].rows(columns, after, limit)
+
+    def deals(self, swap_columns: str = "*", loan_columns: str = "*") -> Tuple[List[Dict], List[Dict]]:
+        return self.rows("swaps", swap_columns), self.rows("loans", loan_columns)
+
+    def book(self) -> Book:
+        """Book de tout le portefeuille, reconstruit seulement après un changement."""
+        _record_read()
+        key = tuple(replica.version for replica in self.tables.values())
+        if self._book is None or self._book[0] != key:
+            self._book = (key, load_book(*self.deals()))
+        return self._book[1]
+
+    def list_rows(self, table: str, limit: Optional[int], after: Optional[int], columns: str = "*") -> Tuple[List[Dict], Dict[str, str]]:
+        """Équivalent en mémoire de app.pagination.list_rows."""
+        if limit is None and after is None:
+            return self.rows(table, columns), {}
+        page_size = limit or LIST_PAGE_SIZE
+        rows = self.rows(table, columns, after, page_size)
+        return rows, ({"X-Next-Cursor": str(rows[-1]["id"])} if len(rows) == page_size else {})
+
+    def iter_pages(self, table: str, page_size: int = LIST_PAGE_SIZE, after: Optional[int] = None, columns: str = "*") -> AsyncIterator[List[Dict]]:
+        """Équivalent en mémoire de app.pagination.iter_pages."""
+        # Lecture comptée dès l'appel : les pages ne sont lues qu'après l'envoi des en-têtes
+        _record_read()
+        return self._iter_pages(table, page_size, after, columns)
+
+    async def _iter_pages(self, table: str, page_size: int, after: Optional[int], columns: str) -> AsyncIterator[List[Dict]]:
+        while True:
+            rows = self.rows(table, columns, after, page_size)
+            if rows:
+                yield rows
+            if len(rows) < page_size:
+                return
+            after = rows[-1]["id"]
+
+    def sees_updates(self) -> bool:
+        """Le poll voit-il les mises à jour ? Un watermark sur id ne voit que les insertions."""
+        return self.watermark_column != "id"
+
+    def staleness(self) -> float:
+        """
+        Borne de fraîcheur des lignes servies, en secondes : âge du dernier poll
+        si le watermark voit les mises à jour, sinon du dernier rechargement
+        complet (seul à voir les modifications faites par un autre processus).
+        """
+        return time.time() - (self.synced_at if self.sees_updates() else self.resynced_at)
+
+    def status(self) -> Dict:
+        return {
+            "enabled": BOOK_REPLICA,
+            "loaded": self.loaded,
+            "rows": {table: len(replica) for table, replica in self.tables.items()},
+            "watermark_column": self.watermark_column,
+            "staleness_s": self.staleness() if self.loaded else None,
+            "last_poll_age_s": time.time() - self.synced_at if self.loaded else None,
+            "last_resync_age_s": time.time() - self.resynced_at if self.loaded else None,
+        }
+
+
+book_replica = BookReplica()
+
+
+async def replica_poller(interval: float = REPLICA_POLL_INTERVAL) -> None:
+    """Boucle de synchronisation, lancée au démarrage si BOOK_REPLICA est activé."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await book_replica.poll()
+        except Exception as e:
+            logging.error(f"Erreur de synchronisation de la réplique: {e}")
+
+
+class ReplicaHeadersMiddleware:
+    """
+    Middleware ASGI ajoutant X-Replica-Staleness aux seules réponses dont la
+    route a effectivement lu la réplique.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not book_replica.loaded:
+            return await self.app(scope, receive, send)
+        reads: List[bool] = []
+        token = _replica_reads.set(reads)
+
+        async def send_with_staleness(message):
+            if message["type"] == "http.response.start" and reads:
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-replica-staleness", f"{book_replica.staleness():.3f}".encode("latin-1")),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_staleness)
+        finally:
+            _replica_reads.reset(token)
@@ -0,0 +1,150 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import os
+import threading
+from app.aio import IO_WRITE_TIMEOUT, run_io
+
+# Backend de stockage : "supabase" (API REST PostgREST) ou "sql" (SQLAlchemy, voir DATABASE_URL)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase").lower()
+
+# Filtre (colonne, opérateur, valeur) ; opérateurs : eq, gt, gte, lt, lte, in
+Filter = Tuple[str, str, Any]
+
+
+class Repository(ABC):
+    """
+    Accès aux tables, indépendant du backend.
+
+    Les méthodes sont bloquantes : les routes les appellent via les
+    fonctions asynchrones de ce module (fetch_rows, insert_rows...), qui
+    les exécutent dans un thread avec run_io. Les lignes sont des dicts
+    aux dates ISO, comme les renvoie PostgREST.
+    """
+
+    # Lectures limitées en nombre de lignes par requête (max-rows de PostgREST) :
+    # les lectures de tables complètes passent alors par des pages
+    paged_reads = False
+
+    @abstractmethod
+    def select(self, table: str, columns: str = "*", filters: Sequence[Filter] = (), order_by: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        """Lit des lignes filtrées, triées et limitées."""
+
+    @abstractmethod
+    def insert(self, table: str, rows: List[Dict]) -> List[Dict]:
+        """Insère des lignes et les renvoie avec leur id, dans l'ordre d'entrée."""
+
+    @abstractmethod
+    def update(self, table: str, row_id: int, data: Dict) -> List[Dict]:
+        """Met à jour une ligne ; liste vide si elle n'existe pas."""
+
+    @abstractmethod
+    def delete(self, table: str, row_id: int) -> List[Dict]:
+        """Supprime une ligne ; liste vide si elle n'existe pas."""
+
+    @abstractmethod
+    def upsert(self, table: str, rows: List[Dict], on_conflict: str) -> None:
+        """Insère ou met à jour des lignes selon les colonnes de conflit (ex. "deal_id,deal_type,date")."""
+
+    def close(self) -> None:
+        pass
+
+
+class SupabaseRepository(Repository):
+    """Backend REST : chaque appel est une requête PostgREST du client Supabase partagé."""
+
+    paged_reads = True
+    OPERATORS = {"eq": "eq", "gt": "gt", "gte": "gte", "lt": "lt", "lte": "lte", "in": "in_"}
+
+    def __init__(self):
+        from app.supabase_client import init_client
+        self.client = init_client()
+
+    def select(self, table, columns="*", filters=(), order_by=None, limit=None):
+        query = self.client.table(table).select(columns)
+        for column, operator, value in filters:
+            query = getattr(query, self.OPERATORS[operator])(column, value)
+        if order_by:
+            query = query.order(order_by)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.execute().data
+
+    def insert(self, table, rows):
+        return self.client.table(table).insert(rows).execute().data
+
+    def update(self, table, row_id, data):
+        return self.client.table(table).update(data).eq("id", row_id).execute().data
+
+    def delete(self, table, row_id):
+        return self.client.table(table).delete().eq("id", row_id).execute().data
+
+    def upsert(self, table, rows, on_conflict):
+        self.client.table(table).upsert(rows, on_conflict=on_conflict).execute()
+
+    def close(self):
+        from app.supabase_client import close_client
+        close_client()
+
+
+_repository: Optional[Repository] = None
+_lock = threading.Lock()
+
+
+def init_repository(backend: str = STORAGE_BACKEND) -> Repository:
+    """
+    Crée le backend de stockage partagé (au démarrage de l'application).
+
+    Raises:
+        RuntimeError: Si le backend est inconnu ou mal configuré
+    """
+    global _repository
+    with _lock:
+        if _repository is not None:
+            return _repository
+        if backend == "supabase":
+            _repository = SupabaseRepository()
+        elif backend == "sql":
+            # SQLAlchemy n'est importé que pour ce backend
+            from app.sql_repository import SqlRepository
+            _repository = SqlRepository()
+        else:
+            raise RuntimeError(f"STORAGE_BACKEND inconnu : {backend} (supabase ou sql)")
+        return _repository
+
+
+def close_repository() -> None:
+    """Libère les connexions du backend (arrêt de l'application)."""
+    global _repository
+    with _lock:
+        if _repository is not None:
+            _repository.close()
+        _repository = None
+
+
+class _LazyRepository:
+    """Accès au backend partagé, créé au premier usage s'il ne l'a pas été au démarrage."""
+
+    def __getattr__(self, name: str):
+        return getattr(_repository or init_repository(), name)
+
+
+repository = _LazyRepository()
+
+
+async def fetch_rows(table: str, columns: str = "*", filters: Sequence[Filter] = (), order_by: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+    """Lit des lignes hors de la boucle d'événements."""
+    return await run_io(repository.select, table, columns, filters, order_by, limit)
+
+
+async def insert_rows(table: str, rows: List[Dict]) -> List[Dict]:
+    # Écritures non idempotentes : délai propre (IO_WRITE_TIMEOUT), un 504 suivi
+    # d'une nouvelle tentative du client dupliquerait une insertion déjà faite
+    return await run_io(repository.insert, table, rows, timeout=IO_WRITE_TIMEOUT)
+
+
+async def update_row(table: str, row_id: int, data: Dict) -> List[Dict]:
+    return await run_io(repository.update, table, row_id, data, timeout=IO_WRITE_TIMEOUT)
+
+
+async def delete_row(table: str, row_id: int) -> List[Dict]:
+    return await run_io(repository.delete, table, row_id, timeout=IO_WRITE_TIMEOUT)
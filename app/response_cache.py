@@ -0,0 +1,196 @@
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Optional, Tuple, Union
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from fastapi import Request, Response
+
+logging.basicConfig(level=logging.WARNING)
+
+# Durée de validité d'une réponse en cache, en secondes : borne la fraîcheur
+# si la base est modifiée en dehors de l'API
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+
+# Table, ou tables, dont dépend une réponse
+Tables = Union[str, Tuple[str, ...]]
+
+
+class CachedResponse:
+    """Corps JSON encodé d'une réponse, avec ses validateurs HTTP."""
+
+    def __init__(self, body: bytes, etag: str, last_modified: float, expires_at: float, generation: Tuple[int, ...], headers: Optional[Dict[str, str]] = None):
+        self.body = body
+        self.headers = headers or {}
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+        self.generation = generation
+
+
+class ResponseCache:
+    """
+    Cache des réponses GET des routes de liste, invalidé par les écritures.
+
+    Les entrées sont indexées par table(s), chemin et paramètres de requête.
+    Chaque écriture sur une table incrémente sa génération : les entrées
+    antérieures ne sont plus servies, mais leur ETag reste connu pour que
+    Last-Modified ne change pas si le contenu rechargé est identique.
+
+    Les chargements simultanés d'une même clé sont regroupés : une seule
+    coroutine calcule la réponse, les autres requêtes attendent son résultat.
+    """
+
+    def __init__(self, ttl: float = RESPONSE_CACHE_TTL, maxsize: int = RESPONSE_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Tuple, CachedResponse]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._inflight: Dict[Tuple, asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(tables: Tables, request: Request) -> Tuple:
+        return (tables, request.url.path, tuple(sorted(request.query_params.multi_items())))
+
+    def _generation(self, tables: Tables) -> Tuple[int, ...]:
+        names = (tables,) if isinstance(tables, str) else tables
+        return tuple(self._generations.get(name, 0) for name in names)
+
+    def generation(self, tables: Tables) -> Tuple[int, ...]:
+        with self._lock:
+            return self._generation(tables)
+
+    def get(self, key: Tuple) -> Optional[CachedResponse]:
+        """Renvoie l'entrée si elle est encore valide (ni expirée, ni invalidée)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            if entry.expires_at <= time.monotonic() or entry.generation != self._generation(key[0]):
+                return None
+            return entry
+
+    def store(self, key: Tuple, body: bytes, generation: Tuple[int, ...], headers: Optional[Dict[str, str]] = None, ttl: Optional[float] = None) -> CachedResponse:
+        """
+        Enregistre un corps encodé, sauf si la table a été modifiée pendant son chargement.
+
+        Args:
+            key: Clé de la réponse (voir key())
+            body: Corps JSON encodé
+            generation: Génération des tables au début du chargement
+            headers: En-têtes propres à la réponse (ex. curseur de pagination)
+            ttl: Durée de validité propre à l'entrée, en secondes (défaut : self.ttl)
+
+        Returns:
+            CachedResponse: Entrée décrivant la réponse à servir
+        """
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        with self._lock:
+            previous = self._entries.get(key)
+            last_modified = previous.last_modified if previous and previous.etag == etag else time.time()
+            entry = CachedResponse(body, etag, last_modified, time.monotonic() + (self.ttl if ttl is None else ttl), generation, headers)
+            if generation != self._generation(key[0]):
+                return entry
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    async def load(self, key: Tuple, load: Callable[[], Awaitable[Tuple[bytes, Dict[str, str]]]], ttl: Optional[float] = None) -> CachedResponse:
+        """
+        Charge et enregistre une réponse, en partageant le chargement déjà en cours pour la même clé.
+
+        Un chargement commencé avant une écriture n'est pas partagé avec les
+        requêtes arrivées après : elles en lancent un nouveau.
+
+        Args:
+            key: Clé de la réponse (voir key())
+            load: Coroutine renvoyant le corps JSON encodé et ses en-têtes propres
+            ttl: Durée de validité de l'entrée, en secondes
+
+        Returns:
+            CachedResponse: Entrée décrivant la réponse à servir
+        """
+        generation = self.generation(key[0])
+        flight = (key, generation)
+        task = self._inflight.get(flight)
+        if task is None:
+            async def run() -> CachedResponse:
+                try:
+                    body, headers = await load()
+                    return self.store(key, body, generation, headers, ttl)
+                finally:
+                    self._inflight.pop(flight, None)
+            task = asyncio.ensure_future(run())
+            self._inflight[flight] = task
+        # Une requête abandonnée n'annule pas le chargement attendu par les autres
+        return await asyncio.shield(task)
+
+    def invalidate(self, table: str) -> None:
+        """Invalide toutes les réponses construites à partir de la table."""
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def not_modified(request: Request, entry: CachedResponse) -> bool:
+    """Applique If-None-Match, ou à défaut If-Modified-Since (RFC 9110)."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or entry.etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(entry.last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+async def cached_response(request: Request, table: Tables, load: Callable[[], Awaitable[Tuple[bytes, Dict[str, str]]]], headers: Optional[Dict[str, str]] = None, ttl: Optional[float] = None) -> Response:
+    """
+    Sert une réponse GET depuis le cache, ou la charge puis la met en cache.
+
+    Une requête conditionnelle dont l'ETag correspond reçoit un 304 sans
+    accès à la base ni réencodage JSON. Les requêtes identiques simultanées
+    partagent un seul chargement.
+
+    Args:
+        request: Requête entrante
+        table: Table, ou tuple de tables, dont dépend la réponse
+        load: Coroutine renvoyant le corps JSON encodé et ses en-têtes propres
+        headers: En-têtes supplémentaires (CORS)
+        ttl: Durée de validité de la réponse en cache (défaut : RESPONSE_CACHE_TTL)
+
+    Returns:
+        Response: Réponse 200 ou 304 avec ETag et Last-Modified
+    """
+    key = response_cache.key(table, request)
+    entry = response_cache.get(key)
+    if entry is None:
+        entry = await response_cache.load(key, load, ttl)
+
+    validators = {
+        **(headers or {}),
+        **entry.headers,
+        "ETag": entry.etag,
+        "Last-Modified": formatdate(entry.last_modified, usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+    if not_modified(request, entry):
+        return Response(status_code=304, headers=validators)
+    return Response(content=entry.body, media_type="application/json", headers=validators)
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,78 @@
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Type
+import json
+import os
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+try:
+    import orjson
+except ImportError:  # encodage stdlib si orjson n'est pas installé
+    orjson = None
+
+# Revalide les lignes lues en base contre leur modèle avant encodage (tests, débogage)
+STRICT_RESPONSE_VALIDATION = os.getenv("STRICT_RESPONSE_VALIDATION", "false").lower() in ("1", "true", "yes")
+
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS",
+    "Access-Control-Allow-Headers": "*"
+}
+
+
+def dumps(content: Any) -> bytes:
+    """Encode un contenu en JSON compact (orjson si disponible)."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encodée par dumps()."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def cors_response(content, status_code: int = 200):
+    return FastJSONResponse(content=content, status_code=status_code, headers=CORS_HEADERS)
+
+
+@lru_cache(maxsize=None)
+def _adapter(model: Type[BaseModel], many: bool) -> TypeAdapter:
+    return TypeAdapter(List[model] if many else model)
+
+
+def model_columns(model: Type[BaseModel]) -> str:
+    """Colonnes Supabase correspondant aux champs d'un modèle de réponse."""
+    return ",".join(model.model_fields)
+
+
+def encode_rows(rows: List[Dict], model: Optional[Type[BaseModel]] = None) -> bytes:
+    """
+    Encode des lignes lues en base en un tableau JSON.
+
+    Les lignes Supabase sont déjà conformes au schéma : elles sont encodées
+    directement, sans repasser par le modèle Pydantic. Avec
+    STRICT_RESPONSE_VALIDATION, elles sont validées et sérialisées par le
+    modèle, comme le ferait response_model.
+
+    Args:
+        rows: Lignes à encoder
+        model: Modèle de réponse d'une ligne
+
+    Returns:
+        bytes: Corps JSON
+    """
+    if STRICT_RESPONSE_VALIDATION and model is not None:
+        adapter = _adapter(model, True)
+        return adapter.dump_json(adapter.validate_python(rows))
+    return dumps(rows)
+
+
+def encode_row(row: Dict, model: Optional[Type[BaseModel]] = None) -> bytes:
+    """Encode une ligne lue en base (voir encode_rows)."""
+    if STRICT_RESPONSE_VALIDATION and model is not None:
+        adapter = _adapter(model, False)
+        return adapter.dump_json(adapter.validate_python(row))
+    return dumps(row)
@@ -0,0 +1,174 @@
+from datetime import date
+from typing import Dict, List, Optional
+import numpy as np
+from app.pagination import fetch_table
+from app.valuation import DEAL_TYPES, Book, Valuation
+
+# Sommes des KPI par période, portefeuille (type de deal) et devise, maintenues par
+# le snapshot quotidien. Contrainte d'unicité attendue sur (period, bucket, portfolio, currency).
+ROLLUP_TABLE = "kpi_rollups"
+ROLLUP_CONFLICT = "period,bucket,portfolio,currency"
+ROLLUP_COLUMNS = "id,bucket,as_of,portfolio,currency,mtm_eur,var_5,stress_mtm,exposure,exposure_days,deal_count"
+DEAL_HISTORY_COLUMNS = "id,deal_id,date,mtm_eur,var_5,stress_mtm,exposure,maturity_weighted"
+PERIODS = ("day", "week", "month")
+
+# Colonnes sommées, dans l'ordre des matrices de valeurs
+FIELDS = ("mtm_eur", "var_5", "stress_mtm", "exposure", "exposure_days", "deal_count")
+
+
+def period_starts(days: np.ndarray, period: str) -> np.ndarray:
+    """Premier jour de la période (jour, semaine commençant le lundi, mois) de chaque date."""
+    days = days.astype("datetime64[D]")
+    if period == "week":
+        # Le 1970-01-01 était un jeudi : (jour + 3) % 7 donne 0 pour un lundi
+        return days - (days.astype(np.int64) + 3) % 7
+    if period == "month":
+        return days.astype("datetime64[M]").astype("datetime64[D]")
+    return days
+
+
+def period_start(day: date, period: str) -> date:
+    return period_starts(np.array([day], dtype="datetime64[D]"), period)[0].astype(date)
+
+
+def rollup_rows(book: Book, valuation: Valuation, var_95: np.ndarray, day: date) -> List[Dict]:
+    """
+    Lignes de kpi_rollups d'un snapshot : une par période, portefeuille et devise.
+
+    La ligne d'une semaine ou d'un mois porte les valeurs du dernier jour
+    snapshoté de la période (as_of). La VaR est la somme des VaR par deal,
+    sans effet de diversification ; elle est NULL si l'un des deals n'a pas
+    de VaR (devise sans historique).
+
+    Args:
+        book: Deals valorisés
+        valuation: Valorisation des deals
+        var_95: VaR 95 % par deal
+        day: Date du snapshot
+
+    Returns:
+        List[Dict]: Lignes à upserter sur ROLLUP_CONFLICT
+    """
+    n_currencies = len(book.currencies)
+    group = book.kinds.astype(np.intp) * n_currencies + book.currency_idx
+    size = len(DEAL_TYPES) * n_currencies
+    values = np.column_stack([
+        valuation.mtm,
+        -var_95,
+        valuation.stress_up,
+        valuation.nominal_eur,
+        valuation.nominal_eur * valuation.remaining_days,
+        np.ones(len(book)),
+    ])
+    sums = np.zeros((size, len(FIELDS)))
+    np.add.at(sums, group, values)
+
+    rows = []
+    for g in np.flatnonzero(sums[:, -1]).tolist():
+        kind, currency = divmod(g, n_currencies)
+        fields = dict(zip(FIELDS, sums[g].tolist()))
+        fields["deal_count"] = int(fields["deal_count"])
+        if np.isnan(fields["var_5"]):
+            fields["var_5"] = None
+        for period in PERIODS:
+            rows.append({
+                "period": period,
+                "bucket": period_start(day, period).isoformat(),
+                "as_of": day.isoformat(),
+                "portfolio": DEAL_TYPES[kind],
+                "currency": book.currencies[currency],
+                **fields,
+            })
+    return rows
+
+
+def nan_if_null(value: Optional[float]) -> float:
+    return np.nan if value is None else value
+
+
+def null_if_nan(value: float) -> Optional[float]:
+    return None if np.isnan(value) else value
+
+
+def resample(buckets: np.ndarray, as_of: np.ndarray, values: np.ndarray) -> List[Dict]:
+    """
+    Agrège des lignes datées par période : seules comptent les lignes du dernier
+    jour connu de chaque période, sommées. Une valeur NaN (NULL en base) rend
+    la somme de sa période NaN, renvoyée à null plutôt qu'à 0.
+
+    Args:
+        buckets: Début de période de chaque ligne (datetime64[D])
+        as_of: Date des valeurs de chaque ligne (datetime64[D])
+        values: Valeurs des FIELDS, matrice lignes × champs
+
+    Returns:
+        List[Dict]: Série triée par période
+    """
+    if not len(buckets):
+        return []
+    keys, inverse = np.unique(buckets, return_inverse=True)
+    as_of_days = as_of.astype("datetime64[D]").astype(np.int64)
+    last = np.full(len(keys), np.iinfo(np.int64).min)
+    np.maximum.at(last, inverse, as_of_days)
+    keep = as_of_days == last[inverse]
+    sums = np.zeros((len(keys), len(FIELDS)))
+    np.add.at(sums, inverse[keep], values[keep])
+
+    exposure, exposure_days = sums[:, FIELDS.index("exposure")], sums[:, FIELDS.index("exposure_days")]
+    unknown = np.isnan(exposure) | np.isnan(exposure_days)
+    maturity = np.divide(exposure_days, exposure, out=np.where(unknown, np.nan, 0.0), where=~unknown & (exposure > 0))
+    return [
+        {
+            "date": str(bucket),
+            "as_of": str(day),
+            "mtm_eur": null_if_nan(mtm),
+            "var_5": null_if_nan(var_5),
+            "stress_mtm": null_if_nan(stress),
+            "exposure": null_if_nan(total_exposure),
+            "maturity_weighted_days": null_if_nan(days),
+            "deal_count": int(count),
+        }
+        for bucket, day, (mtm, var_5, stress, total_exposure, _, count), days in zip(
+            keys.tolist(), last.astype("datetime64[D]").tolist(), sums.tolist(), maturity.tolist()
+        )
+    ]
+
+
+async def rollup_history(period: str, start: date, end: date, portfolio: Optional[str], currencies: Optional[List[str]]) -> List[Dict]:
+    """Série des KPI du portefeuille lue dans kpi_rollups : une ligne par période, devise et portefeuille."""
+    filters = [("period", "eq", period), ("bucket", "gte", period_start(start, period).isoformat()), ("bucket", "lte", end.isoformat())]
+    if portfolio:
+        filters.append(("portfolio", "eq", portfolio))
+    if currencies:
+        filters.append(("currency", "in", [c.upper() for c in currencies]))
+
+    rows = await fetch_table(ROLLUP_TABLE, ROLLUP_COLUMNS, filters)
+    return resample(
+        np.array([row["bucket"][:10] for row in rows], dtype="datetime64[D]"),
+        np.array([row["as_of"][:10] for row in rows], dtype="datetime64[D]"),
+        np.array([[nan_if_null(row[f]) for f in FIELDS] for row in rows], dtype=np.float64).reshape(len(rows), len(FIELDS)),
+    )
+
+
+async def deal_history(period: str, start: date, end: date, deal_ids: List[int], portfolio: str) -> List[Dict]:
+    """
+    Série des KPI de quelques deals, rééchantillonnée depuis deal_kpi_history.
+
+    Les ids des swaps et des prêts proviennent de deux séquences distinctes :
+    ils ne désignent un deal qu'avec son type (portfolio).
+    """
+    filters = [
+        ("deal_type", "eq", portfolio), ("deal_id", "in", deal_ids),
+        ("date", "gte", start.isoformat()), ("date", "lte", end.isoformat()),
+    ]
+
+    rows = await fetch_table("deal_kpi_history", DEAL_HISTORY_COLUMNS, filters)
+    days = np.array([row["date"][:10] for row in rows], dtype="datetime64[D]")
+    values = np.array([
+        [
+            nan_if_null(row["mtm_eur"]), nan_if_null(row["var_5"]), nan_if_null(row["stress_mtm"]), nan_if_null(row["exposure"]),
+            nan_if_null(row["exposure"]) * nan_if_null(row["maturity_weighted"]), 1.0,
+        ]
+        for row in rows
+    ], dtype=np.float64).reshape(len(rows), len(FIELDS))
+    return resample(period_starts(days, period), days, values)
@@ -1,15 +1,22 @@
-from fastapi import APIRouter, HTTPException
-from app.supabase_client import supabase
+from fastapi import APIRouter, HTTPException, Request
+from app.repository import fetch_rows, insert_rows
+from app.response_cache import cached_response, response_cache
+from app.responses import encode_rows, model_columns
 from app.schemes import BankCreate, Bank
 
 router = APIRouter()
 
+BANK_COLUMNS = model_columns(Bank)
+
 @router.get("/banks", response_model=list[Bank])
-def get_banks():
-    response = supabase.table("banks").select("*").execute()
-    return response.data
+async def get_banks(request: Request):
+    async def load():
+        rows = await fetch_rows("banks", BANK_COLUMNS)
+        return encode_rows(rows, Bank), {}
+    return await cached_response(request, "banks", load)
 
 @router.post("/banks", response_model=Bank)
-def create_bank(bank: BankCreate):
-    response = supabase.table("banks").insert(bank.dict()).execute()
-    return response.data[0]
+async def create_bank(bank: BankCreate):
+    inserted = await insert_rows("banks", [bank.dict()])
+    response_cache.invalidate("banks")
+    return inserted[0]
@@ -1,211 +1,331 @@
-from fastapi import APIRouter, HTTPException, Query
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, Query, Request
 from datetime import date, datetime, timedelta
-from typing import List, Optional
-import yfinance as yf
+from typing import List, Literal, Optional
+import asyncio
+import os
 import numpy as np
-from app.supabase_client import supabase
-from app.utils import get_spot_rate, calculate_mtm, stress_test_mtm, calculate_var
+from app.aio import run_io
+from app.book import fetch_book, load_deals, load_market
+from app.replica import book_replica
+from app.responses import CORS_HEADERS, cors_response, dumps
+from app.response_cache import cached_response
+from app.metrics import dashboard_deals_valued
+from app.utils import get_spot_rates
+from app.rate_store import rate_store
+from app.writeback import writer
+from app.snapshot import KPI_HISTORY_TABLE, snapshot_status
+from app.rollups import ROLLUP_TABLE, deal_history, rollup_history
+from app.export import export_response, pyarrow_available
+from app.ladder import LADDER_EDGES, maturity_ladder
+from app.valuation import value_book
+from app.aggregates import CurrencyBuckets, kpi_aggregates
+from app.stress import HISTORICAL_LOOKBACK_DAYS, ScenarioSet, historical_window, stress_report
+from app.schemes import StressRequest
+from app.var_engine import VAR_LOOKBACK_DAYS, currency_sensitivities, historical_var, scenario_returns
 import logging
 
 router = APIRouter()
 logging.basicConfig(level=logging.INFO)
 
-def cors_response(content):
-    return JSONResponse(
-        content=content,
-        headers={
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS",
-            "Access-Control-Allow-Headers": "*"
-        }
-    )
-
-def save_kpi_history(deal_id: int, mtm_eur: float, var_5: float, stress_mtm: float, exposure: float, maturity_weighted: float):
-    """Sauvegarde les KPI dans la table deal_kpi_history."""
+# Durée de validité d'un dashboard calculé, en secondes (0 : recalcul à chaque appel
+# hors requêtes simultanées) ; les écritures sur swaps et loans l'invalident
+DASHBOARD_CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", "5"))
+
+async def reconcile_aggregates():
+    """Recalcule les agrégats KPI depuis les tables complètes."""
+    with kpi_aggregates.tracking():
+        swaps, loans = await fetch_book(None, None, None)
+        kpi_aggregates.reconcile(swaps, loans)
+
+# Recalcul périodique en cours, partagé par les dashboards qui le déclenchent
+_reconcile_task: Optional[asyncio.Task] = None
+
+def schedule_reconcile():
+    """
+    Lance le recalcul des agrégats en tâche de fond, s'il n'est pas déjà en cours.
+
+    La tâche ne dépend d'aucune requête : elle aboutit même si le client du
+    dashboard qui l'a déclenchée se déconnecte.
+    """
+    global _reconcile_task
+    if _reconcile_task is not None and not _reconcile_task.done():
+        return
+
+    def done(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"Erreur du recalcul des agrégats KPI: {task.exception()}")
+
+    _reconcile_task = asyncio.create_task(reconcile_aggregates())
+    _reconcile_task.add_done_callback(done)
+
+@router.get("/kpi/dashboard")
+async def get_risk_dashboard(
+    request: Request,
+    deal_ids: Optional[List[int]] = Query(None),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+):
+    """
+    Dashboard de risque (MTM, VaR, stress, séries temporelles).
+
+    Les appels simultanés avec les mêmes paramètres partagent un seul calcul,
+    dont le résultat est servi pendant DASHBOARD_CACHE_TTL secondes, ou
+    jusqu'à la prochaine écriture sur les swaps ou les loans.
+    """
+    async def load():
+        today = date.today()
+        history_start = today - timedelta(days=VAR_LOOKBACK_DAYS)
+
+        if deal_ids or start_date or end_date:
+            # Sélection filtrée : valorisation deal par deal de la sélection
+            book = await load_deals(deal_ids, start_date, end_date)
+            dashboard_deals_valued.observe(len(book), "filtered")
+            spots, closes = await load_market(book.currencies, history_start, today)
+            buckets = CurrencyBuckets.from_book(book)
+            buckets.value(spots, today)
+        else:
+            # Portefeuille complet : agrégats par devise maintenus, O(nombre de devises)
+            if not kpi_aggregates.loaded:
+                await reconcile_aggregates()
+            currencies = kpi_aggregates.currencies()
+            spots, closes = await load_market(currencies, history_start, today)
+            buckets = kpi_aggregates.buckets(spots, today)
+            if buckets.currencies != currencies:
+                # Une écriture concurrente a changé les devises actives
+                spots, closes = await load_market(buckets.currencies, history_start, today)
+                buckets = kpi_aggregates.buckets(spots, today)
+            # Aucun deal valorisé : seules les sommes par devise le sont
+            dashboard_deals_valued.observe(0, "aggregates")
+            if kpi_aggregates.needs_reconcile():
+                schedule_reconcile()
+
+        dashboard_data = buckets.summary()
+
+        # VaR historique : quantile à 5% du P&L simulé, négatif en cas de perte
+        var_95 = historical_var(buckets.column("sensitivity"), scenario_returns(closes), buckets.currencies, 0.95)
+        dashboard_data["var"]["var_5_percent"] = -var_95["var"]
+        dashboard_data["var"]["missing_currencies"] = var_95["missing_currencies"]
+
+        # Séries temporelles à partir du stockage local des cours historiques
+        days = [(datetime.today() - timedelta(days=i)).date() for i in range(7)]
+        mtm_timeseries, stress_timeseries = buckets.timeseries(days, closes[-7:][::-1])
+        dashboard_data["mtm_timeseries"] = mtm_timeseries
+        dashboard_data["stress_test_timeseries"] = stress_timeseries
+
+        return dumps(dashboard_data), {}
+
     try:
-        supabase.table("deal_kpi_history").insert({
-            "deal_id": deal_id,
-            "date": date.today().isoformat(),
-            "mtm_eur": mtm_eur,
-            "var_5": var_5,
-            "stress_mtm": stress_mtm,
-            "exposure": exposure,
-            "maturity_weighted": maturity_weighted
-        }).execute()
+        return await cached_response(request, ("swaps", "loans"), load, CORS_HEADERS, ttl=DASHBOARD_CACHE_TTL)
+
+    except asyncio.TimeoutError:
+        logging.error("Délai dépassé lors du chargement du dashboard")
+        raise HTTPException(status_code=504, detail="Délai dépassé auprès d'un fournisseur de données")
+    except ValueError as ve:
+        logging.error(f"Erreur de validation: {ve}")
+        raise HTTPException(status_code=400, detail=f"Erreur de validation des données: {str(ve)}")
     except Exception as e:
-        logging.error(f"Erreur lors de la sauvegarde des KPI pour deal {deal_id}: {e}")
+        logging.error(f"Erreur dashboard: {e}")
+        raise HTTPException(status_code=500, detail="Erreur interne du serveur, veuillez réessayer plus tard")
 
-@router.get("/kpi/dashboard")
-def get_risk_dashboard(
+@router.get("/kpi/var")
+async def get_historical_var(
+    confidence: float = Query(0.99, gt=0, lt=1),
+    horizon: int = Query(1, ge=1, le=250),
+    lookback_days: int = Query(VAR_LOOKBACK_DAYS, ge=30),
     deal_ids: Optional[List[int]] = Query(None),
     start_date: Optional[date] = None,
     end_date: Optional[date] = None
 ):
+    """VaR et expected shortfall par simulation historique, du portefeuille et par devise."""
     try:
-        swaps_response = supabase.table("swaps").select("*").execute()
-        loans_response = supabase.table("loans").select("*").execute()
-
-        swaps = swaps_response.data
-        loans = loans_response.data
-
-        # Filtrage par deal_id
-        if deal_ids:
-            swaps = [s for s in swaps if s["id"] in deal_ids]
-            loans = [l for l in loans if l["id"] in deal_ids]
-
-        # Filtrage par période
-        if start_date:
-            swaps = [s for s in swaps if datetime.fromisoformat(s["start_date"]).date() >= start_date]
-            loans = [l for l in loans if datetime.fromisoformat(l["start_date"]).date() >= start_date]
-        if end_date:
-            swaps = [s for s in swaps if datetime.fromisoformat(s["maturity_date"]).date() <= end_date]
-            loans = [l for l in loans if datetime.fromisoformat(l["maturity_date"]).date() <= end_date]
-
-        dashboard_data = {
-            "mtm_summary": {"total_mtm_eur": 0.0, "by_currency": {}},
-            "stress_test": {"up_5_percent": 0.0, "down_5_percent": 0.0},
-            "var": {"var_5_percent": 0.0},
-            "weighted_maturity": {"days": 0.0, "total_nominal_eur": 0.0},
-            "exposure_by_currency": {},
-            "mtm_timeseries": [],
-            "stress_test_timeseries": []
-        }
-
-        mtm_values = []
-        stress_up_values = []
-        stress_down_values = []
-        total_nominal_eur = 0.0
-        weighted_days = 0.0
+        book = await load_deals(deal_ids, start_date, end_date)
         today = date.today()
+        spots, closes = await load_market(book.currencies, today - timedelta(days=lookback_days), today)
+        valuation = value_book(book, spots, today)
 
-        # Cache des taux spot pour éviter les appels multiples
-        spot_cache = {}
-
-        for swap in swaps:
-            if not swap.get("nominal") or not swap.get("forward_rate") or not swap.get("currency"):
-                logging.warning(f"Swap {swap['id']} a des données manquantes")
-                continue
-
-            currency = swap["currency"].upper()
-            pair = f"EUR{currency}=X"
-            if pair not in spot_cache:
-                spot_cache[pair] = get_spot_rate("EUR", currency)
-
-            try:
-                spot = spot_cache[pair]
-                mtm = calculate_mtm(swap["nominal"], swap["forward_rate"], "EUR", currency)
-                mtm_values.append(mtm)
-                dashboard_data["mtm_summary"]["total_mtm_eur"] += mtm
-                dashboard_data["mtm_summary"]["by_currency"][currency] = dashboard_data["mtm_summary"]["by_currency"].get(currency, 0.0) + mtm
-
-                stress_up = stress_test_mtm(swap["nominal"], swap["forward_rate"], "EUR", currency, 0.05)
-                stress_down = stress_test_mtm(swap["nominal"], swap["forward_rate"], "EUR", currency, -0.05)
-                stress_up_values.append(stress_up)
-                stress_down_values.append(stress_down)
-
-                maturity_date = datetime.fromisoformat(swap["maturity_date"]).date()
-                remaining_days = (maturity_date - today).days
-                nominal_eur = swap["nominal"] * spot
-                weighted_days += remaining_days * nominal_eur
-                total_nominal_eur += nominal_eur
-
-                dashboard_data["exposure_by_currency"][currency] = dashboard_data["exposure_by_currency"].get(currency, 0.0) + nominal_eur
-
-                # Mise à jour des champs calculés dans la table swaps
-                supabase.table("swaps").update({
-                    "mtm_eur": mtm,
-                    "spot_value_eur": nominal_eur
-                }).eq("id", swap["id"]).execute()
-
-                # Sauvegarde dans deal_kpi_history
-                save_kpi_history(
-                    deal_id=swap["id"],
-                    mtm_eur=mtm,
-                    var_5=calculate_var([mtm]),
-                    stress_mtm=stress_up,
-                    exposure=nominal_eur,
-                    maturity_weighted=remaining_days
-                )
-            except ValueError as ve:
-                logging.error(f"Erreur swap {swap['id']}: {ve}")
-                continue
-
-        for loan in loans:
-            if not loan.get("nominal") or not loan.get("conversion_rate") or not loan.get("currency"):
-                logging.warning(f"Loan {loan['id']} a des données manquantes")
-                continue
-
-            currency = loan["currency"].upper()
-            pair = f"EUR{currency}=X"
-            if pair not in spot_cache:
-                spot_cache[pair] = get_spot_rate("EUR", currency)
-
-            try:
-                spot = spot_cache[pair]
-                mtm = (loan["nominal"] * spot) - (loan["nominal"] * loan["conversion_rate"])
-                mtm_values.append(mtm)
-                dashboard_data["mtm_summary"]["total_mtm_eur"] += mtm
-                dashboard_data["mtm_summary"]["by_currency"][currency] = dashboard_data["mtm_summary"]["by_currency"].get(currency, 0.0) + mtm
-
-                maturity_date = datetime.fromisoformat(loan["maturity_date"]).date()
-                remaining_days = (maturity_date - today).days
-                nominal_eur = loan["nominal"] * loan["conversion_rate"]
-                weighted_days += remaining_days * nominal_eur
-                total_nominal_eur += nominal_eur
-
-                dashboard_data["exposure_by_currency"][currency] = dashboard_data["exposure_by_currency"].get(currency, 0.0) + nominal_eur
-
-                # Sauvegarde dans deal_kpi_history
-                save_kpi_history(
-                    deal_id=loan["id"],
-                    mtm_eur=mtm,
-                    var_5=calculate_var([mtm]),
-                    stress_mtm=0.0,  # Pas de stress test pour les loans
-                    exposure=nominal_eur,
-                    maturity_weighted=remaining_days
-                )
-            except ValueError as ve:
-                logging.error(f"Erreur loan {loan['id']}: {ve}")
-                continue
-
-        dashboard_data["stress_test"]["up_5_percent"] = sum(stress_up_values)
-        dashboard_data["stress_test"]["down_5_percent"] = sum(stress_down_values)
-        dashboard_data["var"]["var_5_percent"] = calculate_var(mtm_values)
-
-        if total_nominal_eur > 0:
-            dashboard_data["weighted_maturity"]["days"] = weighted_days / total_nominal_eur
-        dashboard_data["weighted_maturity"]["total_nominal_eur"] = total_nominal_eur
-
-        # Séries temporelles avec données historiques
-        for i in range(7):
-            day = (datetime.today() - timedelta(days=i)).date()
-            mtm_day = 0.0
-            stress_up_day = 0.0
-            stress_down_day = 0.0
-            for swap in swaps:
-                if not swap.get("nominal") or not swap.get("forward_rate") or not swap.get("currency"):
-                    continue
-                currency = swap["currency"].upper()
-                pair = f"EUR{currency}=X"
-                try:
-                    ticker = yf.Ticker(pair)
-                    data = ticker.history(period="7d")
-                    spot = data["Close"].loc[day.strftime("%Y-%m-%d")]
-                    mtm_day += (swap["forward_rate"] - spot) * swap["nominal"]
-                    stress_up_day += stress_test_mtm(swap["nominal"], swap["forward_rate"], "EUR", currency, 0.05)
-                    stress_down_day += stress_test_mtm(swap["nominal"], swap["forward_rate"], "EUR", currency, -0.05)
-                except Exception as e:
-                    logging.error(f"Erreur série temporelle swap {swap['id']} pour {day}: {e}")
-                    continue
-            dashboard_data["mtm_timeseries"].append({"date": day.isoformat(), "mtm": mtm_day})
-            dashboard_data["stress_test_timeseries"].append({"date": day.isoformat(), "up_5_percent": stress_up_day, "down_5_percent": stress_down_day})
-
-        return cors_response(dashboard_data)
+        returns = scenario_returns(closes, horizon)
+        result = historical_var(currency_sensitivities(book, valuation), returns, book.currencies, confidence)
+        return cors_response({"confidence": confidence, "horizon_days": horizon, "lookback_days": lookback_days, **result})
 
+    except asyncio.TimeoutError:
+        logging.error("Délai dépassé lors du calcul de la VaR")
+        raise HTTPException(status_code=504, detail="Délai dépassé auprès d'un fournisseur de données")
     except ValueError as ve:
         logging.error(f"Erreur de validation: {ve}")
         raise HTTPException(status_code=400, detail=f"Erreur de validation des données: {str(ve)}")
     except Exception as e:
-        logging.error(f"Erreur dashboard: {e}")
+        logging.error(f"Erreur VaR: {e}")
+        raise HTTPException(status_code=500, detail="Erreur interne du serveur, veuillez réessayer plus tard")
+
+@router.post("/kpi/stress")
+async def run_stress_scenarios(request: StressRequest):
+    """
+    Stress tests sur une grille de scénarios : chocs spot et forward par devise,
+    grilles régulières et scénarios historiques nommés, évalués en un seul calcul.
+    """
+    try:
+        if request.deal_ids or request.start_date or request.end_date:
+            buckets = CurrencyBuckets.from_book(await load_deals(request.deal_ids, request.start_date, request.end_date))
+        else:
+            if not kpi_aggregates.loaded:
+                await reconcile_aggregates()
+            buckets = kpi_aggregates.sums()
+        currencies = buckets.currencies
+
+        scenarios = ScenarioSet(currencies)
+        for scenario in request.scenarios:
+            scenarios.add_scenario(scenario)
+        for grid in request.grids:
+            scenarios.add_grid(grid)
+        scenarios.reserve(len(request.historical))
+        windows = [historical_window(name) for name in request.historical]
+
+        spots, *histories = await asyncio.gather(
+            run_io(get_spot_rates, "EUR", currencies),
+            *[
+                run_io(rate_store.history, "EUR", currencies, start - timedelta(days=HISTORICAL_LOOKBACK_DAYS), end)
+                for start, end in windows
+            ]
+        )
+        for name, (start, end), (days, closes) in zip(request.historical, windows, histories):
+            scenarios.add_historical(name, days, closes, start, end)
+
+        spot = np.array([spots[c] for c in currencies], dtype=np.float64)
+        return cors_response(stress_report(scenarios, buckets.sums, spot))
+
+    except asyncio.TimeoutError:
+        logging.error("Délai dépassé lors des stress tests")
+        raise HTTPException(status_code=504, detail="Délai dépassé auprès d'un fournisseur de données")
+    except ValueError as ve:
+        logging.error(f"Erreur de validation: {ve}")
+        raise HTTPException(status_code=400, detail=f"Erreur de validation des données: {str(ve)}")
+    except Exception as e:
+        logging.error(f"Erreur stress tests: {e}")
         raise HTTPException(status_code=500, detail="Erreur interne du serveur, veuillez réessayer plus tard")
+
+@router.get("/kpi/history")
+async def get_kpi_history(
+    request: Request,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    interval: Literal["day", "week", "month"] = "day",
+    portfolio: Optional[Literal["swap", "loan"]] = None,
+    currencies: Optional[List[str]] = Query(None),
+    deal_ids: Optional[List[int]] = Query(None)
+):
+    """
+    Historique des KPI (MTM, VaR, stress, exposition) rééchantillonné par jour,
+    semaine ou mois ; chaque période porte les valeurs de son dernier jour snapshoté.
+
+    Sans deal_ids, la série est lue dans les rollups par portefeuille et devise ;
+    avec deal_ids, elle est agrégée depuis deal_kpi_history (currencies est alors
+    ignoré) et portfolio est obligatoire, swaps et prêts ayant des ids distincts.
+    """
+    end = end_date or date.today()
+    start = start_date or end - timedelta(days=365)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start_date doit précéder end_date")
+    if deal_ids and not portfolio:
+        raise HTTPException(status_code=400, detail="portfolio (swap ou loan) est obligatoire avec deal_ids")
+    try:
+        async def load():
+            if deal_ids:
+                series = await deal_history(interval, start, end, deal_ids, portfolio)
+            else:
+                series = await rollup_history(interval, start, end, portfolio, currencies)
+            return dumps({
+                "interval": interval,
+                "start_date": start.isoformat(),
+                "end_date": end.isoformat(),
+                "source": KPI_HISTORY_TABLE if deal_ids else ROLLUP_TABLE,
+                "series": series,
+            }), {}
+        return await cached_response(request, KPI_HISTORY_TABLE if deal_ids else ROLLUP_TABLE, load, CORS_HEADERS)
+
+    except asyncio.TimeoutError:
+        logging.error("Délai dépassé lors de la lecture de l'historique KPI")
+        raise HTTPException(status_code=504, detail="Délai dépassé auprès d'un fournisseur de données")
+    except Exception as e:
+        logging.error(f"Erreur historique KPI: {e}")
+        raise HTTPException(status_code=500, detail="Erreur interne du serveur, veuillez réessayer plus tard")
+
+@router.get("/kpi/export")
+async def export_valuations(
+    format: Literal["csv", "arrow", "parquet"] = "csv",
+    deal_ids: Optional[List[int]] = Query(None),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+):
+    """
+    Export des valorisations par deal aux taux spot courants, en flux : CSV
+    par blocs, ou Arrow IPC / Parquet produits depuis les colonnes NumPy.
+    """
+    if format != "csv" and not pyarrow_available():
+        raise HTTPException(status_code=501, detail=f"Le format {format} nécessite le paquet pyarrow")
+    try:
+        book = await load_deals(deal_ids, start_date, end_date)
+        today = date.today()
+        spots = await run_io(get_spot_rates, "EUR", book.currencies)
+        return export_response(book, value_book(book, spots, today), format, today)
+
+    except asyncio.TimeoutError:
+        logging.error("Délai dépassé lors de l'export des valorisations")
+        raise HTTPException(status_code=504, detail="Délai dépassé auprès d'un fournisseur de données")
+    except ValueError as ve:
+        logging.error(f"Erreur de validation: {ve}")
+        raise HTTPException(status_code=400, detail=f"Erreur de validation des données: {str(ve)}")
+    except Exception as e:
+        logging.error(f"Erreur export: {e}")
+        raise HTTPException(status_code=500, detail="Erreur interne du serveur, veuillez réessayer plus tard")
+
+@router.get("/kpi/ladder")
+async def get_maturity_ladder(
+    request: Request,
+    edges: Optional[List[int]] = Query(None),
+    deal_ids: Optional[List[int]] = Query(None),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+):
+    """
+    Échéancier par maturité résiduelle (par défaut 0–1m, 1–3m, 3–12m, 1y+) :
+    exposition EUR, MTM et stress par tranche aux taux spot courants.
+
+    edges donne d'autres bornes de tranches, en jours ; la borne 0 est toujours incluse.
+    """
+    if edges and min(edges) < 0:
+        raise HTTPException(status_code=400, detail="Les bornes de tranches doivent être positives")
+    bounds = sorted({0, *edges}) if edges else list(LADDER_EDGES)
+
+    async def load():
+        book = await load_deals(deal_ids, start_date, end_date)
+        today = date.today()
+        spots = await run_io(get_spot_rates, "EUR", book.currencies)
+        return dumps(maturity_ladder(book, value_book(book, spots, today), today, bounds)), {}
+
+    try:
+        return await cached_response(request, ("swaps", "loans"), load, CORS_HEADERS, ttl=DASHBOARD_CACHE_TTL)
+
+    except asyncio.TimeoutError:
+        logging.error("Délai dépassé lors du calcul de l'échéancier")
+        raise HTTPException(status_code=504, detail="Délai dépassé auprès d'un fournisseur de données")
+    except ValueError as ve:
+        logging.error(f"Erreur de validation: {ve}")
+        raise HTTPException(status_code=400, detail=f"Erreur de validation des données: {str(ve)}")
+    except Exception as e:
+        logging.error(f"Erreur échéancier: {e}")
+        raise HTTPException(status_code=500, detail="Erreur interne du serveur, veuillez réessayer plus tard")
+
+@router.get("/kpi/writeback/status")
+def get_writeback_status():
+    """Statut des écritures différées (lignes en attente, erreurs)."""
+    return cors_response(writer.status())
+
+@router.get("/kpi/replica/status")
+def get_replica_status():
+    """Statut de la réplique en mémoire du portefeuille (lignes, fraîcheur)."""
+    return cors_response(book_replica.status())
+
+@router.get("/kpi/snapshot/status")
+def get_snapshot_status():
+    """Statut du job de snapshot quotidien des KPI."""
+    return cors_response(snapshot_status)
@@ -1,17 +1,46 @@
-from fastapi import APIRouter, HTTPException
-from app.supabase_client import supabase
+from fastapi import APIRouter, Body, HTTPException, Query, Request
+from pydantic import ValidationError
+from typing import Any, Dict, List, Literal, Optional
+import os
+from app.aggregates import kpi_aggregates
+from app.valuation import LOAN
+from app.repository import delete_row, insert_rows, update_row
+from app.response_cache import cached_response, response_cache
+from app.responses import encode_row, encode_rows, model_columns
+from app.replica import book_replica
+from app.pagination import LIST_MAX_PAGE_SIZE, LIST_PAGE_SIZE, list_rows, ndjson_response, wants_ndjson
 from app.schemes import LoanCreate, Loan
-from app.utils import calculate_loan_characteristics
+from app.utils import calculate_loan_characteristics, calculate_loans_characteristics
 
 router = APIRouter()
 
+# Nombre de prêts par insertion lors d'un import en masse
+LOANS_BATCH_SIZE = int(os.getenv("LOANS_BATCH_SIZE", "500"))
+
+# Colonnes exposées par GET /loans : les lignes sont encodées sans revalidation
+LOAN_COLUMNS = model_columns(Loan)
+
 @router.get("/loans", response_model=list[Loan])
-def get_loans():
-    response = supabase.table("loans").select("*").execute()
-    return response.data
+async def get_loans(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=LIST_MAX_PAGE_SIZE),
+    after: Optional[int] = None,
+    format: Optional[Literal["json", "ndjson"]] = None
+):
+    if wants_ndjson(request, format):
+        pages = book_replica.iter_pages("loans", limit or LIST_PAGE_SIZE, after, LOAN_COLUMNS) if book_replica.serves("loans") else None
+        return ndjson_response("loans", lambda row: encode_row(row, Loan), limit or LIST_PAGE_SIZE, after, columns=LOAN_COLUMNS, pages=pages)
+
+    async def load():
+        if book_replica.serves("loans"):
+            rows, headers = book_replica.list_rows("loans", limit, after, LOAN_COLUMNS)
+        else:
+            rows, headers = await list_rows("loans", limit, after, LOAN_COLUMNS)
+        return encode_rows(rows, Loan), headers
+    return await cached_response(request, "loans", load)
 
 @router.post("/loans", response_model=Loan)
-def create_loan(loan: LoanCreate):
+async def create_loan(loan: LoanCreate):
     data = loan.dict()
     data["start_date"] = data["start_date"].isoformat()
     data["maturity_date"] = data["maturity_date"].isoformat()
@@ -28,11 +57,55 @@ def create_loan(loan: LoanCreate):
     )
     data.update(calculated)
 
-    response = supabase.table("loans").insert(data).execute()
-    return response.data[0]
+    inserted = await insert_rows("loans", [data])
+    response_cache.invalidate("loans")
+    kpi_aggregates.upsert_deal(LOAN, inserted[0])
+    book_replica.upsert("loans", inserted[:1])
+    return inserted[0]
+
+@router.post("/loans/batch")
+async def create_loans_batch(loans: List[Dict[str, Any]] = Body(...)):
+    """
+    Import de prêts en masse : validation ligne à ligne, calcul vectorisé des
+    échéanciers et insertion par lots de LOANS_BATCH_SIZE lignes.
+    Une ligne invalide ou un lot refusé n'interrompt pas l'import.
+    """
+    results: List[Dict] = [{"index": i, "status": "error"} for i in range(len(loans))]
+    valid_rows, valid_index = [], []
+    for i, row in enumerate(loans):
+        try:
+            data = LoanCreate(**row).dict()
+        except ValidationError as e:
+            results[i]["detail"] = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            continue
+        data["start_date"] = data["start_date"].isoformat()
+        data["maturity_date"] = data["maturity_date"].isoformat()
+        valid_rows.append(data)
+        valid_index.append(i)
+
+    for data, calculated in zip(valid_rows, calculate_loans_characteristics(valid_rows)):
+        data.update(calculated)
+
+    for start in range(0, len(valid_rows), LOANS_BATCH_SIZE):
+        chunk = valid_rows[start:start + LOANS_BATCH_SIZE]
+        chunk_index = valid_index[start:start + LOANS_BATCH_SIZE]
+        try:
+            inserted = await insert_rows("loans", chunk)
+        except Exception as e:
+            for i in chunk_index:
+                results[i]["detail"] = f"Insertion échouée: {e}"
+            continue
+        response_cache.invalidate("loans")
+        book_replica.upsert("loans", inserted)
+        for i, row in zip(chunk_index, inserted):
+            results[i] = {"index": i, "status": "ok", "id": row["id"]}
+            kpi_aggregates.upsert_deal(LOAN, row)
+
+    inserted_count = sum(1 for result in results if result["status"] == "ok")
+    return {"inserted": inserted_count, "errors": len(loans) - inserted_count, "results": results}
 
 @router.put("/loans/{loan_id}", response_model=Loan)
-def update_loan(loan_id: int, loan: LoanCreate):
+async def update_loan(loan_id: int, loan: LoanCreate):
     data = loan.dict()
     data["start_date"] = data["start_date"].isoformat()
     data["maturity_date"] = data["maturity_date"].isoformat()
@@ -48,13 +121,19 @@ def update_loan(loan_id: int, loan: LoanCreate):
     )
     data.update(calculated)
 
-    response = supabase.table("loans").update(data).eq("id", loan_id).execute()
-    if not response.data:
+    updated = await update_row("loans", loan_id, data)
+    if not updated:
         raise HTTPException(status_code=404, detail="Loan not found")
-    return response.data[0]
+    response_cache.invalidate("loans")
+    kpi_aggregates.upsert_deal(LOAN, updated[0])
+    book_replica.upsert("loans", updated[:1])
+    return updated[0]
 
 @router.delete("/loans/{loan_id}")
-def delete_loan(loan_id: int):
-    response = supabase.table("loans").delete().eq("id", loan_id).execute()
-    if not response.data:
+async def delete_loan(loan_id: int):
+    deleted = await delete_row("loans", loan_id)
+    if not deleted:
         raise HTTPException(status_code=404, detail="Loan not found")
+    response_cache.invalidate("loans")
+    kpi_aggregates.remove_deal(LOAN, loan_id)
+    book_replica.remove("loans", [loan_id])
@@ -1,32 +1,61 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Body, HTTPException, Query, Request
+from pydantic import ValidationError
 from datetime import date
-from app.supabase_client import supabase
+from typing import Any, Dict, List, Literal, Optional
+import asyncio
+import os
+from app.aggregates import kpi_aggregates
+from app.valuation import SWAP
+from app.aio import run_io
+from app.repository import delete_row, insert_rows, update_row
+from app.response_cache import cached_response, response_cache
+from app.responses import CORS_HEADERS, cors_response, encode_row, encode_rows
+from app.replica import book_replica
+from app.pagination import LIST_MAX_PAGE_SIZE, LIST_PAGE_SIZE, list_rows, ndjson_response, wants_ndjson
 from app.schemes import SwapCreate, Swap
-from app.utils import calculate_mtm
+from app.utils import calculate_mtm, calculate_swaps_characteristics, get_spot_rates
 
 router = APIRouter()
 
-def cors_response(content):
-    return JSONResponse(
-        content=content,
-        headers={
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS",
-            "Access-Control-Allow-Headers": "*"
-        }
-    )
+# Nombre de swaps par insertion lors d'un import en masse
+SWAPS_BATCH_SIZE = int(os.getenv("SWAPS_BATCH_SIZE", "500"))
+
+async def resolve_spot_rates(currencies: List[str]) -> Dict[str, float]:
+    """
+    Taux spot EUR/devise des devises d'un lot, en un seul téléchargement ; si
+    celui-ci échoue, chaque devise est tentée séparément et les devises sans
+    taux sont omises.
+    """
+    try:
+        return await run_io(get_spot_rates, "EUR", currencies)
+    except Exception:
+        rates = await asyncio.gather(*[run_io(get_spot_rates, "EUR", [c]) for c in currencies], return_exceptions=True)
+        return {c: rate[c] for c, rate in zip(currencies, rates) if isinstance(rate, dict)}
 
 @router.get("/swaps", response_model=list[Swap])
-def get_swaps():
+async def get_swaps(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=LIST_MAX_PAGE_SIZE),
+    after: Optional[int] = None,
+    format: Optional[Literal["json", "ndjson"]] = None
+):
     try:
-        response = supabase.table("swaps").select("*").execute()
-        return cors_response(response.data)
+        if wants_ndjson(request, format):
+            pages = book_replica.iter_pages("swaps", limit or LIST_PAGE_SIZE, after) if book_replica.serves("swaps") else None
+            return ndjson_response("swaps", lambda row: encode_row(row, Swap), limit or LIST_PAGE_SIZE, after, CORS_HEADERS, pages=pages)
+
+        async def load():
+            if book_replica.serves("swaps"):
+                rows, headers = book_replica.list_rows("swaps", limit, after)
+            else:
+                rows, headers = await list_rows("swaps", limit, after)
+            return encode_rows(rows, Swap), headers
+        return await cached_response(request, "swaps", load, CORS_HEADERS)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/swaps", response_model=Swap)
-def create_swap(swap: SwapCreate):
+async def create_swap(swap: SwapCreate):
     try:
         start_date = swap.start_date
         maturity_date = swap.maturity_date
@@ -42,7 +71,7 @@ def create_swap(swap: SwapCreate):
         quote_currency = swap.currency.upper()
 
         try:
-            mtm_eur = calculate_mtm(swap.nominal, swap.forward_rate, base_currency, quote_currency)
+            mtm_eur = await run_io(calculate_mtm, swap.nominal, swap.forward_rate, base_currency, quote_currency)
         except Exception:
             mtm_eur = None
 
@@ -56,17 +85,63 @@ def create_swap(swap: SwapCreate):
         data["total_days"] = total_days
         data["remaining_days"] = remaining_days
 
-        response = supabase.table("swaps").insert(data).execute()
+        inserted = await insert_rows("swaps", [data])
 
-        if not response.data or len(response.data) == 0:
+        if not inserted or len(inserted) == 0:
             raise HTTPException(status_code=500, detail="Insertion échouée")
 
-        return cors_response(response.data[0])
+        response_cache.invalidate("swaps")
+        kpi_aggregates.upsert_deal(SWAP, inserted[0])
+        book_replica.upsert("swaps", inserted[:1])
+        return cors_response(inserted[0])
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/swaps/batch")
+async def create_swaps_batch(swaps: List[Dict[str, Any]] = Body(...)):
+    """
+    Import de swaps en masse : validation ligne à ligne, champs dérivés calculés
+    en une passe vectorisée avec un taux spot par devise, et insertion par lots
+    de SWAPS_BATCH_SIZE lignes. Une ligne invalide ou un lot refusé
+    n'interrompt pas l'import.
+    """
+    results: List[Dict] = [{"index": i, "status": "error"} for i in range(len(swaps))]
+    valid_rows, valid_index = [], []
+    for i, row in enumerate(swaps):
+        try:
+            data = SwapCreate(**row).dict()
+        except ValidationError as e:
+            results[i]["detail"] = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            continue
+        data["start_date"] = data["start_date"].isoformat()
+        data["maturity_date"] = data["maturity_date"].isoformat()
+        valid_rows.append(data)
+        valid_index.append(i)
+
+    spots = await resolve_spot_rates(sorted({data["currency"].upper() for data in valid_rows}))
+    for data, calculated in zip(valid_rows, calculate_swaps_characteristics(valid_rows, spots, date.today())):
+        data.update(calculated)
+
+    for start in range(0, len(valid_rows), SWAPS_BATCH_SIZE):
+        chunk = valid_rows[start:start + SWAPS_BATCH_SIZE]
+        chunk_index = valid_index[start:start + SWAPS_BATCH_SIZE]
+        try:
+            inserted = await insert_rows("swaps", chunk)
+        except Exception as e:
+            for i in chunk_index:
+                results[i]["detail"] = f"Insertion échouée: {e}"
+            continue
+        response_cache.invalidate("swaps")
+        book_replica.upsert("swaps", inserted)
+        for i, row in zip(chunk_index, inserted):
+            results[i] = {"index": i, "status": "ok", "id": row["id"]}
+            kpi_aggregates.upsert_deal(SWAP, row)
+
+    inserted_count = sum(1 for result in results if result["status"] == "ok")
+    return cors_response({"inserted": inserted_count, "errors": len(swaps) - inserted_count, "results": results})
+
 @router.put("/swaps/{swap_id}", response_model=Swap)
-def update_swap(swap_id: int, swap: SwapCreate):
+async def update_swap(swap_id: int, swap: SwapCreate):
     try:
         start_date = swap.start_date
         maturity_date = swap.maturity_date
@@ -82,7 +157,7 @@ def update_swap(swap_id: int, swap: SwapCreate):
         quote_currency = swap.currency.upper()
 
         try:
-            mtm_eur = calculate_mtm(swap.nominal, swap.forward_rate, base_currency, quote_currency)
+            mtm_eur = await run_io(calculate_mtm, swap.nominal, swap.forward_rate, base_currency, quote_currency)
         except Exception:
             mtm_eur = None
 
@@ -96,23 +171,29 @@ def update_swap(swap_id: int, swap: SwapCreate):
         data["total_days"] = total_days
         data["remaining_days"] = remaining_days
 
-        response = supabase.table("swaps").update(data).eq("id", swap_id).execute()
+        updated = await update_row("swaps", swap_id, data)
 
-        if not response.data:
+        if not updated:
             raise HTTPException(status_code=404, detail="Swap introuvable")
 
-        return cors_response(response.data[0])
+        response_cache.invalidate("swaps")
+        kpi_aggregates.upsert_deal(SWAP, updated[0])
+        book_replica.upsert("swaps", updated[:1])
+        return cors_response(updated[0])
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/swaps/{swap_id}")
-def delete_swap(swap_id: int):
+async def delete_swap(swap_id: int):
     try:
-        response = supabase.table("swaps").delete().eq("id", swap_id).execute()
+        deleted = await delete_row("swaps", swap_id)
 
-        if not response.data:
+        if not deleted:
             raise HTTPException(status_code=404, detail="Swap introuvable")
 
+        response_cache.invalidate("swaps")
+        kpi_aggregates.remove_deal(SWAP, swap_id)
+        book_replica.remove("swaps", [swap_id])
         return cors_response({"message": "Swap supprimé"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
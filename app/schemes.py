@@ -1,6 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import date
-from typing import Literal, List, Dict
+from typing import Literal, List, Dict, Optional
 
 # ---------------------
 # Modèles pour les prêts
@@ -68,3 +68,32 @@ class Bank(BankBase):
     model_config = {
         "from_attributes": True
     }
+
+# ---------------------
+# Modèles pour les stress tests
+# ---------------------
+
+class StressScenario(BaseModel):
+    """Scénario explicite : chocs relatifs des taux EUR/devise (0.1 = +10%)."""
+    name: str
+    spot_shock: float = 0.0
+    forward_shock: float = 0.0
+    spot_shocks: Dict[str, float] = {}
+    forward_shocks: Dict[str, float] = {}
+
+class StressGrid(BaseModel):
+    """Grille de chocs de min à max par pas de step, sur le spot, le forward ou les deux."""
+    min: float = -0.30
+    max: float = 0.30
+    step: float = Field(0.01, ge=0.0001)
+    target: Literal["spot", "forward", "both"] = "spot"
+    per_currency: bool = False
+    currencies: Optional[List[str]] = None
+
+class StressRequest(BaseModel):
+    scenarios: List[StressScenario] = []
+    grids: List[StressGrid] = []
+    historical: List[str] = []
+    deal_ids: Optional[List[int]] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
@@ -0,0 +1,270 @@
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Set, Tuple
+import argparse
+import asyncio
+import logging
+import os
+import time
+import numpy as np
+from app.repository import close_repository, fetch_rows
+from app.aio import run_io
+from app.book import fetch_book, load_market
+from app.pagination import fetch_table
+from app.rate_store import rate_store
+from app.writeback import writer
+from app.replica import book_replica
+from app.metrics import dashboard_deals_valued
+from app.aggregates import kpi_aggregates
+from app.rollups import ROLLUP_CONFLICT, ROLLUP_TABLE, period_start, rollup_rows
+from app.valuation import DEAL_TYPES, SWAP, Book, Valuation, load_book, value_book
+from app.var_engine import VAR_LOOKBACK_DAYS, deal_var, missing_currencies, scenario_returns
+
+logging.basicConfig(level=logging.WARNING)
+
+# Intervalle entre deux snapshots planifiés, en secondes (0 pour désactiver le planificateur)
+KPI_SNAPSHOT_INTERVAL = float(os.getenv("KPI_SNAPSHOT_INTERVAL", "3600"))
+# Planificateur lancé par le processus API : à n'activer que sur une seule instance
+# (sinon chaque worker valorise et réécrit tout le portefeuille). Par défaut, un
+# processus dédié le lance : python -m app.snapshot schedule (voir Procfile).
+KPI_SNAPSHOT_SCHEDULER = os.getenv("KPI_SNAPSHOT_SCHEDULER", "false").lower() in ("1", "true", "yes")
+
+# Une ligne par deal et par jour : la table doit porter une contrainte d'unicité
+# sur (deal_id, deal_type, date), les identifiants des swaps et des prêts
+# provenant de deux séquences distinctes (voir migrations/).
+KPI_HISTORY_TABLE = "deal_kpi_history"
+KPI_HISTORY_CONFLICT = "deal_id,deal_type,date"
+
+snapshot_status: Dict = {
+    "running": False,
+    "last_run": None,
+    "last_date": None,
+    "deals": 0,
+    "duration_s": None,
+    "last_error": None,
+}
+
+
+def last_closes(closes: np.ndarray) -> np.ndarray:
+    """Dernière clôture connue de chaque colonne (NaN si aucune)."""
+    valid = ~np.isnan(closes)
+    if not len(closes):
+        return np.full(closes.shape[1], np.nan)
+    last = closes[len(closes) - 1 - valid[::-1].argmax(axis=0), np.arange(closes.shape[1])]
+    return np.where(valid.any(axis=0), last, np.nan)
+
+
+def value_day(book: Book, day: date, spot: np.ndarray, returns: np.ndarray) -> Tuple[Book, Valuation, List[Dict], List[Dict]]:
+    """
+    Valorise les deals en vie à une date et construit leurs lignes d'historique
+    et de rollups.
+
+    Un deal est en vie si start_date <= day <= maturity_date ; les deals
+    d'une devise sans taux connu à cette date sont ignorés. La VaR d'un
+    deal dont la devise n'a pas d'historique est enregistrée à NULL.
+
+    Args:
+        book: Portefeuille complet
+        day: Date du snapshot
+        spot: Taux EUR/devise par devise du Book (NaN si inconnu)
+        returns: Variations historiques pour la VaR, matrice scénarios × devises
+
+    Returns:
+        Tuple: (deals valorisés, valorisation, lignes de deal_kpi_history, lignes de kpi_rollups)
+    """
+    alive = book.index.select(start_to=day, maturity_from=day)
+    live = book.take(alive[~np.isnan(spot[book.currency_idx[alive]])])
+    valuation = value_book(live, dict(zip(book.currencies, spot.tolist())), day)
+    var_95 = deal_var(live, valuation, returns, 0.95)
+    missing = missing_currencies(returns, book.currencies)
+    if missing:
+        logging.warning(f"Snapshot du {day} : VaR non calculée pour les devises sans historique {missing}")
+    rows = [
+        {
+            "deal_id": deal_id,
+            "deal_type": DEAL_TYPES[kind],
+            "date": day.isoformat(),
+            "mtm_eur": mtm,
+            "var_5": None if np.isnan(deal_var_95) else -deal_var_95,
+            "stress_mtm": stress_up,
+            "exposure": nominal_eur,
+            "maturity_weighted": remaining_days,
+        }
+        for deal_id, kind, mtm, deal_var_95, stress_up, nominal_eur, remaining_days in zip(
+            live.ids.tolist(), live.kinds.tolist(), valuation.mtm.tolist(), var_95.tolist(),
+            valuation.stress_up.tolist(), valuation.nominal_eur.tolist(), valuation.remaining_days.tolist()
+        )
+    ]
+    return live, valuation, rows, rollup_rows(live, valuation, var_95, day)
+
+
+def swap_updates(book: Book, valuation: Valuation) -> List[Dict]:
+    """
+    Champs calculés des swaps (mtm_eur, spot_value_eur) à réécrire dans la table swaps.
+
+    Seuls l'id et ces deux colonnes sont renvoyés : le reste de la ligne,
+    lu au début du snapshot, peut avoir été modifié depuis.
+    """
+    is_swap = book.kinds == SWAP
+    return [
+        {"id": deal_id, "mtm_eur": mtm, "spot_value_eur": nominal_eur}
+        for deal_id, mtm, nominal_eur in zip(
+            book.ids[is_swap].tolist(), valuation.mtm[is_swap].tolist(), valuation.nominal_eur[is_swap].tolist()
+        )
+    ]
+
+
+async def run_snapshot() -> int:
+    """
+    Snapshot du jour : valorise tout le portefeuille, écrit une ligne par deal
+    et met à jour les rollups du jour, de la semaine et du mois.
+
+    Relancé le même jour, il remplace les lignes du jour (upsert) au lieu
+    d'en ajouter. Il réécrit aussi les champs calculés des swaps et
+    réconcilie les agrégats KPI à partir des tables lues.
+
+    Returns:
+        int: Nombre de deals enregistrés
+    """
+    today = date.today()
+    with kpi_aggregates.tracking():
+        swaps, loans = await fetch_book(None, None, None)
+        kpi_aggregates.reconcile(swaps, loans)
+    book = load_book(swaps, loans)
+    spots, closes = await load_market(book.currencies, today - timedelta(days=VAR_LOOKBACK_DAYS), today)
+    spot = np.array([spots[c] for c in book.currencies], dtype=np.float64)
+
+    live, valuation, rows, rollups = value_day(book, today, spot, scenario_returns(closes))
+    dashboard_deals_valued.observe(len(live), "snapshot")
+    writer.submit(KPI_HISTORY_TABLE, rows, on_conflict=KPI_HISTORY_CONFLICT)
+    writer.submit(ROLLUP_TABLE, rollups, on_conflict=ROLLUP_CONFLICT)
+    updates = swap_updates(live, valuation)
+    writer.submit_updates("swaps", updates)
+    book_replica.update("swaps", updates)
+    # Des centaines de lots pour le portefeuille complet : bien plus que IO_TIMEOUT
+    await run_io(writer.flush, timeout=None)
+    return len(rows)
+
+
+async def existing_dates(start: date, end: date) -> Set[date]:
+    """Jours de la période ayant déjà au moins une ligne d'historique."""
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    found = await asyncio.gather(*[
+        fetch_rows(KPI_HISTORY_TABLE, "deal_id", [("date", "eq", day.isoformat())], limit=1)
+        for day in days
+    ])
+    return {day for day, rows in zip(days, found) if rows}
+
+
+async def latest_rollups(start: date, end: date) -> Dict[Tuple[str, str], str]:
+    """Dernier jour (as_of) déjà agrégé de chaque semaine et mois touchant la période."""
+    first = min(period_start(start, "week"), period_start(start, "month"))
+    rows = await fetch_table(ROLLUP_TABLE, "id,period,bucket,as_of", [
+        ("period", "in", ["week", "month"]), ("bucket", "gte", first.isoformat()), ("bucket", "lte", end.isoformat())
+    ])
+    latest: Dict[Tuple[str, str], str] = {}
+    for row in rows:
+        key = (row["period"], row["bucket"][:10])
+        latest[key] = max(latest.get(key, ""), row["as_of"][:10])
+    return latest
+
+
+async def backfill(start: date, end: date, force: bool = False) -> int:
+    """
+    Reconstitue l'historique des jours manquants à partir des cours stockés.
+
+    Chaque jour est valorisé à la dernière clôture connue à cette date, avec
+    une VaR calculée sur l'historique qui précède ; les écritures sont des
+    upserts, relancer un backfill est donc sans effet de bord. Les rollups
+    d'une semaine ou d'un mois ne sont remplacés que par un jour au moins
+    aussi récent que celui qu'ils portent déjà.
+
+    Args:
+        start: Premier jour
+        end: Dernier jour
+        force: Recalculer aussi les jours déjà présents
+
+    Returns:
+        int: Nombre de lignes écrites
+    """
+    swaps, loans = await fetch_book(None, None, None)
+    book = load_book(swaps, loans)
+    days, closes = await run_io(rate_store.history, "EUR", book.currencies, start - timedelta(days=VAR_LOOKBACK_DAYS), end, timeout=None)
+    done = set() if force else await existing_dates(start, end)
+    latest = await latest_rollups(start, end)
+
+    written = 0
+    for i in range((end - start).days + 1):
+        day = start + timedelta(days=i)
+        if day in done:
+            continue
+        stop = int(np.searchsorted(days, np.datetime64(day, "D"), side="right"))
+        window = closes[max(0, stop - VAR_LOOKBACK_DAYS - 1):stop]
+        _, _, rows, rollups = value_day(book, day, last_closes(window), scenario_returns(window))
+        writer.submit(KPI_HISTORY_TABLE, rows, on_conflict=KPI_HISTORY_CONFLICT)
+        current = [
+            row for row in rollups
+            if row["period"] == "day" or latest.get((row["period"], row["bucket"]), "") <= row["as_of"]
+        ]
+        for row in current:
+            latest[(row["period"], row["bucket"])] = row["as_of"]
+        writer.submit(ROLLUP_TABLE, current, on_conflict=ROLLUP_CONFLICT)
+        written += len(rows)
+        if writer.pending_rows() >= writer.batch_size * 10:
+            await run_io(writer.flush, timeout=None)
+    await run_io(writer.flush, timeout=None)
+    return written
+
+
+async def scheduled_snapshot() -> None:
+    """Exécute un snapshot en mettant à jour snapshot_status ; une erreur est journalisée."""
+    snapshot_status["running"] = True
+    start = time.perf_counter()
+    try:
+        snapshot_status["deals"] = await run_snapshot()
+        snapshot_status["last_date"] = date.today().isoformat()
+        snapshot_status["last_error"] = None
+    except Exception as e:
+        logging.error(f"Erreur du snapshot KPI: {e}")
+        snapshot_status["last_error"] = str(e)
+    finally:
+        snapshot_status["running"] = False
+        snapshot_status["last_run"] = datetime.now().isoformat()
+        snapshot_status["duration_s"] = time.perf_counter() - start
+
+
+async def snapshot_scheduler(interval: float = KPI_SNAPSHOT_INTERVAL) -> None:
+    """Boucle du planificateur (python -m app.snapshot schedule, ou l'API si KPI_SNAPSHOT_SCHEDULER)."""
+    while True:
+        await scheduled_snapshot()
+        await asyncio.sleep(interval)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Snapshots quotidiens des KPI par deal")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("run", help="Snapshot du jour")
+    commands.add_parser("schedule", help="Snapshot toutes les KPI_SNAPSHOT_INTERVAL secondes (processus unique)")
+    backfill_parser = commands.add_parser("backfill", help="Reconstitue les jours manquants")
+    backfill_parser.add_argument("--start", type=date.fromisoformat, required=True, help="Premier jour (YYYY-MM-DD)")
+    backfill_parser.add_argument("--end", type=date.fromisoformat, default=date.today() - timedelta(days=1), help="Dernier jour (défaut : hier)")
+    backfill_parser.add_argument("--force", action="store_true", help="Recalculer aussi les jours déjà présents")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "run":
+            count = asyncio.run(run_snapshot())
+            print(f"Snapshot du {date.today()} : {count} deals")
+        elif args.command == "schedule":
+            asyncio.run(snapshot_scheduler(KPI_SNAPSHOT_INTERVAL or 3600))
+        else:
+            count = asyncio.run(backfill(args.start, args.end, args.force))
+            print(f"Backfill du {args.start} au {args.end} : {count} lignes")
+    finally:
+        close_repository()
+    status = writer.status()
+    if status["pending_rows"]:
+        raise SystemExit(f"{status['pending_rows']} lignes non écrites : {status['last_error']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+from datetime import date
+from typing import Dict, List
+import logging
+from sqlalchemy import Date, delete, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from app import models  # noqa: F401  (enregistre les tables dans Base.metadata)
+from app.database import DATABASE_URL, Base, create_db_engine
+from app.repository import Repository
+
+logging.basicConfig(level=logging.WARNING)
+
+# INSERT ... ON CONFLICT par dialecte
+_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+class SqlRepository(Repository):
+    """
+    Backend SQLAlchemy : requêtes ensemblistes sur un pool de connexions.
+
+    Une table complète se lit en une requête, un lot s'insère ou s'upserte
+    en un seul executemany. Les tables d'une base SQLite (usage local) sont
+    créées au démarrage.
+
+    Raises:
+        RuntimeError: Si le dialecte de la base ne permet pas l'upsert
+    """
+
+    def __init__(self, url: str = DATABASE_URL):
+        self.engine = create_db_engine(url)
+        if self.engine.dialect.name not in _UPSERT_INSERTS:
+            self.engine.dispose()
+            raise RuntimeError(f"Upsert non supporté pour {self.engine.dialect.name} (dialectes : {', '.join(_UPSERT_INSERTS)})")
+        self.tables = Base.metadata.tables
+        if self.engine.dialect.name == "sqlite":
+            Base.metadata.create_all(self.engine)
+        self._dates = {
+            name: {column.name for column in table.columns if isinstance(column.type, Date)}
+            for name, table in self.tables.items()
+        }
+
+    def _table(self, name: str):
+        try:
+            return self.tables[name]
+        except KeyError:
+            raise ValueError(f"Table inconnue : {name}")
+
+    def _value(self, table: str, column: str, value):
+        # Les dates circulent en ISO (format PostgREST) : le type Date attend des objets date
+        if column in self._dates[table] and isinstance(value, str):
+            return date.fromisoformat(value[:10])
+        return value
+
+    def _params(self, table: str, row: Dict) -> Dict:
+        return {column: self._value(table, column, value) for column, value in row.items()}
+
+    @staticmethod
+    def _rows(result) -> List[Dict]:
+        return [
+            {column: value.isoformat() if isinstance(value, date) else value for column, value in row.items()}
+            for row in result.mappings()
+        ]
+
+    def _where(self, table, filters):
+        conditions = []
+        for column, operator, value in filters:
+            c = table.c[column]
+            if operator == "in":
+                conditions.append(c.in_([self._value(table.name, column, v) for v in value]))
+                continue
+            value = self._value(table.name, column, value)
+            conditions.append({
+                "eq": c == value,
+                "gt": c > value,
+                "gte": c >= value,
+                "lt": c < value,
+                "lte": c <= value,
+            }[operator])
+        return conditions
+
+    def select(self, table, columns="*", filters=(), order_by=None, limit=None):
+        t = self._table(table)
+        selected = list(t.c) if columns == "*" else [t.c[c.strip()] for c in columns.split(",")]
+        query = select(*selected).where(*self._where(t, filters))
+        if order_by:
+            query = query.order_by(t.c[order_by])
+        if limit is not None:
+            query = query.limit(limit)
+        with self.engine.connect() as conn:
+            return self._rows(conn.execute(query))
+
+    def insert(self, table, rows):
+        if not rows:
+            return []
+        t = self._table(table)
+        with self.engine.begin() as conn:
+            result = conn.execute(
+                insert(t).returning(*t.c, sort_by_parameter_order=True),
+                [self._params(table, row) for row in rows],
+            )
+            return self._rows(result)
+
+    def update(self, table, row_id, data):
+        t = self._table(table)
+        with self.engine.begin() as conn:
+            return self._rows(conn.execute(update(t).where(t.c.id == row_id).values(**self._params(table, data)).returning(*t.c)))
+
+    def delete(self, table, row_id):
+        t = self._table(table)
+        with self.engine.begin() as conn:
+            return self._rows(conn.execute(delete(t).where(t.c.id == row_id).returning(*t.c)))
+
+    def upsert(self, table, rows, on_conflict):
+        if not rows:
+            return
+        t = self._table(table)
+        keys = on_conflict.split(",")
+        statement = _UPSERT_INSERTS[self.engine.dialect.name](t)
+        updated = {column: statement.excluded[column] for column in rows[0] if column not in keys}
+        if updated:
+            statement = statement.on_conflict_do_update(index_elements=keys, set_=updated)
+        else:
+            statement = statement.on_conflict_do_nothing(index_elements=keys)
+        with self.engine.begin() as conn:
+            conn.execute(statement, [self._params(table, row) for row in rows])
+
+    def close(self):
+        self.engine.dispose()
@@ -0,0 +1,206 @@
+from datetime import date
+from typing import Dict, List, Tuple
+import logging
+import math
+import os
+import numpy as np
+from app.aggregates import LOAN_CONVERTED, LOAN_NOMINAL, SWAP_FORWARD_NOMINAL, SWAP_NOMINAL
+from app.schemes import StressGrid, StressScenario
+
+logging.basicConfig(level=logging.WARNING)
+
+# Nombre maximal de scénarios par appel de /kpi/stress
+STRESS_MAX_SCENARIOS = int(os.getenv("STRESS_MAX_SCENARIOS", "20000"))
+
+# Jours téléchargés avant le début d'un scénario historique pour retrouver la dernière clôture connue
+HISTORICAL_LOOKBACK_DAYS = int(os.getenv("HISTORICAL_LOOKBACK_DAYS", "10"))
+
+# Scénarios historiques nommés : variation des taux EUR/devise entre deux dates de clôture
+HISTORICAL_SCENARIOS: Dict[str, Tuple[date, date, str]] = {
+    "gfc_2008": (date(2008, 9, 12), date(2008, 10, 24), "Faillite de Lehman Brothers"),
+    "euro_crisis_2011": (date(2011, 7, 1), date(2011, 9, 12), "Crise des dettes souveraines de la zone euro"),
+    "snb_2015": (date(2015, 1, 14), date(2015, 1, 16), "Fin du cours plancher EUR/CHF"),
+    "brexit_2016": (date(2016, 6, 23), date(2016, 6, 27), "Référendum sur le Brexit"),
+    "covid_2020": (date(2020, 2, 20), date(2020, 3, 20), "Choc Covid-19"),
+    "ukraine_2022": (date(2022, 2, 23), date(2022, 3, 7), "Invasion de l'Ukraine"),
+}
+
+
+class ScenarioSet:
+    """Scénarios de stress en colonnes : chocs spot et forward, matrices scénarios × devises."""
+
+    def __init__(self, currencies: List[str]):
+        self.currencies = currencies
+        self.names: List[str] = []
+        # Scénario historique -> devises sans cotation, laissées sans choc
+        self.missing: Dict[str, List[str]] = {}
+        self._spot: List[np.ndarray] = []
+        self._forward: List[np.ndarray] = []
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def add(self, names: List[str], spot: np.ndarray, forward: np.ndarray) -> None:
+        self.names.extend(names)
+        self._spot.append(spot.reshape(len(names), len(self.currencies)))
+        self._forward.append(forward.reshape(len(names), len(self.currencies)))
+
+    def shocks(self) -> Tuple[np.ndarray, np.ndarray]:
+        n = len(self.currencies)
+        spot = np.vstack(self._spot) if self._spot else np.zeros((0, n))
+        forward = np.vstack(self._forward) if self._forward else np.zeros((0, n))
+        return spot, forward
+
+    def reserve(self, count: int) -> None:
+        """
+        Vérifie que count scénarios supplémentaires restent sous STRESS_MAX_SCENARIOS.
+
+        Raises:
+            ValueError: Si la limite serait dépassée
+        """
+        if len(self) + count > STRESS_MAX_SCENARIOS:
+            raise ValueError(f"Trop de scénarios ({len(self) + count}), maximum {STRESS_MAX_SCENARIOS}")
+
+    def add_scenario(self, scenario: StressScenario) -> None:
+        self.reserve(1)
+        spot = np.array([scenario.spot_shocks.get(c, scenario.spot_shock) for c in self.currencies], dtype=np.float64)
+        forward = np.array([scenario.forward_shocks.get(c, scenario.forward_shock) for c in self.currencies], dtype=np.float64)
+        self.add([scenario.name], spot, forward)
+
+    def add_grid(self, grid: StressGrid) -> None:
+        """
+        Ajoute une grille de chocs.
+
+        Sans per_currency, chaque pas choque ensemble toutes les devises
+        retenues ; avec per_currency, chaque pas choque une seule devise.
+        """
+        selected = set(grid.currencies) if grid.currencies else set(self.currencies)
+        # Taille de la grille vérifiée avant toute allocation
+        span = (grid.max - grid.min) / grid.step
+        if not np.isfinite(span):
+            raise ValueError("Grille de chocs invalide")
+        size = max(math.floor(span + 1e-9) + 1, 0)
+        self.reserve(size * (len(selected & set(self.currencies)) if grid.per_currency else 1))
+        steps = np.round(grid.min + grid.step * np.arange(size), 10)
+        mask = np.array([c in selected for c in self.currencies], dtype=np.float64)
+        if grid.per_currency:
+            currencies = [c for c in self.currencies if c in selected]
+            # (devise, pas) -> choc sur la seule colonne de la devise
+            columns = np.array([self.currencies.index(c) for c in currencies], dtype=np.int64)
+            shocks = np.zeros((len(currencies), len(steps), len(self.currencies)))
+            shocks[np.arange(len(currencies)), :, columns] = steps
+            shocks = shocks.reshape(-1, len(self.currencies))
+            names = [f"{grid.target} {c} {step:+.2%}" for c in currencies for step in steps.tolist()]
+        else:
+            shocks = steps[:, None] * mask
+            names = [f"{grid.target} {step:+.2%}" for step in steps.tolist()]
+        zeros = np.zeros_like(shocks)
+        self.add(
+            names,
+            shocks if grid.target in ("spot", "both") else zeros,
+            shocks if grid.target in ("forward", "both") else zeros,
+        )
+
+    def add_historical(self, name: str, days: np.ndarray, closes: np.ndarray, start: date, end: date) -> None:
+        """
+        Ajoute un scénario historique, appliqué au spot et au forward : variation
+        entre la dernière clôture connue au plus tard à start et la dernière
+        clôture connue au plus tard à end. Une devise sans l'une de ces deux
+        clôtures n'est pas choquée et figure dans missing[name].
+        """
+        self.reserve(1)
+        base = last_valid_close(closes[days <= np.datetime64(start, "D")], len(self.currencies))
+        last = last_valid_close(closes[days <= np.datetime64(end, "D")], len(self.currencies))
+        shock = last / base - 1.0
+        missing = np.isnan(shock)
+        self.missing[name] = [c for c, m in zip(self.currencies, missing.tolist()) if m]
+        shock = np.where(missing, 0.0, shock)
+        self.add([name], shock, shock)
+
+
+def last_valid_close(closes: np.ndarray, columns: int) -> np.ndarray:
+    """Dernière clôture non manquante de chaque colonne, NaN si la colonne n'en a aucune."""
+    if not len(closes):
+        return np.full(columns, np.nan)
+    valid = ~np.isnan(closes)
+    last = closes[len(closes) - 1 - valid[::-1].argmax(axis=0), np.arange(columns)]
+    return np.where(valid.any(axis=0), last, np.nan)
+
+
+def historical_window(name: str) -> Tuple[date, date]:
+    """
+    Dates de début et de fin d'un scénario historique nommé.
+
+    Raises:
+        ValueError: Si le scénario est inconnu
+    """
+    if name not in HISTORICAL_SCENARIOS:
+        raise ValueError(f"Scénario historique inconnu: {name} (disponibles : {', '.join(HISTORICAL_SCENARIOS)})")
+    start, end, _ = HISTORICAL_SCENARIOS[name]
+    return start, end
+
+
+def stress_mtm(sums: np.ndarray, spot: np.ndarray, spot_shocks: np.ndarray, forward_shocks: np.ndarray) -> np.ndarray:
+    """
+    MTM par scénario et par devise, en un seul calcul vectorisé.
+
+    Le MTM d'une devise est linéaire en ses taux : (1 + f) * somme(forward *
+    nominal des swaps) + (1 + s) * spot * (nominal des prêts - nominal des
+    swaps) - somme(nominal converti des prêts). La matrice deals × scénarios
+    se réduit donc exactement à une matrice scénarios × devises, quel que
+    soit le nombre de deals.
+
+    Args:
+        sums: Sommes par devise (voir app.aggregates), matrice devises × N_FIELDS
+        spot: Taux spot EUR/devise courants
+        spot_shocks: Chocs relatifs du spot, matrice scénarios × devises
+        forward_shocks: Chocs relatifs du forward des swaps, matrice scénarios × devises
+
+    Returns:
+        np.ndarray: MTM en EUR, matrice scénarios × devises
+    """
+    s = sums.T
+    forward_leg = s[SWAP_FORWARD_NOMINAL]
+    spot_leg = spot * (s[LOAN_NOMINAL] - s[SWAP_NOMINAL])
+    return (1 + forward_shocks) * forward_leg + (1 + spot_shocks) * spot_leg - s[LOAN_CONVERTED]
+
+
+def stress_report(scenarios: ScenarioSet, sums: np.ndarray, spot: np.ndarray) -> Dict:
+    """
+    Résultats des scénarios : totaux, détail par devise et pire scénario.
+
+    Args:
+        scenarios: Scénarios à évaluer
+        sums: Sommes par devise, dans l'ordre de scenarios.currencies
+        spot: Taux spot EUR/devise courants
+
+    Returns:
+        Dict: MTM de base, résultats par scénario et pire cas
+    """
+    n = len(scenarios.currencies)
+    base = stress_mtm(sums, spot, np.zeros((1, n)), np.zeros((1, n)))[0]
+    spot_shocks, forward_shocks = scenarios.shocks()
+    mtm = stress_mtm(sums, spot, spot_shocks, forward_shocks)
+    pnl = mtm - base
+    totals = mtm.sum(axis=1)
+    pnl_totals = pnl.sum(axis=1)
+
+    results = [
+        {
+            "name": name,
+            "total_mtm_eur": total,
+            "pnl_eur": total_pnl,
+            "pnl_by_currency": dict(zip(scenarios.currencies, row)),
+            "missing_currencies": scenarios.missing.get(name, []),
+        }
+        for name, total, total_pnl, row in zip(scenarios.names, totals.tolist(), pnl_totals.tolist(), pnl.tolist())
+    ]
+    worst = int(np.argmin(pnl_totals)) if len(results) else None
+    return {
+        "base_mtm_eur": float(base.sum()),
+        "base_by_currency": dict(zip(scenarios.currencies, base.tolist())),
+        "scenario_count": len(results),
+        "scenarios": results,
+        "worst_case": results[worst] if worst is not None else None,
+        "missing_currencies": sorted({c for missing in scenarios.missing.values() for c in missing}),
+    }
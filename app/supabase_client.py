@@ -1,13 +1,67 @@
-from supabase import create_client
 from dotenv import load_dotenv
 import os
+import threading
+from app.metrics import InstrumentedClient
 
 load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+# Connexions HTTP conservées par le client partagé
+SUPABASE_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "20"))
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "10"))
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise RuntimeError("Les variables SUPABASE_URL ou SUPABASE_KEY sont manquantes.")
+_client = None
+_http_client = None
+_lock = threading.Lock()
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+def init_client():
+    """
+    Crée le client Supabase partagé et sa session HTTP (pool de connexions).
+
+    Appelé au démarrage de l'application (lifespan) ; le paquet supabase
+    n'est importé qu'ici pour ne pas ralentir l'import de app.main.
+
+    Returns:
+        Client Supabase instrumenté
+
+    Raises:
+        RuntimeError: Si SUPABASE_URL ou SUPABASE_KEY est manquante
+    """
+    global _client, _http_client
+    with _lock:
+        if _client is not None:
+            return _client
+        if not SUPABASE_URL or not SUPABASE_KEY:
+            raise RuntimeError("Les variables SUPABASE_URL ou SUPABASE_KEY sont manquantes.")
+
+        import httpx
+        from supabase import ClientOptions, create_client
+
+        _http_client = httpx.Client(
+            timeout=SUPABASE_TIMEOUT,
+            limits=httpx.Limits(max_connections=SUPABASE_POOL_SIZE, max_keepalive_connections=SUPABASE_POOL_SIZE),
+        )
+        # Client enveloppé : durée et erreurs des requêtes exportées par /metrics
+        _client = InstrumentedClient(create_client(SUPABASE_URL, SUPABASE_KEY, options=ClientOptions(httpx_client=_http_client)))
+        return _client
+
+
+def close_client() -> None:
+    """Ferme la session HTTP du client partagé (arrêt de l'application)."""
+    global _client, _http_client
+    with _lock:
+        if _http_client is not None:
+            _http_client.close()
+        _client = _http_client = None
+
+
+class _LazyClient:
+    """Accès au client partagé, créé au premier usage s'il ne l'a pas été au démarrage."""
+
+    def __getattr__(self, name: str):
+        return getattr(_client or init_client(), name)
+
+
+supabase = _LazyClient()
@@ -1,17 +1,18 @@
 from datetime import datetime, date
 from typing import Dict, List
 import logging
-import yfinance as yf
 import numpy as np
-from functools import lru_cache
+from app.fx import rate_matrix
 
 logging.basicConfig(level=logging.WARNING)
 
-@lru_cache(maxsize=100)
 def get_spot_rate(base_currency: str, quote_currency: str) -> float:
     """
     Récupère le taux spot à partir de Yahoo Finance pour une paire de devises.
     
+    Le taux est déduit par triangulation de l'instantané de taux partagé
+    (un téléchargement par devise contre la devise pivot, voir app.fx).
+    
     Args:
         base_currency: Devise de base (ex. EUR)
         quote_currency: Devise de cotation (ex. USD)
@@ -22,16 +23,33 @@ def get_spot_rate(base_currency: str, quote_currency: str) -> float:
     Raises:
         ValueError: Si la récupération du taux échoue
     """
-    pair = f"{base_currency}{quote_currency}=X"
-    logging.info(f"Récupération du taux pour {pair}")
-    try:
-        ticker = yf.Ticker(pair)
-        data = ticker.history(period="1d")
-        spot = data["Close"].iloc[-1]
-        return float(spot)
-    except Exception as e:
-        logging.error(f"Erreur lors de la récupération du taux spot : {e}")
-        raise ValueError(f"Impossible de récupérer le taux spot pour {pair}")
+    return rate_matrix.snapshot([base_currency, quote_currency]).rate(base_currency, quote_currency)
+
+def get_spot_rates(base_currency: str, quote_currencies: List[str]) -> Dict[str, float]:
+    """
+    Récupère les taux spot de plusieurs devises en un seul appel Yahoo Finance.
+    
+    Tous les taux proviennent du même instantané : ils sont cohérents entre
+    eux et il suffit de les demander une fois par requête.
+    
+    Args:
+        base_currency: Devise de base (ex. EUR)
+        quote_currencies: Devises de cotation
+    
+    Returns:
+        Dict[str, float]: Taux spot par devise de cotation
+    
+    Raises:
+        ValueError: Si la récupération d'un taux échoue
+    """
+    return rate_matrix.snapshot([base_currency, *quote_currencies]).rates(base_currency, quote_currencies)
+
+PAYMENT_FREQUENCY_MONTHS = {
+    "1 mois": 1,
+    "3 mois": 3,
+    "6 mois": 6,
+    "12 mois": 12
+}
 
 def calculate_loan_characteristics(currency: str, nominal: float, rate: float, start_date: str, maturity_date: str, payment_frequency: str, conversion_rate: float) -> Dict:
     """
@@ -49,48 +67,86 @@ def calculate_loan_characteristics(currency: str, nominal: float, rate: float, s
     Returns:
         Dict: Caractéristiques du prêt (jours, intérêts, nominal en EUR, échéancier)
     """
-    start = datetime.strptime(start_date, "%Y-%m-%d")
-    maturity = datetime.strptime(maturity_date, "%Y-%m-%d")
-    num_days = (maturity - start).days
+    return calculate_loans_characteristics([{
+        "currency": currency,
+        "nominal": nominal,
+        "rate": rate,
+        "start_date": start_date,
+        "maturity_date": maturity_date,
+        "payment_frequency": payment_frequency,
+        "conversion_rate": conversion_rate
+    }])[0]
+
+def calculate_loans_characteristics(loans: List[Dict]) -> List[Dict]:
+    """
+    Calcule les caractéristiques d'un lot de prêts en une passe vectorisée.
+    
+    Les échéanciers sont générés ensemble par arithmétique datetime64[M] :
+    chaque échéance tombe le premier du mois de début décalé de
+    fréquence × rang mois.
+    
+    Args:
+        loans: Prêts (currency, nominal, rate, start_date, maturity_date,
+            payment_frequency, conversion_rate), dates au format YYYY-MM-DD
+    
+    Returns:
+        List[Dict]: Caractéristiques de chaque prêt, dans l'ordre d'entrée
+    
+    Raises:
+        ValueError: Si une date n'est pas au format YYYY-MM-DD
+    """
+    if not loans:
+        return []
+    for loan in loans:
+        datetime.strptime(loan["start_date"], "%Y-%m-%d")
+        datetime.strptime(loan["maturity_date"], "%Y-%m-%d")
+
+    start = np.array([loan["start_date"] for loan in loans], dtype="datetime64[D]")
+    maturity = np.array([loan["maturity_date"] for loan in loans], dtype="datetime64[D]")
+    nominal = np.array([loan["nominal"] for loan in loans], dtype=np.float64)
+    rate = np.array([loan["rate"] for loan in loans], dtype=np.float64)
+    conversion_rate = np.array([loan["conversion_rate"] for loan in loans], dtype=np.float64)
+    in_fine = np.array([loan["payment_frequency"] == "in_fine" for loan in loans])
+    months = np.array([PAYMENT_FREQUENCY_MONTHS.get(loan["payment_frequency"], 12) for loan in loans], dtype=np.int64)
+
+    num_days = (maturity - start).astype(np.int64)
     total_interest = nominal * rate * num_days / 36000
     nominal_eur = nominal * conversion_rate
 
-    schedule = []
-    if payment_frequency == "in_fine":
-        schedule.append({
-            "date": maturity_date,
-            "principal_payment": nominal,
-            "interest_payment": round(total_interest, 2)
+    start_month = start.astype("datetime64[M]")
+    total_months = (maturity.astype("datetime64[M]") - start_month).astype(np.int64)
+    num_payments = np.where(in_fine, 1, np.maximum(total_months // months, 1))
+
+    # Échéances de tous les prêts à plat : rang de chaque échéance dans son prêt
+    owner = np.repeat(np.arange(len(loans)), num_payments)
+    first_row = np.cumsum(num_payments) - num_payments
+    rank = np.arange(len(owner)) - first_row[owner]
+    payment_dates = np.datetime_as_string((start_month[owner] + months[owner] * rank).astype("datetime64[D]")).tolist()
+
+    results = []
+    for i, loan in enumerate(loans):
+        interest = total_interest[i].item()
+        count = int(num_payments[i])
+        if in_fine[i]:
+            schedule = [{
+                "date": loan["maturity_date"],
+                "principal_payment": loan["nominal"],
+                "interest_payment": round(interest, 2)
+            }]
+        else:
+            principal_payment = round(loan["nominal"] / count, 2)
+            interest_payment = round(interest / count, 2)
+            schedule = [
+                {"date": payment_date, "principal_payment": principal_payment, "interest_payment": interest_payment}
+                for payment_date in payment_dates[first_row[i]:first_row[i] + count]
+            ]
+        results.append({
+            "number_of_days": int(num_days[i]),
+            "total_interest": round(interest, 2),
+            "nominal_in_eur": round(nominal_eur[i].item(), 2),
+            "repayment_schedule": schedule
         })
-    else:
-        freq_map = {
-            "1 mois": 1,
-            "3 mois": 3,
-            "6 mois": 6,
-            "12 mois": 12
-        }
-        months = freq_map.get(payment_frequency, 12)
-        total_months = (maturity.year - start.year) * 12 + (maturity.month - start.month)
-        num_payments = max(total_months // months, 1)
-        principal_payment = nominal / num_payments
-        interest_payment = total_interest / num_payments
-
-        for i in range(num_payments):
-            payment_month = (start.month + months * i - 1) % 12 + 1
-            payment_year = start.year + (start.month + months * i - 1) // 12
-            payment_date = start.replace(day=1).replace(year=payment_year, month=payment_month)
-            schedule.append({
-                "date": payment_date.strftime("%Y-%m-%d"),
-                "principal_payment": round(principal_payment, 2),
-                "interest_payment": round(interest_payment, 2)
-            })
-
-    return {
-        "number_of_days": num_days,
-        "total_interest": round(total_interest, 2),
-        "nominal_in_eur": round(nominal_eur, 2),
-        "repayment_schedule": schedule
-    }
+    return results
 
 def calculate_mtm(nominal: float, forward: float, base_currency: str, quote_currency: str) -> float:
     """
@@ -108,6 +164,50 @@ def calculate_mtm(nominal: float, forward: float, base_currency: str, quote_curr
     spot = get_spot_rate(base_currency, quote_currency)
     return (forward - spot) * nominal
 
+def calculate_swaps_characteristics(swaps: List[Dict], spots: Dict[str, float], today: date) -> List[Dict]:
+    """
+    Calcule les champs dérivés d'un lot de swaps en une passe vectorisée.
+
+    Args:
+        swaps: Swaps (currency, nominal, start_date, maturity_date, spot_rate,
+            forward_rate), dates au format YYYY-MM-DD
+        spots: Taux spot EUR/devise, une fois par devise ; un swap dont la
+            devise est absente a un mtm_eur à None
+        today: Date de calcul des jours restants
+
+    Returns:
+        List[Dict]: Champs dérivés de chaque swap, dans l'ordre d'entrée
+    """
+    if not swaps:
+        return []
+    currencies, currency_idx = np.unique([swap["currency"].upper() for swap in swaps], return_inverse=True)
+    spot = np.array([spots.get(c, np.nan) for c in currencies.tolist()], dtype=np.float64)[currency_idx]
+    nominal = np.array([swap["nominal"] for swap in swaps], dtype=np.float64)
+    spot_rate = np.array([swap["spot_rate"] for swap in swaps], dtype=np.float64)
+    forward_rate = np.array([swap["forward_rate"] for swap in swaps], dtype=np.float64)
+    start = np.array([swap["start_date"] for swap in swaps], dtype="datetime64[D]")
+    maturity = np.array([swap["maturity_date"] for swap in swaps], dtype="datetime64[D]")
+
+    spot_value_eur = nominal * spot_rate
+    forward_value_eur = nominal * forward_rate
+    mtm_eur = (forward_rate - spot) * nominal
+    total_days = (maturity - start).astype(np.int64)
+    remaining_days = (maturity - np.datetime64(today, "D")).astype(np.int64)
+
+    return [
+        {
+            "spot_value_eur": spot_value,
+            "forward_value_eur": forward_value,
+            "swap_points_eur": forward_value - spot_value,
+            "mtm_eur": None if np.isnan(mtm) else mtm,
+            "total_days": days,
+            "remaining_days": remaining,
+        }
+        for spot_value, forward_value, mtm, days, remaining in zip(
+            spot_value_eur.tolist(), forward_value_eur.tolist(), mtm_eur.tolist(), total_days.tolist(), remaining_days.tolist()
+        )
+    ]
+
 def calculate_hedging_ratio(total_covered: float, total_exposure: float) -> float:
     """
     Calcule le ratio de couverture.
@@ -1,14 +1,15 @@
-import yfinance as yf
 import logging
-from functools import lru_cache
+from app.fx import rate_matrix
 
 logging.basicConfig(level=logging.WARNING)
 
-@lru_cache(maxsize=100)
 def get_spot_rate(base_currency: str, quote_currency: str) -> float:
     """
     Récupère le taux spot à partir de Yahoo Finance pour une paire de devises.
     
+    Le taux est déduit par triangulation de l'instantané de taux partagé
+    (un téléchargement par devise contre la devise pivot, voir app.fx).
+    
     Args:
         base_currency: Devise de base (ex. EUR)
         quote_currency: Devise de cotation (ex. USD)
@@ -19,12 +20,4 @@ def get_spot_rate(base_currency: str, quote_currency: str) -> float:
     Raises:
         ValueError: Si la récupération du taux échoue
     """
-    pair = f"{base_currency}{quote_currency}=X"
-    logging.info(f"Récupération du taux pour {pair}")
-    try:
-        data = yf.download(pair, period="1d", interval="1d")
-        spot = data["Close"].iloc[-1]
-        return float(spot)
-    except Exception as e:
-        logging.error(f"Erreur lors de la récupération du taux spot : {e}")
-        raise ValueError(f"Impossible de récupérer le taux spot pour {pair}")
+    return rate_matrix.snapshot([base_currency, quote_currency]).rate(base_currency, quote_currency)
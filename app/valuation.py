@@ -0,0 +1,252 @@
+from dataclasses import dataclass
+from datetime import date
+from functools import cached_property
+from typing import Dict, List, Optional
+import logging
+import numpy as np
+
+logging.basicConfig(level=logging.WARNING)
+
+# Types de deals stockés dans la colonne "kinds"
+SWAP = 0
+LOAN = 1
+DEAL_TYPES = {SWAP: "swap", LOAN: "loan"}
+
+
+def day_number(day: date) -> int:
+    """Jours écoulés depuis le 1970-01-01 (valeur entière d'un datetime64[D])."""
+    return int(np.datetime64(day, "D").astype(np.int64))
+
+
+@dataclass
+class DateIndex:
+    """
+    Positions des deals d'un Book triées par date de début et par échéance.
+
+    Les dates sont des jours entiers depuis 1970 : une borne de date devient
+    une recherche dichotomique et une sélection une tranche contiguë.
+    """
+    by_start: np.ndarray
+    start_days: np.ndarray
+    by_maturity: np.ndarray
+    maturity_days: np.ndarray
+
+    @classmethod
+    def from_book(cls, book: "Book") -> "DateIndex":
+        start_days = book.start_date.astype(np.int64)
+        maturity_days = book.maturity_date.astype(np.int64)
+        by_start = np.argsort(start_days, kind="stable")
+        by_maturity = np.argsort(maturity_days, kind="stable")
+        return cls(by_start, start_days[by_start], by_maturity, maturity_days[by_maturity])
+
+    def maturity_positions(self, days: np.ndarray) -> np.ndarray:
+        """Nombre de deals arrivant à échéance strictement avant chaque jour (rang dans by_maturity)."""
+        return np.searchsorted(self.maturity_days, days, side="left")
+
+    def select(
+        self,
+        start_from: Optional[date] = None,
+        start_to: Optional[date] = None,
+        maturity_from: Optional[date] = None,
+        maturity_to: Optional[date] = None,
+    ) -> np.ndarray:
+        """
+        Positions, dans l'ordre du Book, des deals dont les dates sont dans les bornes (incluses).
+
+        Args:
+            start_from: Date de début minimale
+            start_to: Date de début maximale
+            maturity_from: Date d'échéance minimale
+            maturity_to: Date d'échéance maximale
+
+        Returns:
+            np.ndarray: Positions triées des deals retenus
+        """
+        selected = None
+        for order, days, low, high in (
+            (self.by_start, self.start_days, start_from, start_to),
+            (self.by_maturity, self.maturity_days, maturity_from, maturity_to),
+        ):
+            if low is None and high is None:
+                continue
+            lo = np.searchsorted(days, day_number(low), side="left") if low is not None else 0
+            hi = np.searchsorted(days, day_number(high), side="right") if high is not None else len(days)
+            positions = order[lo:hi]
+            selected = positions if selected is None else np.intersect1d(selected, positions, assume_unique=True)
+        if selected is None:
+            return np.arange(len(self.by_start))
+        return np.sort(selected)
+
+
+@dataclass
+class Book:
+    """
+    Portefeuille de swaps et de prêts chargé en colonnes NumPy.
+
+    Chaque deal occupe une position dans toutes les colonnes. Les champs
+    propres à un type de deal valent 0 pour l'autre type (forward_rate pour
+    les prêts, conversion_rate pour les swaps). bank_id vaut -1 si la
+    banque n'est pas renseignée.
+    """
+    ids: np.ndarray
+    kinds: np.ndarray
+    currency_idx: np.ndarray
+    currencies: List[str]
+    bank_id: np.ndarray
+    nominal: np.ndarray
+    forward_rate: np.ndarray
+    conversion_rate: np.ndarray
+    start_date: np.ndarray
+    maturity_date: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @cached_property
+    def index(self) -> DateIndex:
+        """Index des dates, construit au premier usage puis conservé avec le Book."""
+        return DateIndex.from_book(self)
+
+    def take(self, index: np.ndarray) -> "Book":
+        """Sous-portefeuille des deals sélectionnés (masque ou indices), mêmes devises."""
+        return Book(
+            ids=self.ids[index],
+            kinds=self.kinds[index],
+            currency_idx=self.currency_idx[index],
+            currencies=self.currencies,
+            bank_id=self.bank_id[index],
+            nominal=self.nominal[index],
+            forward_rate=self.forward_rate[index],
+            conversion_rate=self.conversion_rate[index],
+            start_date=self.start_date[index],
+            maturity_date=self.maturity_date[index],
+        )
+
+    def compact(self) -> "Book":
+        """Même portefeuille limité aux devises utilisées, dans l'ordre de première apparition."""
+        used, first = np.unique(self.currency_idx, return_index=True)
+        used = used[np.argsort(first)]
+        if len(used) == len(self.currencies):
+            return self
+        remap = np.zeros(len(self.currencies), dtype=np.intp)
+        remap[used] = np.arange(len(used))
+        book = self.take(slice(None))
+        book.currencies = [self.currencies[i] for i in used.tolist()]
+        book.currency_idx = remap[self.currency_idx]
+        return book
+
+
+@dataclass
+class Valuation:
+    """
+    Résultat de la valorisation d'un Book, une valeur par deal.
+
+    Les loans n'ont pas de stress test : leurs stress_up et stress_down
+    valent 0, convention reprise par le dashboard, les exports et les
+    snapshots.
+    """
+    spot: np.ndarray
+    mtm: np.ndarray
+    stress_up: np.ndarray
+    stress_down: np.ndarray
+    nominal_eur: np.ndarray
+    remaining_days: np.ndarray
+
+
+def _to_day(value) -> np.datetime64:
+    # Supabase renvoie "YYYY-MM-DD" ou un timestamp ISO : seule la date compte
+    return np.datetime64(str(value)[:10], "D")
+
+
+def load_book(swaps: List[Dict], loans: List[Dict]) -> Book:
+    """
+    Charge les swaps et les prêts dans un Book en colonnes.
+
+    Les deals incomplets sont ignorés avec un avertissement, comme dans la
+    boucle historique du dashboard. L'ordre des devises suit leur première
+    apparition (swaps puis prêts).
+
+    Args:
+        swaps: Lignes de la table swaps
+        loans: Lignes de la table loans
+
+    Returns:
+        Book: Portefeuille en colonnes
+    """
+    ids, kinds, currency_idx, bank_ids = [], [], [], []
+    nominal, forward_rate, conversion_rate = [], [], []
+    start_dates, maturity_dates = [], []
+    currency_index: Dict[str, int] = {}
+
+    def append(row: Dict, kind: int, forward: float, conversion: float) -> None:
+        try:
+            maturity = _to_day(row["maturity_date"])
+            start = _to_day(row["start_date"]) if row.get("start_date") else maturity
+        except (KeyError, ValueError) as e:
+            logging.error(f"Deal {row.get('id')} : date invalide ({e})")
+            return
+        currency = row["currency"].upper()
+        ids.append(row["id"])
+        kinds.append(kind)
+        currency_idx.append(currency_index.setdefault(currency, len(currency_index)))
+        bank_ids.append(-1 if row.get("bank_id") is None else row["bank_id"])
+        nominal.append(row["nominal"])
+        forward_rate.append(forward)
+        conversion_rate.append(conversion)
+        start_dates.append(start)
+        maturity_dates.append(maturity)
+
+    for swap in swaps:
+        if not swap.get("nominal") or not swap.get("forward_rate") or not swap.get("currency"):
+            logging.warning(f"Swap {swap['id']} a des données manquantes")
+            continue
+        append(swap, SWAP, swap["forward_rate"], 0.0)
+
+    for loan in loans:
+        if not loan.get("nominal") or not loan.get("conversion_rate") or not loan.get("currency"):
+            logging.warning(f"Loan {loan['id']} a des données manquantes")
+            continue
+        append(loan, LOAN, 0.0, loan["conversion_rate"])
+
+    return Book(
+        ids=np.array(ids, dtype=np.int64),
+        kinds=np.array(kinds, dtype=np.int8),
+        currency_idx=np.array(currency_idx, dtype=np.intp),
+        currencies=list(currency_index),
+        bank_id=np.array(bank_ids, dtype=np.int64),
+        nominal=np.array(nominal, dtype=np.float64),
+        forward_rate=np.array(forward_rate, dtype=np.float64),
+        conversion_rate=np.array(conversion_rate, dtype=np.float64),
+        start_date=np.array(start_dates, dtype="datetime64[D]"),
+        maturity_date=np.array(maturity_dates, dtype="datetime64[D]"),
+    )
+
+
+def value_book(book: Book, spots: Dict[str, float], today: date, variation: float = 0.05) -> Valuation:
+    """
+    Valorise tout le portefeuille en une passe vectorisée.
+
+    Args:
+        book: Portefeuille en colonnes
+        spots: Taux spot EUR/devise pour chaque devise du Book
+        today: Date de valorisation
+        variation: Choc appliqué au taux forward pour le stress test
+
+    Returns:
+        Valuation: MTM, stress, exposition EUR et jours restants par deal
+    """
+    spot_by_currency = np.array([spots[c] for c in book.currencies], dtype=np.float64)
+    spot = spot_by_currency[book.currency_idx]
+    is_swap = book.kinds == SWAP
+
+    swap_mtm = (book.forward_rate - spot) * book.nominal
+    loan_mtm = (book.nominal * spot) - (book.nominal * book.conversion_rate)
+
+    return Valuation(
+        spot=spot,
+        mtm=np.where(is_swap, swap_mtm, loan_mtm),
+        stress_up=np.where(is_swap, (book.forward_rate * (1 + variation) - spot) * book.nominal, 0.0),
+        stress_down=np.where(is_swap, (book.forward_rate * (1 - variation) - spot) * book.nominal, 0.0),
+        nominal_eur=np.where(is_swap, book.nominal * spot, book.nominal * book.conversion_rate),
+        remaining_days=(book.maturity_date - np.datetime64(today, "D")).astype(np.int64),
+    )
@@ -0,0 +1,160 @@
+from typing import Dict, List
+import logging
+import os
+import numpy as np
+from app.valuation import SWAP, Book, Valuation
+
+logging.basicConfig(level=logging.WARNING)
+
+# Profondeur d'historique des scénarios, en jours calendaires
+VAR_LOOKBACK_DAYS = int(os.getenv("VAR_LOOKBACK_DAYS", "730"))
+
+
+def currency_sensitivities(book: Book, valuation: Valuation) -> np.ndarray:
+    """
+    Variation du MTM par devise pour une hausse relative de 100% du taux EUR/devise.
+
+    Un swap vaut (forward - spot) * nominal et perd nominal * spot * r quand le
+    spot monte de r ; un prêt vaut nominal * (spot - conversion) et gagne
+    nominal * spot * r.
+
+    Args:
+        book: Portefeuille en colonnes
+        valuation: Valorisation courante
+
+    Returns:
+        np.ndarray: Vecteur de positions, une valeur par devise du Book
+    """
+    return np.bincount(book.currency_idx, weights=deal_sensitivities(book, valuation), minlength=len(book.currencies))
+
+
+def deal_sensitivities(book: Book, valuation: Valuation) -> np.ndarray:
+    """Sensibilité de chaque deal au taux EUR/devise de sa devise."""
+    exposure = book.nominal * valuation.spot
+    return np.where(book.kinds == SWAP, -exposure, exposure)
+
+
+def scenario_returns(closes: np.ndarray, horizon: int = 1) -> np.ndarray:
+    """
+    Construit la matrice scénarios × devises des variations relatives historiques.
+
+    Les jours sans aucune cotation de marché sont retirés, les trous restants sont
+    comblés par le dernier cours connu, puis les variations sont calculées
+    sur des fenêtres glissantes de horizon jours de cotation. Une devise sans
+    aucun historique (téléchargement en échec) garde une colonne de NaN :
+    elle n'est pas assimilée à un taux constant, donc sans risque.
+
+    Args:
+        closes: Cours de clôture, matrice jours × devises (NaN si absent)
+        horizon: Horizon de la VaR en jours de cotation
+
+    Returns:
+        np.ndarray: Variations relatives, matrice scénarios × devises
+    """
+    missing = np.isnan(closes)
+    # Seules les devises cotées certains jours seulement distinguent les jours de cotation,
+    # pas la devise pivot (cotée tous les jours) ni une devise sans historique
+    partial = missing.any(axis=0) & ~missing.all(axis=0)
+    if partial.any():
+        closes = closes[~missing[:, partial].all(axis=1)]
+    quoted = ~np.isnan(closes).all(axis=0)
+    closes = closes[:, quoted]
+
+    # Report du dernier cours connu sur les trous
+    rows = np.where(np.isnan(closes), 0, np.arange(len(closes))[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    closes = closes[rows, np.arange(closes.shape[1])]
+    closes = closes[~np.isnan(closes).any(axis=1)]
+
+    if len(closes) <= horizon:
+        return np.empty((0, len(quoted)))
+    returns = np.full((len(closes) - horizon, len(quoted)), np.nan)
+    returns[:, quoted] = closes[horizon:] / closes[:-horizon] - 1.0
+    return returns
+
+
+def missing_currencies(returns: np.ndarray, currencies: List[str]) -> List[str]:
+    """Devises sans historique (colonnes NaN de scenario_returns)."""
+    return [c for c, missing in zip(currencies, np.isnan(returns).all(axis=0).tolist()) if missing and len(returns)]
+
+
+def _tail(pnl: np.ndarray, confidence: float) -> tuple:
+    """VaR et expected shortfall (pertes positives) le long du premier axe."""
+    threshold = np.quantile(pnl, 1 - confidence, axis=0)
+    in_tail = pnl <= threshold
+    shortfall = np.where(in_tail, pnl, 0.0).sum(axis=0) / np.maximum(in_tail.sum(axis=0), 1)
+    return -threshold, -shortfall
+
+
+def historical_var(positions: np.ndarray, returns: np.ndarray, currencies: List[str], confidence: float = 0.95) -> Dict:
+    """
+    VaR et expected shortfall par simulation historique.
+
+    Le P&L de chaque scénario est obtenu par un seul produit matriciel entre
+    la matrice des variations et le vecteur de positions par devise. Les
+    devises sans historique sont exclues du calcul et listées dans
+    missing_currencies.
+
+    Args:
+        positions: Sensibilités par devise (voir currency_sensitivities)
+        returns: Variations historiques, matrice scénarios × devises
+        currencies: Libellés des devises, dans l'ordre des colonnes
+        confidence: Niveau de confiance (ex. 0.99)
+
+    Returns:
+        Dict: VaR et expected shortfall du portefeuille et par devise
+        (None pour une devise sans historique)
+    """
+    if not len(returns):
+        return {
+            "scenarios": 0,
+            "var": 0.0,
+            "expected_shortfall": 0.0,
+            "by_currency": {c: {"var": 0.0, "expected_shortfall": 0.0} for c in currencies},
+            "missing_currencies": [],
+        }
+
+    missing = missing_currencies(returns, currencies)
+    if missing:
+        logging.warning(f"VaR calculée sans les devises sans historique : {missing}")
+    quoted = ~np.isnan(returns).all(axis=0)
+    returns, positions = returns[:, quoted], positions[quoted]
+    portfolio_var, portfolio_es = _tail(returns @ positions, confidence)
+    currency_var, currency_es = _tail(returns * positions, confidence)
+    by_currency = dict.fromkeys(currencies)
+    by_currency.update(
+        (c, {"var": float(v), "expected_shortfall": float(es)})
+        for c, v, es in zip([c for c, q in zip(currencies, quoted.tolist()) if q], currency_var.tolist(), currency_es.tolist())
+    )
+    return {
+        "scenarios": len(returns),
+        "var": float(portfolio_var),
+        "expected_shortfall": float(portfolio_es),
+        "by_currency": by_currency,
+        "missing_currencies": missing,
+    }
+
+
+def deal_var(book: Book, valuation: Valuation, returns: np.ndarray, confidence: float = 0.95) -> np.ndarray:
+    """
+    VaR autonome de chaque deal, sans boucle sur les deals.
+
+    Le P&L d'un deal est sa sensibilité multipliée par les variations de sa
+    devise : selon le signe de la sensibilité, la VaR se lit sur le quantile
+    bas ou haut de ces variations.
+
+    Args:
+        book: Portefeuille en colonnes
+        valuation: Valorisation courante
+        returns: Variations historiques, matrice scénarios × devises du Book
+        confidence: Niveau de confiance
+
+    Returns:
+        np.ndarray: VaR par deal (pertes positives, NaN pour une devise sans historique)
+    """
+    if not len(returns):
+        return np.zeros(len(book))
+    low = np.quantile(returns, 1 - confidence, axis=0)[book.currency_idx]
+    high = np.quantile(returns, confidence, axis=0)[book.currency_idx]
+    sensitivity = deal_sensitivities(book, valuation)
+    return -np.where(sensitivity >= 0, sensitivity * low, sensitivity * high)
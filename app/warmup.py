@@ -0,0 +1,34 @@
+from datetime import date, timedelta
+import logging
+import os
+from app.aio import run_io
+from app.rate_store import rate_store
+from app.utils import get_spot_rates
+from app.var_engine import VAR_LOOKBACK_DAYS
+
+logging.basicConfig(level=logging.WARNING)
+
+# Devises dont les taux sont préchargés au démarrage (ex. "USD,GBP,JPY"), vide pour désactiver
+WARMUP_CURRENCIES = [c.strip().upper() for c in os.getenv("WARMUP_CURRENCIES", "").split(",") if c.strip()]
+
+
+async def warm_up(currencies=WARMUP_CURRENCIES) -> None:
+    """
+    Précharge les taux spot et l'historique des cours des devises données.
+
+    Lancé en tâche de fond au démarrage : la première requête du dashboard
+    trouve yfinance importé, les taux spot en cache et l'historique de la
+    VaR dans le stockage local. Un échec est journalisé sans bloquer l'API.
+
+    Args:
+        currencies: Devises à précharger
+    """
+    if not currencies:
+        return
+    try:
+        today = date.today()
+        await run_io(get_spot_rates, "EUR", currencies)
+        await run_io(rate_store.history, "EUR", currencies, today - timedelta(days=VAR_LOOKBACK_DAYS), today)
+        logging.info(f"Taux préchargés pour {', '.join(currencies)}")
+    except Exception as e:
+        logging.warning(f"Préchargement des taux échoué : {e}")
@@ -0,0 +1,174 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import logging
+import os
+import threading
+import time
+from app.repository import repository
+from app.response_cache import response_cache
+
+logging.basicConfig(level=logging.WARNING)
+
+WRITEBACK_BATCH_SIZE = int(os.getenv("WRITEBACK_BATCH_SIZE", "500"))
+WRITEBACK_MAX_RETRIES = int(os.getenv("WRITEBACK_MAX_RETRIES", "3"))
+# Mises à jour ligne à ligne envoyées en parallèle pendant un flush
+WRITEBACK_UPDATE_CONCURRENCY = int(os.getenv("WRITEBACK_UPDATE_CONCURRENCY", "8"))
+
+
+class BatchWriter:
+    """
+    File d'écritures Supabase regroupées en insertions/upserts par lots.
+
+    Les routes déposent leurs lignes avec submit() puis planifient flush()
+    en tâche de fond : les écritures partent après l'envoi de la réponse,
+    par lots de batch_size lignes, avec des tentatives répétées en cas
+    d'échec. Un lot encore en échec après max_retries tentatives est remis
+    en file pour le flush suivant.
+
+    submit_updates() écrit seulement les colonnes données d'une ligne
+    existante (update par id), sans renvoyer le reste de la ligne : une
+    modification faite entre-temps par une autre écriture est conservée.
+    """
+
+    def __init__(self, batch_size: int = WRITEBACK_BATCH_SIZE, max_retries: int = WRITEBACK_MAX_RETRIES, retry_delay: float = 0.5):
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        # (table, on_conflict) -> lignes ; les upserts sont dédoublonnés sur la clé de conflit
+        self._pending: Dict[Tuple[str, Optional[str]], Dict] = {}
+        # table -> id -> colonnes à mettre à jour
+        self._updates: Dict[str, Dict[int, Dict]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stats = {
+            "written_rows": 0,
+            "failed_rows": 0,
+            "failed_batches": 0,
+            "requeued_rows": 0,
+            "last_flush": None,
+            "last_error": None,
+        }
+
+    def submit(self, table: str, rows: List[Dict], on_conflict: Optional[str] = None) -> None:
+        """
+        Ajoute des lignes à écrire au prochain flush.
+
+        Args:
+            table: Table cible
+            rows: Lignes à écrire
+            on_conflict: Colonnes de conflit pour un upsert (None pour un insert)
+        """
+        with self._lock:
+            pending = self._pending.setdefault((table, on_conflict), {})
+            if on_conflict:
+                keys = on_conflict.split(",")
+                for row in rows:
+                    pending[tuple(row.get(k) for k in keys)] = row
+            else:
+                for row in rows:
+                    pending[len(pending)] = row
+
+    def submit_updates(self, table: str, rows: List[Dict]) -> None:
+        """
+        Ajoute des mises à jour partielles, écrites au prochain flush.
+
+        Args:
+            table: Table cible
+            rows: Colonnes à mettre à jour, avec l'id de la ligne
+        """
+        with self._lock:
+            pending = self._updates.setdefault(table, {})
+            for row in rows:
+                pending.setdefault(row["id"], {}).update(row)
+
+    def pending_rows(self) -> int:
+        with self._lock:
+            return sum(len(rows) for rows in self._pending.values()) + sum(len(rows) for rows in self._updates.values())
+
+    def flush(self) -> Dict:
+        """
+        Écrit toutes les lignes en attente par lots.
+
+        Returns:
+            Dict: Statut du writer après le flush
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                updates, self._updates = self._updates, {}
+            for (table, on_conflict), rows in pending.items():
+                rows = list(rows.values())
+                for i in range(0, len(rows), self.batch_size):
+                    self._write_batch(table, rows[i:i + self.batch_size], on_conflict)
+            for table, rows in updates.items():
+                self._write_updates(table, list(rows.values()))
+            self._stats["last_flush"] = datetime.now().isoformat()
+        return self.status()
+
+    def _attempt(self, label: str, write) -> bool:
+        """Exécute write avec max_retries tentatives ; False si toutes ont échoué."""
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                write()
+                return True
+            except Exception as e:
+                logging.warning(f"Écriture de {label} échouée (tentative {attempt}/{self.max_retries}) : {e}")
+                self._stats["last_error"] = f"{label}: {e}"
+                if attempt < self.max_retries:
+                    time.sleep(self.retry_delay * 2 ** (attempt - 1))
+        return False
+
+    def _write_batch(self, table: str, batch: List[Dict], on_conflict: Optional[str]) -> None:
+        if on_conflict:
+            written = self._attempt(f"{len(batch)} lignes dans {table}", lambda: repository.upsert(table, batch, on_conflict))
+        else:
+            written = self._attempt(f"{len(batch)} lignes dans {table}", lambda: repository.insert(table, batch))
+        if written:
+            self._stats["written_rows"] += len(batch)
+            response_cache.invalidate(table)
+            return
+        logging.error(f"Écriture de {len(batch)} lignes dans {table} remise au prochain flush")
+        self._failed(len(batch))
+        with self._lock:
+            pending = self._pending.setdefault((table, on_conflict), {})
+            if on_conflict:
+                keys = on_conflict.split(",")
+                for row in batch:
+                    # Une ligne soumise depuis le début du flush est plus récente
+                    pending.setdefault(tuple(row.get(k) for k in keys), row)
+            else:
+                for row in batch:
+                    pending[len(pending)] = row
+
+    def _write_updates(self, table: str, rows: List[Dict]) -> None:
+        def update(row: Dict) -> bool:
+            data = {name: value for name, value in row.items() if name != "id"}
+            return self._attempt(f"la ligne {row['id']} de {table}", lambda: repository.update(table, row["id"], data))
+
+        with ThreadPoolExecutor(max_workers=WRITEBACK_UPDATE_CONCURRENCY) as pool:
+            results = list(pool.map(update, rows))
+        failed = [row for row, written in zip(rows, results) if not written]
+        self._stats["written_rows"] += len(rows) - len(failed)
+        if len(failed) < len(rows):
+            response_cache.invalidate(table)
+        if not failed:
+            return
+        logging.error(f"Mise à jour de {len(failed)} lignes de {table} remise au prochain flush")
+        self._failed(len(failed))
+        with self._lock:
+            pending = self._updates.setdefault(table, {})
+            for row in failed:
+                # Les colonnes soumises depuis le début du flush l'emportent
+                pending[row["id"]] = {**row, **pending.get(row["id"], {})}
+
+    def _failed(self, rows: int) -> None:
+        self._stats["failed_rows"] += rows
+        self._stats["failed_batches"] += 1
+        self._stats["requeued_rows"] += rows
+
+    def status(self) -> Dict:
+        return {"pending_rows": self.pending_rows(), "flushing": self._flush_lock.locked(), **self._stats}
+
+
+writer = BatchWriter()
@@ -0,0 +1,302 @@
+"""
+Doublures en mémoire du client Supabase et de yfinance pour les benchmarks.
+
+install() doit être appelé avant tout import du package app : il enregistre
+des modules supabase et yfinance factices dans sys.modules, de sorte que
+l'application tourne sans réseau ni base de données.
+"""
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+import os
+import sys
+import time
+import types
+import numpy as np
+
+
+class FakeResponse:
+    def __init__(self, data: List[Dict]):
+        self.data = data
+
+
+class FakeQuery:
+    """Sous-ensemble du query builder PostgREST utilisé par l'application."""
+
+    def __init__(self, client: "FakeSupabase", table: str):
+        self.client = client
+        self.table = table
+        self.operation = None
+        self.payload = None
+        self.columns = "*"
+        self.on_conflict = None
+        self.filters = []
+        self.id_filter = None
+        self.order_by = None
+        self.row_limit = None
+
+    def select(self, columns: str = "*", **kwargs):
+        self.operation, self.columns = "select", columns
+        return self
+
+    def insert(self, payload, **kwargs):
+        self.operation, self.payload = "insert", payload
+        return self
+
+    def upsert(self, payload, on_conflict: Optional[str] = None, **kwargs):
+        self.operation, self.payload, self.on_conflict = "upsert", payload, on_conflict
+        return self
+
+    def update(self, payload, **kwargs):
+        self.operation, self.payload = "update", payload
+        return self
+
+    def delete(self, **kwargs):
+        self.operation = "delete"
+        return self
+
+    def eq(self, column: str, value):
+        if column == "id":
+            self.id_filter = [value]
+        else:
+            self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def in_(self, column: str, values):
+        values = set(values)
+        if column == "id":
+            self.id_filter = list(values)
+        else:
+            self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def gt(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] > value)
+        return self
+
+    def gte(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] >= value)
+        return self
+
+    def lt(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] < value)
+        return self
+
+    def lte(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] <= value)
+        return self
+
+    def order(self, column: str, desc: bool = False, **kwargs):
+        self.order_by = (column, desc)
+        return self
+
+    def limit(self, count: int, **kwargs):
+        self.row_limit = count
+        return self
+
+    def _matching(self, rows: Dict[int, Dict]) -> List[Dict]:
+        if self.id_filter is not None:
+            candidates = [rows[i] for i in self.id_filter if i in rows]
+        else:
+            candidates = rows.values()
+        return [row for row in candidates if all(f(row) for f in self.filters)]
+
+    def execute(self) -> FakeResponse:
+        if self.client.latency:
+            time.sleep(self.client.latency)
+        self.client.calls += 1
+        rows = self.client.tables.setdefault(self.table, {})
+
+        if self.operation == "select":
+            matching = self._matching(rows)
+            if self.order_by:
+                matching.sort(key=lambda row: row[self.order_by[0]], reverse=self.order_by[1])
+            if self.row_limit is not None:
+                matching = matching[:self.row_limit]
+            if self.columns != "*":
+                columns = [c.strip() for c in self.columns.split(",")]
+                return FakeResponse([{c: row.get(c) for c in columns} for row in matching])
+            return FakeResponse([dict(row) for row in matching])
+
+        if self.operation in ("insert", "upsert"):
+            payload = self.payload if isinstance(self.payload, list) else [self.payload]
+            written = []
+            for row in payload:
+                row = dict(row)
+                existing = None
+                if self.operation == "upsert" and self.on_conflict == "id":
+                    existing = rows.get(row.get("id"))
+                elif self.operation == "upsert" and self.on_conflict:
+                    keys = self.on_conflict.split(",")
+                    index = self.client.unique_index(self.table, keys)
+                    existing = index.get(tuple(row.get(k) for k in keys))
+                if existing is not None:
+                    existing.update(row)
+                    written.append(dict(existing))
+                    continue
+                row.setdefault("id", self.client.next_id(self.table))
+                rows[row["id"]] = row
+                if self.on_conflict and self.on_conflict != "id":
+                    keys = self.on_conflict.split(",")
+                    self.client.unique_index(self.table, keys)[tuple(row.get(k) for k in keys)] = row
+                written.append(dict(row))
+            return FakeResponse(written)
+
+        if self.operation == "update":
+            matching = self._matching(rows)
+            for row in matching:
+                row.update(self.payload)
+            return FakeResponse([dict(row) for row in matching])
+
+        if self.operation == "delete":
+            matching = self._matching(rows)
+            for row in matching:
+                del rows[row["id"]]
+            return FakeResponse(matching)
+
+        raise ValueError(f"Opération non supportée : {self.operation}")
+
+
+class FakeSupabase:
+    """Client Supabase en mémoire : une table est un dict id -> ligne."""
+
+    def __init__(self, latency: float = 0.0):
+        self.tables: Dict[str, Dict[int, Dict]] = {}
+        self.latency = latency
+        self.calls = 0
+        self._ids: Dict[str, int] = {}
+        self._unique: Dict[tuple, Dict] = {}
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def next_id(self, table: str) -> int:
+        current = self._ids.get(table)
+        if current is None:
+            current = max(self.tables.get(table, {}), default=0)
+        self._ids[table] = current + 1
+        return current + 1
+
+    def unique_index(self, table: str, keys: List[str]) -> Dict:
+        key = (table, tuple(keys))
+        if key not in self._unique:
+            self._unique[key] = {tuple(row.get(k) for k in keys): row for row in self.tables.get(table, {}).values()}
+        return self._unique[key]
+
+    def load(self, table: str, rows: List[Dict]) -> None:
+        self.tables[table] = {row["id"]: row for row in rows}
+        self._ids.pop(table, None)
+        self._unique = {k: v for k, v in self._unique.items() if k[0] != table}
+
+
+# Taux EUR/devise de référence des cours synthétiques
+BASE_RATES = {"USD": 1.08, "GBP": 0.85, "JPY": 160.0, "CHF": 0.95, "CAD": 1.47, "AUD": 1.63, "SEK": 11.4, "NOK": 11.6}
+
+
+def synthetic_close(ticker: str, day: date) -> float:
+    """Cours déterministe d'un ticker EURXXX=X pour un jour donné."""
+    base = BASE_RATES.get(ticker[3:6], 1.0)
+    seed = sum(map(ord, ticker))
+    return base * (1 + 0.02 * np.sin((day.toordinal() + seed) / 17.0))
+
+
+class FakeSeries:
+    def __init__(self, index: List[datetime], values: List[float]):
+        self.index = index
+        self.values = values
+        self.ndim = 1
+
+    def dropna(self) -> "FakeSeries":
+        return self
+
+    def items(self):
+        return zip(self.index, self.values)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @property
+    def iloc(self):
+        return self.values
+
+
+class FakeFrame:
+    """Colonnes "Close" d'un téléchargement multi-tickers."""
+
+    def __init__(self, columns: Dict[str, FakeSeries]):
+        self.columns = columns
+        self.ndim = 2
+
+    def __getitem__(self, key):
+        if key == "Close":
+            return self
+        return self.columns[key]
+
+    def __contains__(self, key) -> bool:
+        return key in self.columns
+
+
+class FakeYFinance:
+    """Module yfinance factice : download() et Ticker().history() sur des cours synthétiques."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+
+    def _series(self, ticker: str, start: date, end: date) -> FakeSeries:
+        days = [start + timedelta(days=i) for i in range((end - start).days)]
+        days = [d for d in days if d.weekday() < 5]
+        return FakeSeries([datetime(d.year, d.month, d.day) for d in days], [synthetic_close(ticker, d) for d in days])
+
+    def _range(self, period: Optional[str], start, end):
+        if start:
+            return date.fromisoformat(str(start)), date.fromisoformat(str(end)) if end else date.today() + timedelta(days=1)
+        days = int((period or "1d").rstrip("d"))
+        return date.today() - timedelta(days=days - 1), date.today() + timedelta(days=1)
+
+    def download(self, tickers, period: Optional[str] = None, start=None, end=None, **kwargs) -> FakeFrame:
+        if self.latency:
+            time.sleep(self.latency)
+        self.calls += 1
+        tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+        first, last = self._range(period, start, end)
+        return FakeFrame({ticker: self._series(ticker, first, last) for ticker in tickers})
+
+    def Ticker(self, ticker: str):
+        client = self
+
+        class _Ticker:
+            def history(self, period: str = "1d", **kwargs):
+                return client.download(ticker, period=period)[ticker]
+
+        return _Ticker()
+
+
+def install(supabase_latency: float = 0.0, yfinance_latency: float = 0.0):
+    """
+    Enregistre les doublures avant l'import de l'application.
+
+    Args:
+        supabase_latency: Latence simulée par requête Supabase, en secondes
+        yfinance_latency: Latence simulée par téléchargement Yahoo Finance, en secondes
+
+    Returns:
+        Tuple: (client Supabase factice, yfinance factice)
+    """
+    if "app.supabase_client" in sys.modules:
+        raise RuntimeError("install() doit être appelé avant l'import de l'application")
+    client = FakeSupabase(supabase_latency)
+    yfinance = FakeYFinance(yfinance_latency)
+
+    supabase_module = types.ModuleType("supabase")
+    supabase_module.create_client = lambda url, key, *args, **kwargs: client
+    supabase_module.ClientOptions = lambda **kwargs: kwargs
+    sys.modules["supabase"] = supabase_module
+
+    yfinance_module = types.ModuleType("yfinance")
+    yfinance_module.download = yfinance.download
+    yfinance_module.Ticker = yfinance.Ticker
+    sys.modules["yfinance"] = yfinance_module
+
+    os.environ.setdefault("SUPABASE_URL", "http://supabase.invalid")
+    os.environ.setdefault("SUPABASE_KEY", "benchmark")
+    return client, yfinance
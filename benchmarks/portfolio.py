@@ -0,0 +1,88 @@
+from typing import Dict, List
+import numpy as np
+from benchmarks.fakes import BASE_RATES
+
+FREQUENCIES = ["in_fine", "1 mois", "3 mois", "6 mois", "12 mois"]
+
+
+def _dates(rng: np.random.Generator, n: int):
+    start = np.datetime64("2023-01-01") + rng.integers(0, 900, n)
+    maturity = start + rng.integers(30, 1800, n)
+    return np.datetime_as_string(start).tolist(), np.datetime_as_string(maturity).tolist()
+
+
+def generate_swaps(n: int, seed: int = 0, banks: int = 10) -> List[Dict]:
+    """
+    Swaps synthétiques au format de la table swaps.
+
+    Args:
+        n: Nombre de swaps
+        seed: Graine du générateur
+        banks: Nombre de banques contreparties
+
+    Returns:
+        List[Dict]: Lignes de swaps, identifiants 1..n
+    """
+    rng = np.random.default_rng(seed)
+    currencies = list(BASE_RATES)
+    currency = rng.choice(currencies, n).tolist()
+    spot = np.array([BASE_RATES[c] for c in currency])
+    nominal = rng.uniform(1e5, 5e7, n).round(2).tolist()
+    forward = (spot * rng.uniform(0.97, 1.03, n)).tolist()
+    bank_id = rng.integers(1, banks + 1, n).tolist()
+    start, maturity = _dates(rng, n)
+    return [
+        {
+            "id": i + 1,
+            "currency": currency[i],
+            "nominal": nominal[i],
+            "start_date": start[i],
+            "maturity_date": maturity[i],
+            "spot_rate": float(spot[i]),
+            "forward_rate": forward[i],
+            "bank_id": bank_id[i],
+        }
+        for i in range(n)
+    ]
+
+
+def generate_loans(n: int, seed: int = 1) -> List[Dict]:
+    """
+    Prêts synthétiques au format de la table loans (sans échéancier).
+
+    Args:
+        n: Nombre de prêts
+        seed: Graine du générateur
+
+    Returns:
+        List[Dict]: Lignes de prêts, identifiants 1..n
+    """
+    rng = np.random.default_rng(seed)
+    currencies = list(BASE_RATES)
+    currency = rng.choice(currencies, n).tolist()
+    nominal = rng.uniform(1e5, 2e7, n).round(2).tolist()
+    rate = rng.uniform(0.5, 8.0, n).round(3).tolist()
+    frequency = rng.choice(FREQUENCIES, n).tolist()
+    start, maturity = _dates(rng, n)
+    return [
+        {
+            "id": i + 1,
+            "currency": currency[i],
+            "nominal": nominal[i],
+            "rate": rate[i],
+            "start_date": start[i],
+            "maturity_date": maturity[i],
+            "payment_frequency": frequency[i],
+            "conversion_rate": 1 / BASE_RATES[currency[i]],
+        }
+        for i in range(n)
+    ]
+
+
+def generate_banks(n: int = 10) -> List[Dict]:
+    return [{"id": i + 1, "name": f"Banque {i + 1}"} for i in range(n)]
+
+
+def split_deals(deals: int) -> Dict[str, int]:
+    """Répartition d'un nombre total de deals entre swaps et prêts (moitié-moitié)."""
+    return {"swaps": deals - deals // 2, "loans": deals // 2}
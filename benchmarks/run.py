@@ -0,0 +1,274 @@
+"""
+Benchmarks hors ligne de l'API, sans Supabase ni Yahoo Finance.
+
+Usage :
+    python -m benchmarks.run --sizes 100,1000,10000 --output bench_results.json
+    python -m benchmarks.run --sizes 1000000 --repeats 1
+    python -m benchmarks.run --compare bench_results.json
+
+Les résultats (min, médiane, moyenne, max en millisecondes par benchmark et
+par taille de portefeuille) sont écrits en JSON pour suivre les régressions
+d'une version à l'autre.
+"""
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks import fakes
+from benchmarks.portfolio import generate_banks, generate_loans, generate_swaps, split_deals
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmarks hors ligne de l'API trésorerie")
+    parser.add_argument("--sizes", default="100,1000,10000,100000", help="Tailles de portefeuille (nombre total de deals)")
+    parser.add_argument("--repeats", type=int, default=5, help="Répétitions par benchmark")
+    parser.add_argument("--output", default="bench_results.json", help="Fichier JSON de résultats")
+    parser.add_argument("--compare", help="Fichier de résultats de référence à comparer")
+    parser.add_argument("--only", help="Benchmarks à exécuter, séparés par des virgules")
+    parser.add_argument("--supabase-latency", type=float, default=0.0, help="Latence simulée par requête Supabase (s)")
+    parser.add_argument("--yfinance-latency", type=float, default=0.0, help="Latence simulée par téléchargement Yahoo Finance (s)")
+    return parser.parse_args()
+
+
+async def asgi_request(app, method: str, path: str, query: str = "", body=None) -> Tuple[int, bytes, float]:
+    """
+    Envoie une requête HTTP directement à l'application ASGI, sans réseau.
+
+    Returns:
+        Tuple: (statut, corps, durée jusqu'au dernier octet de la réponse en secondes)
+    """
+    payload = json.dumps(body).encode() if body is not None else b""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"benchmark"), (b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())],
+        "client": ("127.0.0.1", 0),
+        "server": ("benchmark", 80),
+    }
+    request_sent = False
+    response = {"status": 0, "body": bytearray(), "done": None}
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        # Pas de déconnexion : le client attend la fin de la réponse
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+            if not message.get("more_body") and response["done"] is None:
+                response["done"] = time.perf_counter()
+
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    return response["status"], bytes(response["body"]), (response["done"] or time.perf_counter()) - start
+
+
+def summarize(name: str, deals: int, timings: List[float]) -> Dict:
+    return {
+        "benchmark": name,
+        "deals": deals,
+        "repeats": len(timings),
+        "min_ms": min(timings) * 1000,
+        "median_ms": statistics.median(timings) * 1000,
+        "mean_ms": statistics.fmean(timings) * 1000,
+        "max_ms": max(timings) * 1000,
+    }
+
+
+class Elapsed(float):
+    """Durée mesurée par le benchmark lui-même (ex. jusqu'au dernier octet HTTP)."""
+
+
+async def measure(func: Callable, repeats: int) -> List[float]:
+    """Exécute func (synchrone ou coroutine) et renvoie les durées ; func peut renvoyer sa propre durée (Elapsed)."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        if asyncio.iscoroutine(result):
+            result = await result
+        elapsed = time.perf_counter() - start
+        timings.append(result if isinstance(result, Elapsed) else elapsed)
+    return timings
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+async def run(args: argparse.Namespace, client: fakes.FakeSupabase) -> List[Dict]:
+    from app.main import app
+    from app.aggregates import kpi_aggregates
+    from app.export import pyarrow_available
+    from app.snapshot import run_snapshot
+    from app.replica import book_replica
+    from app.response_cache import response_cache
+    from app.utils import calculate_loan_characteristics, calculate_loans_characteristics, calculate_var
+
+    selected = set(args.only.split(",")) if args.only else None
+    results = []
+
+    async def bench(name: str, deals: int, func: Callable, repeats: Optional[int] = None):
+        if selected and name not in selected:
+            return
+        timings = await measure(func, repeats or args.repeats)
+        results.append(summarize(name, deals, timings))
+        print(f"{name:<34} {deals:>9} deals  médiane {results[-1]['median_ms']:>10.2f} ms", flush=True)
+
+    async def http(method: str, path: str, query: str = "", body=None) -> Elapsed:
+        status, _, elapsed = await asgi_request(app, method, path, query, body)
+        if status >= 400:
+            raise RuntimeError(f"{method} {path}?{query} -> {status}")
+        return Elapsed(elapsed)
+
+    async def uncached(path: str, query: str = "") -> Elapsed:
+        # Mesure du calcul : le résultat mis en cache par l'appel précédent est écarté
+        response_cache.clear()
+        return await http("GET", path, query)
+
+    for size in [int(s) for s in args.sizes.split(",")]:
+        counts = split_deals(size)
+        swaps = generate_swaps(counts["swaps"])
+        loans = generate_loans(counts["loans"])
+        for loan, calculated in zip(loans, calculate_loans_characteristics(loans)):
+            loan.update(calculated)
+        client.load("swaps", swaps)
+        client.load("loans", loans)
+        client.load("banks", generate_banks())
+        client.load("deal_kpi_history", [])
+        kpi_aggregates.loaded = False
+
+        selection = "&".join(f"deal_ids={i}" for i in range(1, min(size, 200), 2))
+
+        async def cold_dashboard():
+            kpi_aggregates.loaded = False
+            return await uncached("/kpi/dashboard")
+
+        async def concurrent_dashboards(viewers: int = 12):
+            # Ouvertures simultanées du même dashboard : un seul calcul partagé
+            response_cache.clear()
+            await asyncio.gather(*(http("GET", "/kpi/dashboard", selection) for _ in range(viewers)))
+
+        await bench("dashboard_cold", size, cold_dashboard)
+        await bench("dashboard", size, lambda: uncached("/kpi/dashboard"))
+        await bench("dashboard_filtered", size, lambda: uncached("/kpi/dashboard", selection))
+        await bench("dashboard_filtered_concurrent", size, concurrent_dashboards)
+        await bench("kpi_snapshot", size, run_snapshot)
+        await bench("kpi_var", size, lambda: http("GET", "/kpi/var", "confidence=0.99"))
+        stress_grid = {"grids": [{"target": "both"}, {"target": "spot", "per_currency": True}], "historical": ["covid_2020"]}
+        await bench("kpi_stress", size, lambda: http("POST", "/kpi/stress", body=stress_grid))
+        await bench("kpi_export_csv", size, lambda: http("GET", "/kpi/export"))
+        if pyarrow_available():
+            await bench("kpi_export_arrow", size, lambda: http("GET", "/kpi/export", "format=arrow"))
+            await bench("kpi_export_parquet", size, lambda: http("GET", "/kpi/export", "format=parquet"))
+        await bench("kpi_ladder", size, lambda: uncached("/kpi/ladder"))
+        await bench("get_swaps", size, lambda: http("GET", "/swaps"))
+        await bench("get_loans", size, lambda: http("GET", "/loans"))
+        await bench("get_swaps_page", size, lambda: http("GET", "/swaps", "limit=100"))
+        await bench("stream_swaps", size, lambda: http("GET", "/swaps", "format=ndjson"))
+        await bench("stream_loans", size, lambda: http("GET", "/loans", "format=ndjson"))
+
+        # Mêmes lectures servies par la réplique en mémoire
+        if not selected or selected & {"replica_load", "dashboard_filtered_replica", "kpi_var_replica", "stream_swaps_replica"}:
+            await bench("replica_load", size, book_replica.load, repeats=1)
+            await bench("dashboard_filtered_replica", size, lambda: uncached("/kpi/dashboard", selection))
+            await bench("kpi_var_replica", size, lambda: http("GET", "/kpi/var", "confidence=0.99"))
+            await bench("stream_swaps_replica", size, lambda: http("GET", "/swaps", "format=ndjson"))
+            book_replica.loaded = False
+
+        loan_inputs = [
+            {k: loan[k] for k in ("currency", "nominal", "rate", "start_date", "maturity_date", "payment_frequency", "conversion_rate")}
+            for loan in loans
+        ]
+        await bench("calculate_loan_characteristics", len(loan_inputs), lambda: [calculate_loan_characteristics(**loan) for loan in loan_inputs])
+        await bench("calculate_loans_characteristics", len(loan_inputs), lambda: calculate_loans_characteristics(loan_inputs))
+        mtm_values = [swap["nominal"] * 0.01 for swap in swaps]
+        await bench("calculate_var", len(mtm_values), lambda: calculate_var(mtm_values))
+
+        swap_body = {k: swaps[0][k] for k in ("currency", "nominal", "start_date", "maturity_date", "spot_rate", "forward_rate", "bank_id")}
+        loan_body = loan_inputs[0] if loan_inputs else None
+        created: Dict[str, List[int]] = {"swaps": [], "loans": []}
+
+        async def create(table: str, body: Dict) -> Elapsed:
+            status, payload, elapsed = await asgi_request(app, "POST", f"/{table}", body=body)
+            created[table].append(json.loads(payload)["id"])
+            return Elapsed(elapsed)
+
+        await bench("create_swap", size, lambda: create("swaps", swap_body))
+        await bench("update_swap", size, lambda: http("PUT", f"/swaps/{created['swaps'][0]}", body=swap_body))
+        await bench("delete_swap", size, lambda: http("DELETE", f"/swaps/{created['swaps'].pop()}"))
+        swap_batch = [{k: swap[k] for k in swap_body} for swap in swaps[:1000]]
+        await bench("create_swaps_batch", len(swap_batch), lambda: http("POST", "/swaps/batch", body=swap_batch), repeats=1)
+        if loan_body:
+            await bench("create_loan", size, lambda: create("loans", loan_body))
+            await bench("update_loan", size, lambda: http("PUT", f"/loans/{created['loans'][0]}", body=loan_body))
+            await bench("delete_loan", size, lambda: http("DELETE", f"/loans/{created['loans'].pop()}"))
+            batch = loan_inputs[:1000]
+            await bench("create_loans_batch", len(batch), lambda: http("POST", "/loans/batch", body=batch), repeats=1)
+
+    return results
+
+
+def compare(results: List[Dict], reference_path: str) -> None:
+    with open(reference_path) as f:
+        reference = {(r["benchmark"], r["deals"]): r for r in json.load(f)["results"]}
+    print(f"\n{'benchmark':<34} {'deals':>9} {'référence':>12} {'actuel':>12} {'ratio':>7}")
+    for result in results:
+        ref = reference.get((result["benchmark"], result["deals"]))
+        if ref:
+            ratio = result["median_ms"] / ref["median_ms"] if ref["median_ms"] else float("inf")
+            print(f"{result['benchmark']:<34} {result['deals']:>9} {ref['median_ms']:>10.2f}ms {result['median_ms']:>10.2f}ms {ratio:>6.2f}x")
+
+
+def main() -> None:
+    args = parse_args()
+    os.environ.setdefault("RATE_STORE_PATH", os.path.join(tempfile.mkdtemp(prefix="bench-rates-"), "fx_rates.sqlite"))
+    client, _ = fakes.install(args.supabase_latency, args.yfinance_latency)
+
+    results = asyncio.run(run(args, client))
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "git_commit": git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "sizes": args.sizes,
+            "repeats": args.repeats,
+            "supabase_latency": args.supabase_latency,
+            "yfinance_latency": args.yfinance_latency,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nRésultats écrits dans {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
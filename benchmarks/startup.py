@@ -0,0 +1,115 @@
+"""
+Benchmark du démarrage à froid de l'API.
+
+Chaque mesure lance un interpréteur neuf qui importe app.main, exécute le
+lifespan de démarrage puis sert une première requête, comme un conteneur
+qui vient d'être créé par l'autoscaling.
+
+Usage :
+    python -m benchmarks.startup --repeats 10 --output startup_results.json
+    python -m benchmarks.startup --compare startup_results.json
+    python -m benchmarks.startup --fakes  # sans les paquets supabase/yfinance réels
+
+Sans --fakes, les vrais paquets sont importés (aucun appel réseau n'est fait :
+le client Supabase est créé avec une URL locale fictive).
+"""
+from datetime import datetime
+from typing import Dict, List
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from benchmarks.run import asgi_request, compare, git_commit, summarize
+
+STAGES = ("import", "startup", "first_request", "total")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark du démarrage à froid de l'API trésorerie")
+    parser.add_argument("--repeats", type=int, default=10, help="Nombre de démarrages mesurés")
+    parser.add_argument("--output", default="startup_results.json", help="Fichier JSON de résultats")
+    parser.add_argument("--compare", help="Fichier de résultats de référence à comparer")
+    parser.add_argument("--fakes", action="store_true", help="Utiliser les doublures Supabase et yfinance")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+async def cold_start() -> Dict[str, float]:
+    """Importe l'application, exécute son démarrage et sert une requête (durées en secondes)."""
+    start = time.perf_counter()
+    from app.main import app
+    imported = time.perf_counter()
+
+    lifespan = app.router.lifespan_context(app)
+    await lifespan.__aenter__()
+    started = time.perf_counter()
+
+    status, _, _ = await asgi_request(app, "GET", "/test-cors")
+    served = time.perf_counter()
+    await lifespan.__aexit__(None, None, None)
+    if status != 200:
+        raise RuntimeError(f"GET /test-cors -> {status}")
+    return {
+        "import": imported - start,
+        "startup": started - imported,
+        "first_request": served - started,
+        "total": served - start,
+    }
+
+
+def child(use_fakes: bool) -> None:
+    if use_fakes:
+        from benchmarks import fakes
+        fakes.install()
+    print(json.dumps(asyncio.run(cold_start())))
+
+
+def main() -> None:
+    args = parse_args()
+    if args.child:
+        child(args.fakes)
+        return
+
+    env = {
+        **os.environ,
+        "SUPABASE_URL": os.environ.get("SUPABASE_URL", "http://127.0.0.1:54321"),
+        "SUPABASE_KEY": os.environ.get("SUPABASE_KEY", "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.benchmark"),
+        "WARMUP_CURRENCIES": "",
+        "KPI_SNAPSHOT_INTERVAL": "0",
+    }
+    command = [sys.executable, "-m", "benchmarks.startup", "--child"] + (["--fakes"] if args.fakes else [])
+    timings: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+    for _ in range(args.repeats):
+        output = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout
+        measure = json.loads(output.strip().splitlines()[-1])
+        for stage in STAGES:
+            timings[stage].append(measure[stage])
+
+    results = [summarize(f"cold_start_{stage}", 0, timings[stage]) for stage in STAGES]
+    for result in results:
+        print(f"{result['benchmark']:<34} médiane {result['median_ms']:>10.2f} ms")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "git_commit": git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "repeats": args.repeats,
+            "fakes": args.fakes,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nRésultats écrits dans {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+-- Tables et contraintes d'unicité des snapshots KPI (app/snapshot.py, app/rollups.py).
+-- Les écritures sont des upserts : sans ces index uniques, PostgREST refuse on_conflict.
+-- À exécuter une fois sur la base Supabase (éditeur SQL ou psql) ; idempotent.
+
+-- Historique par deal : une ligne par deal et par jour. Les identifiants des swaps
+-- et des prêts proviennent de deux séquences distinctes, d'où deal_type dans la clé.
+create table if not exists deal_kpi_history (
+    id bigint generated by default as identity primary key,
+    deal_id bigint not null,
+    date date not null,
+    mtm_eur double precision,
+    var_5 double precision,
+    stress_mtm double precision,
+    exposure double precision,
+    maturity_weighted double precision
+);
+
+alter table deal_kpi_history add column if not exists deal_type text;
+-- Lignes antérieures à deal_type : swaps et prêts mélangés, impossibles à distinguer.
+-- Elles sont conservées sous 'unknown' ; un backfill --force reconstruit la période.
+update deal_kpi_history set deal_type = 'unknown' where deal_type is null;
+alter table deal_kpi_history alter column deal_type set not null;
+
+-- L'ancien dashboard insérait une ligne par appel : seule la dernière du jour est gardée
+delete from deal_kpi_history h
+using deal_kpi_history newer
+where h.deal_id = newer.deal_id and h.deal_type = newer.deal_type
+  and h.date = newer.date and h.id < newer.id;
+
+create unique index if not exists deal_kpi_history_deal_date_key
+    on deal_kpi_history (deal_id, deal_type, date);
+create index if not exists deal_kpi_history_date_idx on deal_kpi_history (date);
+
+-- Rollups par période (day, week, month), portefeuille (type de deal) et devise
+create table if not exists kpi_rollups (
+    id bigint generated by default as identity primary key,
+    period text not null,
+    bucket date not null,
+    as_of date not null,
+    portfolio text not null,
+    currency text not null,
+    mtm_eur double precision,
+    var_5 double precision,
+    stress_mtm double precision,
+    exposure double precision,
+    exposure_days double precision,
+    deal_count integer
+);
+
+create unique index if not exists kpi_rollups_period_bucket_key
+    on kpi_rollups (period, bucket, portfolio, currency);
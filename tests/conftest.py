@@ -0,0 +1,39 @@
+import os
+import tempfile
+import pytest
+from benchmarks import fakes
+
+# Doublures Supabase et yfinance enregistrées avant tout import du package app
+os.environ.setdefault("RATE_STORE_PATH", os.path.join(tempfile.mkdtemp(prefix="test-rates-"), "fx_rates.sqlite"))
+supabase, yfinance = fakes.install()
+
+
+@pytest.fixture
+def fake_supabase():
+    """Client Supabase factice vidé, avec les caches de l'application remis à zéro."""
+    from app.aggregates import kpi_aggregates
+    from app.replica import book_replica
+    from app.response_cache import response_cache
+
+    supabase.tables.clear()
+    supabase.load("banks", [])
+    supabase.load("swaps", [])
+    supabase.load("loans", [])
+    supabase.calls = 0
+    response_cache.clear()
+    kpi_aggregates.loaded = False
+    yield supabase
+    for replica in book_replica.tables.values():
+        replica.clear()
+    book_replica.loaded = False
+    response_cache.clear()
+    kpi_aggregates.loaded = False
+
+
+@pytest.fixture
+def api(fake_supabase):
+    """Client HTTP de l'application, sans le lifespan (pas de warm-up ni de tâches de fond)."""
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    return TestClient(app)
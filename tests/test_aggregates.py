@@ -0,0 +1,60 @@
+import pytest
+from app.aggregates import CurrencyBuckets, KpiAggregates
+from app.valuation import LOAN, SWAP, load_book
+from tests.test_valuation import SPOTS, TODAY, baseline_loan, baseline_swap, random_deals
+
+
+def test_currency_buckets_match_baseline_dashboard_totals():
+    swaps, loans = random_deals(4)
+    buckets = CurrencyBuckets.from_book(load_book(swaps, loans))
+    buckets.value(SPOTS, TODAY)
+    summary = buckets.summary()
+
+    deals = [baseline_swap(s, TODAY) for s in swaps] + [baseline_loan(l, TODAY) for l in loans]
+    total_nominal = sum(d["nominal_eur"] for d in deals)
+    weighted_days = sum(d["remaining_days"] * d["nominal_eur"] for d in deals)
+    by_currency = {}
+    for row, deal in zip(swaps + loans, deals):
+        currency = row["currency"].upper()
+        by_currency[currency] = by_currency.get(currency, 0.0) + deal["mtm"]
+
+    assert summary["mtm_summary"]["total_mtm_eur"] == pytest.approx(sum(d["mtm"] for d in deals), rel=1e-9)
+    assert summary["mtm_summary"]["by_currency"] == pytest.approx(by_currency, rel=1e-9)
+    assert summary["stress_test"]["up_5_percent"] == pytest.approx(sum(d["stress_up"] for d in deals), rel=1e-9)
+    assert summary["stress_test"]["down_5_percent"] == pytest.approx(sum(d["stress_down"] for d in deals), rel=1e-9)
+    assert summary["weighted_maturity"]["total_nominal_eur"] == pytest.approx(total_nominal, rel=1e-9)
+    assert summary["weighted_maturity"]["days"] == pytest.approx(weighted_days / total_nominal, rel=1e-9)
+
+
+def test_incremental_aggregates_match_full_recompute():
+    swaps, loans = random_deals(5)
+    aggregates = KpiAggregates()
+    aggregates.reconcile(swaps[:200], loans[:200])
+    for swap in swaps[200:]:
+        aggregates.upsert_deal(SWAP, swap)
+    for loan in loans[200:]:
+        aggregates.upsert_deal(LOAN, loan)
+    for swap in swaps[:50]:
+        aggregates.remove_deal(SWAP, swap["id"])
+
+    incremental = aggregates.buckets(SPOTS, TODAY).summary()
+    full = CurrencyBuckets.from_book(load_book(swaps[50:], loans))
+    full.value(SPOTS, TODAY)
+    expected = full.summary()
+    assert incremental["mtm_summary"]["total_mtm_eur"] == pytest.approx(expected["mtm_summary"]["total_mtm_eur"], rel=1e-9)
+    assert incremental["exposure_by_currency"] == pytest.approx(expected["exposure_by_currency"], rel=1e-9)
+    assert aggregates.reconcile(swaps[50:], loans) < 1e-9
+
+
+def test_reconcile_replays_writes_made_while_reading():
+    swaps, loans = random_deals(6, n_swaps=10, n_loans=10)
+    aggregates = KpiAggregates()
+    aggregates.reconcile(swaps[:5], loans)
+    with aggregates.tracking():
+        stale_read = list(swaps[:5])
+        aggregates.upsert_deal(SWAP, swaps[5])
+        aggregates.remove_deal(SWAP, swaps[0]["id"])
+        aggregates.reconcile(stale_read, loans)
+
+    assert aggregates.deal_count() == 5 + len(loans)
+    assert aggregates.reconcile(swaps[1:6], loans) < 1e-9
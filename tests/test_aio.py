@@ -0,0 +1,48 @@
+import asyncio
+import threading
+import pytest
+from app.aio import IO_CONCURRENCY, run_io
+
+
+def test_run_io_works_across_event_loops():
+    for _ in range(3):
+        assert asyncio.run(run_io(sum, [1, 2, 3])) == 6
+
+
+def test_calls_finishing_after_their_loop_closed_free_their_slots():
+    release = threading.Event()
+    finished = []
+
+    def slow():
+        release.wait(5)
+        finished.append(1)
+
+    async def abandon():
+        await asyncio.gather(*(run_io(slow, timeout=0.01) for _ in range(IO_CONCURRENCY)), return_exceptions=True)
+
+    asyncio.run(abandon())
+    release.set()
+    while len(finished) < IO_CONCURRENCY:
+        threading.Event().wait(0.01)
+    # Aucune place perdue : la boucle suivante dispose de toute la concurrence
+    assert asyncio.run(asyncio.wait_for(run_io(sum, [1]), 1)) == 1
+
+
+def test_concurrency_is_bounded():
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def call():
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        threading.Event().wait(0.01)
+        with lock:
+            running.pop()
+
+    async def main():
+        await asyncio.gather(*(run_io(call) for _ in range(IO_CONCURRENCY * 3)))
+
+    asyncio.run(main())
+    assert max(peak) <= IO_CONCURRENCY
@@ -0,0 +1,60 @@
+import pytest
+from app.fx import RateMatrix
+
+RATES = {"EURUSD=X": 1.08, "EURGBP=X": 0.85, "EURJPY=X": 160.0, "EURCHF=X": 0.95}
+
+
+class RecordingFetch:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, pairs):
+        self.calls.append(sorted(pairs))
+        return {p: RATES[p] for p in pairs if p in RATES}
+
+
+def test_snapshot_is_served_until_ttl_and_triangulated():
+    fetch = RecordingFetch()
+    matrix = RateMatrix(fetch, pivot="EUR", ttl=60)
+    snapshot = matrix.snapshot(["USD", "GBP"])
+    assert matrix.snapshot(["USD", "EUR"]) is snapshot
+    assert len(fetch.calls) == 1
+    assert snapshot.rate("USD", "GBP") == pytest.approx(0.85 / 1.08)
+
+
+def test_refresh_carries_at_most_maxsize_recent_currencies():
+    fetch = RecordingFetch()
+    matrix = RateMatrix(fetch, pivot="EUR", ttl=60, maxsize=2)
+    matrix.snapshot(["USD"])
+    matrix.snapshot(["GBP"])
+    matrix.snapshot(["JPY"])
+    matrix.snapshot(["CHF"])
+    # Les devises demandées d'abord, puis les plus récentes, sans dépasser maxsize
+    assert fetch.calls[-1] == ["EURCHF=X", "EURJPY=X"]
+    assert all(len(call) <= 2 for call in fetch.calls)
+
+
+def test_unquoted_currency_is_not_downloaded_again_within_failure_ttl():
+    fetch = RecordingFetch()
+    matrix = RateMatrix(fetch, pivot="EUR", ttl=60, failure_ttl=60)
+    with pytest.raises(ValueError, match="EURXXX=X"):
+        matrix.snapshot(["USD", "XXX"])
+    calls = len(fetch.calls)
+
+    with pytest.raises(ValueError, match="EURXXX=X"):
+        matrix.snapshot(["XXX"])
+    # Les devises cotées du même téléchargement restent servies
+    assert matrix.snapshot(["USD"]).rate("EUR", "USD") == pytest.approx(1.08)
+    assert len(fetch.calls) == calls
+
+    matrix.snapshot(["GBP"])
+    assert "EURXXX=X" not in fetch.calls[-1]
+
+
+def test_failed_currency_is_retried_after_failure_ttl():
+    fetch = RecordingFetch()
+    matrix = RateMatrix(fetch, pivot="EUR", ttl=60, failure_ttl=0)
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            matrix.snapshot(["XXX"])
+    assert len(fetch.calls) == 2
@@ -0,0 +1,49 @@
+from datetime import date
+import numpy as np
+import pytest
+from app.ladder import LADDER_EDGES, maturity_ladder
+from app.valuation import load_book, value_book
+from benchmarks.portfolio import generate_swaps
+from tests.test_valuation import SPOTS, TODAY, random_deals
+
+
+def test_ladder_matches_per_deal_bucketing():
+    swaps, loans = random_deals(9)
+    book = load_book(swaps, loans)
+    valuation = value_book(book, SPOTS, TODAY)
+    ladder = maturity_ladder(book, valuation, TODAY)
+
+    remaining = valuation.remaining_days
+    edges = list(LADDER_EDGES) + [np.inf]
+    running = 0.0
+    for bucket, low, high in zip(ladder["buckets"], edges, edges[1:]):
+        selected = (remaining >= low) & (remaining < high)
+        running += valuation.nominal_eur[selected].sum()
+        assert bucket["deal_count"] == selected.sum()
+        assert bucket["exposure_eur"] == pytest.approx(valuation.nominal_eur[selected].sum(), rel=1e-9)
+        assert bucket["mtm_eur"] == pytest.approx(valuation.mtm[selected].sum(), rel=1e-9)
+        assert bucket["stress_mtm_eur"] == pytest.approx(valuation.stress_up[selected].sum(), rel=1e-9)
+        assert bucket["cumulative_exposure_eur"] == pytest.approx(running, rel=1e-9)
+    assert ladder["matured_deal_count"] == (remaining < 0).sum()
+    assert [bucket["bucket"] for bucket in ladder["buckets"]] == ["0-1m", "1m-3m", "3m-1y", "1y+"]
+
+
+def test_index_select_matches_a_filter_on_dates():
+    swaps, loans = random_deals(10)
+    book = load_book(swaps, loans)
+    start_from, maturity_to = date(2025, 1, 1), date(2027, 6, 30)
+    expected = [
+        i for i, deal in enumerate(swaps + loans)
+        if deal["start_date"] >= start_from.isoformat() and deal["maturity_date"] <= maturity_to.isoformat()
+    ]
+    assert book.index.select(start_from=start_from, maturity_to=maturity_to).tolist() == expected
+
+
+def test_ladder_route_with_custom_edges(api, fake_supabase):
+    fake_supabase.load("swaps", generate_swaps(40))
+    response = api.get("/kpi/ladder", params=[("edges", 182), ("edges", 730)])
+    assert response.status_code == 200
+    ladder = response.json()
+    assert [bucket["bucket"] for bucket in ladder["buckets"]] == ["0-6m", "6m-2y", "2y+"]
+    assert sum(bucket["deal_count"] for bucket in ladder["buckets"]) + ladder["matured_deal_count"] == 40
+    assert api.get("/kpi/ladder", params={"edges": -1}).status_code == 400
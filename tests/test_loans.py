@@ -0,0 +1,74 @@
+from datetime import date, datetime, timedelta
+import numpy as np
+from app.utils import calculate_loans_characteristics
+
+FREQUENCIES = ["in_fine", "1 mois", "3 mois", "6 mois", "12 mois"]
+
+
+def baseline_loan_characteristics(currency, nominal, rate, start_date, maturity_date, payment_frequency, conversion_rate):
+    """Calcul historique, prêt par prêt, de calculate_loan_characteristics."""
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    maturity = datetime.strptime(maturity_date, "%Y-%m-%d")
+    num_days = (maturity - start).days
+    total_interest = nominal * rate * num_days / 36000
+    nominal_eur = nominal * conversion_rate
+
+    schedule = []
+    if payment_frequency == "in_fine":
+        schedule.append({
+            "date": maturity_date,
+            "principal_payment": nominal,
+            "interest_payment": round(total_interest, 2)
+        })
+    else:
+        months = {"1 mois": 1, "3 mois": 3, "6 mois": 6, "12 mois": 12}.get(payment_frequency, 12)
+        total_months = (maturity.year - start.year) * 12 + (maturity.month - start.month)
+        num_payments = max(total_months // months, 1)
+        principal_payment = nominal / num_payments
+        interest_payment = total_interest / num_payments
+        for i in range(num_payments):
+            payment_month = (start.month + months * i - 1) % 12 + 1
+            payment_year = start.year + (start.month + months * i - 1) // 12
+            payment_date = start.replace(day=1).replace(year=payment_year, month=payment_month)
+            schedule.append({
+                "date": payment_date.strftime("%Y-%m-%d"),
+                "principal_payment": round(principal_payment, 2),
+                "interest_payment": round(interest_payment, 2)
+            })
+
+    return {
+        "number_of_days": num_days,
+        "total_interest": round(total_interest, 2),
+        "nominal_in_eur": round(nominal_eur, 2),
+        "repayment_schedule": schedule
+    }
+
+
+def random_loans(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    loans = []
+    for _ in range(n):
+        start = date(2015, 1, 1) + timedelta(days=int(rng.integers(0, 4000)))
+        maturity = start + timedelta(days=int(rng.integers(0, 3650)))
+        loans.append({
+            "currency": "USD",
+            "nominal": round(float(rng.uniform(1e3, 1e8)), 2),
+            "rate": round(float(rng.uniform(0, 12)), 3),
+            "start_date": start.isoformat(),
+            "maturity_date": maturity.isoformat(),
+            "payment_frequency": FREQUENCIES[rng.integers(len(FREQUENCIES))],
+            "conversion_rate": float(rng.uniform(0.5, 1.5)),
+        })
+    return loans
+
+
+def test_vectorized_schedules_match_baseline():
+    loans = random_loans(3000)
+    results = calculate_loans_characteristics(loans)
+    assert len(results) == len(loans)
+    for loan, result in zip(loans, results):
+        assert result == baseline_loan_characteristics(**loan)
+
+
+def test_empty_batch():
+    assert calculate_loans_characteristics([]) == []
@@ -0,0 +1,29 @@
+import json
+from benchmarks.portfolio import generate_loans, generate_swaps
+
+
+def test_keyset_pages_cover_the_table_once(api, fake_supabase):
+    fake_supabase.load("swaps", generate_swaps(25))
+    ids, after = [], None
+    while True:
+        params = {"limit": 10, **({"after": after} if after is not None else {})}
+        response = api.get("/swaps", params=params)
+        ids += [row["id"] for row in response.json()]
+        after = response.headers.get("x-next-cursor")
+        if after is None:
+            break
+    assert ids == list(range(1, 26))
+    assert api.get("/swaps", params={"limit": 0}).status_code == 422
+
+
+def test_ndjson_streams_every_page_by_format_or_accept(api, fake_supabase):
+    fake_supabase.load("loans", generate_loans(10))
+    # En NDJSON, limit est la taille des pages lues : tout le reste de la table est diffusé
+    response = api.get("/loans", params={"format": "ndjson", "limit": 4})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in rows] == list(range(1, 11))
+    assert fake_supabase.calls == 3
+
+    accepted = api.get("/loans", headers={"Accept": "application/x-ndjson"}, params={"after": 6})
+    assert [json.loads(line)["id"] for line in accepted.text.splitlines()] == [7, 8, 9, 10]
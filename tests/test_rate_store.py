@@ -0,0 +1,10 @@
+from datetime import date
+import numpy as np
+from app.rate_store import RateStore
+
+
+def test_pivot_currency_is_one_on_every_date(tmp_path):
+    store = RateStore(str(tmp_path / "fx_rates.sqlite"))
+    days, closes = store.history("EUR", ["EUR"], date(2026, 3, 2), date(2026, 3, 8))
+    assert len(days) == 7
+    assert (closes == 1.0).all()
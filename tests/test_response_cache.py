@@ -0,0 +1,81 @@
+import asyncio
+import httpx
+from app.response_cache import ResponseCache
+from benchmarks.portfolio import generate_swaps
+
+SWAP_BODY = {"currency": "USD", "nominal": 1e6, "start_date": "2026-01-02", "maturity_date": "2027-01-04", "spot_rate": 1.08, "forward_rate": 1.1, "bank_id": 1}
+
+
+def test_list_is_cached_and_revalidated_with_its_etag(api, fake_supabase):
+    fake_supabase.load("swaps", generate_swaps(5))
+    first = api.get("/swaps")
+    calls = fake_supabase.calls
+    second = api.get("/swaps")
+    assert second.json() == first.json()
+    assert fake_supabase.calls == calls
+
+    revalidated = api.get("/swaps", headers={"If-None-Match": first.headers["etag"]})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == first.headers["etag"]
+    assert api.get("/swaps", headers={"If-Modified-Since": first.headers["last-modified"]}).status_code == 304
+
+
+def test_write_invalidates_the_cached_list(api, fake_supabase):
+    fake_supabase.load("swaps", generate_swaps(5))
+    before = api.get("/swaps")
+    created = api.post("/swaps", json=SWAP_BODY)
+    assert created.status_code == 200
+
+    after = api.get("/swaps", headers={"If-None-Match": before.headers["etag"]})
+    assert after.status_code == 200
+    assert [row["id"] for row in after.json()][-1] == created.json()["id"]
+    assert after.headers["etag"] != before.headers["etag"]
+
+
+def test_concurrent_loads_of_a_key_share_one_computation():
+    cache = ResponseCache(ttl=60)
+    loads = []
+
+    async def load():
+        loads.append(1)
+        await asyncio.sleep(0.01)
+        return b"[]", {}
+
+    async def main():
+        key = ("swaps", "/swaps", ())
+        entries = await asyncio.gather(*(cache.load(key, load) for _ in range(10)))
+        assert len({entry.etag for entry in entries}) == 1
+        assert len(loads) == 1
+        assert cache.get(key) is entries[0]
+
+        # Un chargement commencé avant une écriture n'est pas partagé avec les requêtes suivantes
+        first = asyncio.ensure_future(cache.load(key, load))
+        await asyncio.sleep(0)
+        cache.invalidate("swaps")
+        await asyncio.gather(first, cache.load(key, load))
+        assert len(loads) == 3
+
+    asyncio.run(main())
+
+
+def test_identical_dashboards_requested_together_are_computed_once(fake_supabase):
+    from app.main import app
+
+    fake_supabase.load("swaps", generate_swaps(50))
+    fake_supabase.load("loans", [])
+    fake_supabase.latency = 0.02
+    query = "&".join(f"deal_ids={i}" for i in range(1, 20))
+
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(client.get(f"/kpi/dashboard?{query}") for _ in range(8)))
+
+    try:
+        responses = asyncio.run(main())
+    finally:
+        fake_supabase.latency = 0.0
+    assert all(response.status_code == 200 for response in responses)
+    assert len({response.text for response in responses}) == 1
+    # Une lecture des swaps et une des prêts pour les huit requêtes
+    assert fake_supabase.calls == 2
@@ -0,0 +1,52 @@
+from datetime import date
+import numpy as np
+import pytest
+from app.rollups import FIELDS, nan_if_null, period_start, resample, rollup_rows
+from app.valuation import load_book, value_book
+from tests.test_valuation import SPOTS, TODAY, random_deals
+
+
+def test_period_start():
+    assert period_start(date(2026, 3, 5), "week") == date(2026, 3, 2)
+    assert period_start(date(2026, 3, 5), "month") == date(2026, 3, 1)
+    assert period_start(date(2026, 3, 5), "day") == date(2026, 3, 5)
+
+
+def test_rollup_rows_sum_per_deal_values():
+    swaps, loans = random_deals(8)
+    book = load_book(swaps, loans)
+    valuation = value_book(book, SPOTS, TODAY)
+    var_95 = np.abs(valuation.mtm) * 0.1
+    rows = [row for row in rollup_rows(book, valuation, var_95, TODAY) if row["period"] == "day"]
+
+    assert sum(row["deal_count"] for row in rows) == len(book)
+    assert sum(row["mtm_eur"] for row in rows) == pytest.approx(valuation.mtm.sum(), rel=1e-9)
+    assert sum(row["var_5"] for row in rows) == pytest.approx(-var_95.sum(), rel=1e-9)
+    assert sum(row["exposure"] for row in rows) == pytest.approx(valuation.nominal_eur.sum(), rel=1e-9)
+
+
+def test_resample_keeps_last_day_of_each_period():
+    days = np.array(["2026-03-02", "2026-03-03", "2026-03-03", "2026-03-09"], dtype="datetime64[D]")
+    values = np.zeros((4, len(FIELDS)))
+    values[:, FIELDS.index("mtm_eur")] = [1.0, 2.0, 3.0, 4.0]
+    values[:, FIELDS.index("deal_count")] = 1
+    weeks = np.array(["2026-03-02", "2026-03-02", "2026-03-02", "2026-03-09"], dtype="datetime64[D]")
+
+    series = resample(weeks, days, values)
+    assert [(point["date"], point["as_of"], point["mtm_eur"], point["deal_count"]) for point in series] == [
+        ("2026-03-02", "2026-03-03", 5.0, 2),
+        ("2026-03-09", "2026-03-09", 4.0, 1),
+    ]
+
+
+def test_resample_keeps_null_values_null():
+    days = np.array(["2026-03-02", "2026-03-02", "2026-03-03"], dtype="datetime64[D]")
+    values = np.array([
+        [1.0, nan_if_null(None), 2.0, 100.0, 1000.0, 1.0],
+        [1.0, -5.0, 2.0, 100.0, 1000.0, 1.0],
+        [1.0, -5.0, nan_if_null(None), 100.0, 1000.0, 1.0],
+    ])
+    series = resample(days, days, values)
+    assert series[0]["var_5"] is None and series[0]["stress_mtm"] == 4.0
+    assert series[1]["var_5"] == -5.0 and series[1]["stress_mtm"] is None
+    assert series[1]["maturity_weighted_days"] == 10.0
@@ -0,0 +1,41 @@
+import pytest
+from app import sql_repository
+from app.sql_repository import SqlRepository
+
+
+@pytest.fixture
+def repo():
+    repository = SqlRepository("sqlite://")
+    yield repository
+    repository.close()
+
+
+def test_insert_select_update_delete(repo):
+    rows = repo.insert("swaps", [
+        {"currency": "USD", "nominal": 1e6, "start_date": "2026-01-02", "maturity_date": "2026-06-30"},
+        {"currency": "GBP", "nominal": 2e6, "start_date": "2026-01-05", "maturity_date": "2027-01-05"},
+    ])
+    assert [row["id"] for row in rows] == [1, 2]
+    assert rows[0]["maturity_date"] == "2026-06-30"
+
+    selected = repo.select("swaps", "id,currency", [("maturity_date", "lte", "2026-12-31"), ("currency", "in", ["USD", "GBP"])])
+    assert selected == [{"id": 1, "currency": "USD"}]
+    assert repo.update("swaps", 2, {"nominal": 3e6})[0]["nominal"] == 3e6
+    assert repo.delete("swaps", 1)[0]["id"] == 1
+    assert [row["id"] for row in repo.select("swaps", "id")] == [2]
+    with pytest.raises(ValueError):
+        repo.select("unknown")
+
+
+def test_upsert_updates_on_the_conflict_columns(repo):
+    row = {"deal_id": 7, "deal_type": "swap", "date": "2026-03-02", "mtm_eur": 1.0}
+    repo.upsert("deal_kpi_history", [row], "deal_id,deal_type,date")
+    repo.upsert("deal_kpi_history", [{**row, "mtm_eur": 2.0}, {**row, "deal_type": "loan"}], "deal_id,deal_type,date")
+    history = repo.select("deal_kpi_history", "deal_type,mtm_eur", order_by="id")
+    assert history == [{"deal_type": "swap", "mtm_eur": 2.0}, {"deal_type": "loan", "mtm_eur": 1.0}]
+
+
+def test_dialect_without_upsert_is_rejected_when_built(monkeypatch):
+    monkeypatch.delitem(sql_repository._UPSERT_INSERTS, "sqlite")
+    with pytest.raises(RuntimeError, match="Upsert non supporté pour sqlite"):
+        SqlRepository("sqlite://")
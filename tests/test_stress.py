@@ -0,0 +1,77 @@
+from datetime import date
+import numpy as np
+import pytest
+from app.aggregates import N_FIELDS, CurrencyBuckets
+from app.schemes import StressGrid, StressScenario
+from app.stress import STRESS_MAX_SCENARIOS, ScenarioSet, stress_report
+from app.valuation import load_book, value_book
+from tests.test_valuation import SPOTS, TODAY, random_deals
+
+
+def test_stress_report_matches_per_deal_revaluation():
+    swaps, loans = random_deals(7)
+    book = load_book(swaps, loans)
+    buckets = CurrencyBuckets.from_book(book)
+    scenarios = ScenarioSet(buckets.currencies)
+    scenarios.add_scenario(StressScenario(name="choc", spot_shock=0.1, forward_shocks={"USD": -0.05}))
+    spot = np.array([SPOTS[c] for c in buckets.currencies])
+    report = stress_report(scenarios, buckets.sums, spot)
+
+    shocked_spots = {c: rate * 1.1 for c, rate in SPOTS.items()}
+    shocked = load_book(
+        [{**s, "forward_rate": s["forward_rate"] * (0.95 if s["currency"].upper() == "USD" else 1.0)} for s in swaps],
+        loans,
+    )
+    expected = value_book(shocked, shocked_spots, TODAY).mtm.sum()
+    base = value_book(book, SPOTS, TODAY).mtm.sum()
+    assert report["base_mtm_eur"] == pytest.approx(base, rel=1e-9)
+    assert report["scenarios"][0]["total_mtm_eur"] == pytest.approx(expected, rel=1e-9)
+
+
+def test_grid_size_and_names():
+    scenarios = ScenarioSet(["USD", "GBP"])
+    scenarios.add_grid(StressGrid(min=-0.3, max=0.3, step=0.01, per_currency=True))
+    assert len(scenarios) == 2 * 61
+    assert scenarios.names[0] == "spot USD -30.00%"
+    assert scenarios.names[-1] == "spot GBP +30.00%"
+    spot, forward = scenarios.shocks()
+    assert spot.shape == (122, 2) and not forward.any()
+
+
+def test_oversized_grid_is_rejected_before_allocation():
+    scenarios = ScenarioSet(["USD"])
+    with pytest.raises(ValueError):
+        # Pas hors des bornes du schéma : la taille est vérifiée avant np.arange
+        scenarios.add_grid(StressGrid.model_construct(min=-1.0, max=1.0, step=1e-9, target="spot", per_currency=False, currencies=None))
+    assert len(scenarios) == 0
+    with pytest.raises(ValueError):
+        StressGrid(step=1e-9)
+
+
+def test_explicit_scenarios_count_against_the_limit():
+    scenarios = ScenarioSet(["USD"])
+    scenarios.add_grid(StressGrid(min=0.0, max=(STRESS_MAX_SCENARIOS - 1) * 0.0001, step=0.0001))
+    assert len(scenarios) == STRESS_MAX_SCENARIOS
+    with pytest.raises(ValueError):
+        scenarios.add_scenario(StressScenario(name="en trop"))
+    with pytest.raises(ValueError):
+        scenarios.reserve(1)
+
+
+def test_historical_shock_uses_last_closes_on_or_before_start_and_end():
+    days = np.arange(np.datetime64("2020-02-14"), np.datetime64("2020-02-25"))
+    closes = np.full((len(days), 3), np.nan)
+    closes[:, 0] = np.linspace(1.0, 2.0, len(days))
+    # GBP : pas de clôture le jour du début, ni le dernier jour
+    closes[[0, 3, 5, 8], 1] = [0.80, 0.84, 0.90, 0.99]
+    scenarios = ScenarioSet(["USD", "GBP", "SEK"])
+    scenarios.add_historical("test", days, closes, date(2020, 2, 18), date(2020, 2, 24))
+
+    spot, forward = scenarios.shocks()
+    assert spot[0] == pytest.approx([closes[-1, 0] / closes[4, 0] - 1.0, 0.99 / 0.84 - 1.0, 0.0])
+    assert (forward == spot).all()
+    assert scenarios.missing["test"] == ["SEK"]
+
+    report = stress_report(scenarios, np.zeros((3, N_FIELDS)), np.ones(3))
+    assert report["scenarios"][0]["missing_currencies"] == ["SEK"]
+    assert report["missing_currencies"] == ["SEK"]
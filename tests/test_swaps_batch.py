@@ -0,0 +1,41 @@
+import pytest
+
+DERIVED = ("spot_value_eur", "forward_value_eur", "swap_points_eur", "mtm_eur", "total_days", "remaining_days")
+
+
+def swap_body(currency: str, nominal: float, forward_rate: float) -> dict:
+    return {
+        "currency": currency, "nominal": nominal, "start_date": "2026-01-02", "maturity_date": "2027-03-15",
+        "spot_rate": 1.05, "forward_rate": forward_rate, "bank_id": 1,
+    }
+
+
+def test_swap_batch_matches_single_bookings_and_reports_invalid_rows(api, fake_supabase, monkeypatch):
+    monkeypatch.setattr("app.routes.swaps.SWAPS_BATCH_SIZE", 2)
+    bodies = [swap_body("usd", 1e6, 1.1), swap_body("GBP", 2e6, 0.9), swap_body("JPY", 5e8, 158.0)]
+    response = api.post("/swaps/batch", json=[bodies[0], {"currency": "USD"}, *bodies[1:]])
+    result = response.json()
+    assert result["inserted"] == 3 and result["errors"] == 1
+    assert [r["status"] for r in result["results"]] == ["ok", "error", "ok", "ok"]
+    assert "nominal" in result["results"][1]["detail"]
+
+    for body, item in zip(bodies, [r for r in result["results"] if r["status"] == "ok"]):
+        single = api.post("/swaps", json=body).json()
+        batched = fake_supabase.tables["swaps"][item["id"]]
+        assert {f: batched[f] for f in DERIVED} == pytest.approx({f: single[f] for f in DERIVED})
+
+
+def test_swap_batch_failed_chunk_does_not_stop_the_import(api, fake_supabase, monkeypatch):
+    monkeypatch.setattr("app.routes.swaps.SWAPS_BATCH_SIZE", 1)
+    inserts = []
+
+    async def flaky_insert(table, rows):
+        inserts.append(rows)
+        if len(inserts) == 1:
+            raise RuntimeError("connexion perdue")
+        return [{**row, "id": len(inserts)} for row in rows]
+
+    monkeypatch.setattr("app.routes.swaps.insert_rows", flaky_insert)
+    result = api.post("/swaps/batch", json=[swap_body("USD", 1e6, 1.1), swap_body("USD", 2e6, 1.1)]).json()
+    assert [r["status"] for r in result["results"]] == ["error", "ok"]
+    assert "connexion perdue" in result["results"][0]["detail"]
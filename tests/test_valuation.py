@@ -0,0 +1,95 @@
+from datetime import date, timedelta
+import numpy as np
+import pytest
+from app.valuation import LOAN, SWAP, load_book, value_book
+
+TODAY = date(2026, 3, 2)
+SPOTS = {"USD": 1.08, "GBP": 0.86, "CHF": 0.95, "JPY": 162.3}
+
+
+def random_deals(seed: int, n_swaps: int = 400, n_loans: int = 400):
+    rng = np.random.default_rng(seed)
+    currencies = list(SPOTS)
+
+    def dates():
+        start = TODAY - timedelta(days=int(rng.integers(0, 900)))
+        return start.isoformat(), (start + timedelta(days=int(rng.integers(30, 1800)))).isoformat()
+
+    swaps, loans = [], []
+    for i in range(n_swaps):
+        start, maturity = dates()
+        currency = currencies[rng.integers(len(currencies))]
+        swaps.append({
+            "id": i + 1,
+            "currency": currency.lower() if i % 7 == 0 else currency,
+            "nominal": float(rng.uniform(1e4, 5e7)),
+            "start_date": start,
+            "maturity_date": maturity,
+            "spot_rate": SPOTS[currency],
+            "forward_rate": SPOTS[currency] * float(rng.uniform(0.95, 1.05)),
+            "bank_id": int(rng.integers(0, 5)),
+        })
+    for i in range(n_loans):
+        start, maturity = dates()
+        currency = currencies[rng.integers(len(currencies))]
+        loans.append({
+            "id": i + 1,
+            "currency": currency,
+            "nominal": float(rng.uniform(1e4, 5e7)),
+            "start_date": start,
+            "maturity_date": maturity,
+            "conversion_rate": 1 / SPOTS[currency] * float(rng.uniform(0.9, 1.1)),
+        })
+    return swaps, loans
+
+
+def baseline_swap(swap, today, variation=0.05):
+    """Arithmétique de la boucle historique du dashboard pour un swap."""
+    spot = SPOTS[swap["currency"].upper()]
+    return {
+        "mtm": (swap["forward_rate"] - spot) * swap["nominal"],
+        "stress_up": (swap["forward_rate"] * (1 + variation) - spot) * swap["nominal"],
+        "stress_down": (swap["forward_rate"] * (1 - variation) - spot) * swap["nominal"],
+        "nominal_eur": swap["nominal"] * spot,
+        "remaining_days": (date.fromisoformat(swap["maturity_date"]) - today).days,
+    }
+
+
+def baseline_loan(loan, today):
+    """Arithmétique de la boucle historique du dashboard pour un prêt."""
+    spot = SPOTS[loan["currency"].upper()]
+    return {
+        "mtm": (loan["nominal"] * spot) - (loan["nominal"] * loan["conversion_rate"]),
+        "stress_up": 0.0,
+        "stress_down": 0.0,
+        "nominal_eur": loan["nominal"] * loan["conversion_rate"],
+        "remaining_days": (date.fromisoformat(loan["maturity_date"]) - today).days,
+    }
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_value_book_matches_baseline_per_deal(seed):
+    swaps, loans = random_deals(seed)
+    book = load_book(swaps, loans)
+    valuation = value_book(book, SPOTS, TODAY)
+
+    expected = {(SWAP, s["id"]): baseline_swap(s, TODAY) for s in swaps}
+    expected.update({(LOAN, l["id"]): baseline_loan(l, TODAY) for l in loans})
+    assert len(book) == len(expected)
+    for position, key in enumerate(zip(book.kinds.tolist(), book.ids.tolist())):
+        deal = expected[key]
+        for field in ("mtm", "stress_up", "stress_down", "nominal_eur"):
+            assert getattr(valuation, field)[position] == pytest.approx(deal[field], rel=1e-12, abs=1e-6)
+        assert valuation.remaining_days[position] == deal["remaining_days"]
+
+
+def test_load_book_skips_incomplete_deals_and_keeps_bank_zero():
+    swaps, loans = random_deals(3, n_swaps=4, n_loans=2)
+    swaps[0]["bank_id"] = 0
+    swaps[1]["forward_rate"] = None
+    swaps[2].pop("bank_id")
+    loans[0]["conversion_rate"] = 0
+    book = load_book(swaps, loans)
+
+    assert book.ids.tolist() == [swaps[0]["id"], swaps[2]["id"], swaps[3]["id"], loans[1]["id"]]
+    assert book.bank_id[:2].tolist() == [0, -1]
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from app.var_engine import historical_var, scenario_returns
+
+
+def test_scenario_returns_fill_gaps_with_last_close():
+    closes = np.array([
+        [1.00, 2.0],
+        [np.nan, np.nan],
+        [1.10, np.nan],
+        [1.21, 2.2],
+    ])
+    returns = scenario_returns(closes)
+    assert returns == pytest.approx(np.array([[0.10, 0.0], [0.10, 0.10]]))
+    assert scenario_returns(closes, horizon=2) == pytest.approx(np.array([[0.21, 0.10]]))
+
+
+def test_historical_var_matches_per_scenario_loop():
+    rng = np.random.default_rng(0)
+    returns = rng.normal(0, 0.01, (500, 3))
+    positions = np.array([1e6, -5e5, 2e5])
+    result = historical_var(positions, returns, ["USD", "GBP", "CHF"], 0.99)
+
+    pnl = [sum(r * p for r, p in zip(row, positions)) for row in returns.tolist()]
+    assert result["scenarios"] == 500
+    assert result["var"] == pytest.approx(-np.quantile(pnl, 0.01))
+    assert result["missing_currencies"] == []
+
+
+def test_currency_without_history_is_excluded_not_riskless():
+    rng = np.random.default_rng(1)
+    closes = np.column_stack([np.cumprod(1 + rng.normal(0, 0.01, 300)), np.full(300, np.nan)])
+    returns = scenario_returns(closes)
+    assert np.isnan(returns[:, 1]).all()
+
+    result = historical_var(np.array([1e6, 1e9]), returns, ["USD", "GBP"], 0.95)
+    alone = historical_var(np.array([1e6]), returns[:, :1], ["USD"], 0.95)
+    assert result["missing_currencies"] == ["GBP"]
+    assert result["by_currency"]["GBP"] is None
+    assert result["var"] == pytest.approx(alone["var"])
+
+
+def test_pivot_currency_quoted_every_day_keeps_only_market_days():
+    closes = np.array([
+        [1.00, 1.0],
+        [np.nan, 1.0],
+        [1.10, 1.0],
+    ])
+    returns = scenario_returns(closes)
+    assert returns == pytest.approx(np.array([[0.10, 0.0]]))
+    result = historical_var(np.array([1e6, 1e6]), returns, ["USD", "EUR"], 0.95)
+    assert result["missing_currencies"] == []
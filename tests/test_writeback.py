@@ -0,0 +1,58 @@
+from app.writeback import BatchWriter
+
+CONFLICT = "deal_id,deal_type,date"
+
+
+def history_row(deal_id: int, mtm: float) -> dict:
+    return {"deal_id": deal_id, "deal_type": "swap", "date": "2026-03-02", "mtm_eur": mtm}
+
+
+def test_upserts_are_deduplicated_and_written_in_batches(fake_supabase):
+    fake_supabase.load("deal_kpi_history", [])
+    writer = BatchWriter(batch_size=4, retry_delay=0)
+    writer.submit("deal_kpi_history", [history_row(i, 1.0) for i in range(10)], on_conflict=CONFLICT)
+    writer.submit("deal_kpi_history", [history_row(0, 2.0)], on_conflict=CONFLICT)
+    assert writer.pending_rows() == 10
+
+    status = writer.flush()
+    assert fake_supabase.calls == 3
+    assert status["written_rows"] == 10 and status["pending_rows"] == 0
+    rows = sorted(fake_supabase.tables["deal_kpi_history"].values(), key=lambda row: row["deal_id"])
+    assert [row["mtm_eur"] for row in rows] == [2.0] + [1.0] * 9
+
+
+def test_partial_updates_keep_columns_written_elsewhere(fake_supabase):
+    fake_supabase.load("swaps", [{"id": 1, "currency": "USD", "nominal": 1e6, "mtm_eur": 0.0}])
+    writer = BatchWriter(retry_delay=0)
+    writer.submit_updates("swaps", [{"id": 1, "mtm_eur": 5.0}])
+    # Modification concurrente d'une autre colonne avant le flush
+    fake_supabase.tables["swaps"][1]["nominal"] = 2e6
+    writer.flush()
+    assert fake_supabase.tables["swaps"][1] == {"id": 1, "currency": "USD", "nominal": 2e6, "mtm_eur": 5.0}
+
+
+class FlakyRepository:
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.written = []
+
+    def upsert(self, table, rows, on_conflict):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("Supabase indisponible")
+        self.written.extend(rows)
+
+
+def test_failed_batch_is_requeued_for_the_next_flush(monkeypatch):
+    repository = FlakyRepository(failures=2)
+    monkeypatch.setattr("app.writeback.repository", repository)
+    writer = BatchWriter(max_retries=2, retry_delay=0)
+    writer.submit("deal_kpi_history", [history_row(1, 1.0), history_row(2, 1.0)], on_conflict=CONFLICT)
+
+    status = writer.flush()
+    assert status["requeued_rows"] == 2 and status["pending_rows"] == 2
+    assert "Supabase indisponible" in status["last_error"]
+
+    status = writer.flush()
+    assert status["pending_rows"] == 0 and status["written_rows"] == 2
+    assert [row["deal_id"] for row in repository.written] == [1, 2]